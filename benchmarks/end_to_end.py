@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end contro il webservice finto (benchmarks/fake_webservice.py)
+
+Crea una cartella assets temporanea e misura gli scenari principali,
+ognuno in un processo nuovo (così il picco di memoria è quello del solo
+scenario) contro un negozio finto appena avviato in un processo separato:
+
+    lookup        search_references su tutti i reference del negozio
+    list          iter_records(Product) su tutto il catalogo
+    upload        ImageUploader (thread) in modalità sostituzione
+    upload-async  AsyncImageUploader
+
+Per ogni scenario: prodotti/s, immagini/s, latenza delle singole
+richieste HTTP (p50/p95/p99), richieste, retry e picco di RSS. I risultati si possono
+salvare e confrontare con un'esecuzione precedente per bloccare le regressioni.
+
+Uso:
+    python benchmarks/end_to_end.py
+    python benchmarks/end_to_end.py --scenarios upload --workers 8 --latency 0.02 --image-latency 0.1
+    python benchmarks/end_to_end.py --save baseline.json
+    python benchmarks/end_to_end.py --baseline baseline.json --tolerance 0.15
+
+Le impostazioni del client arrivano da .env/variabili d'ambiente come per
+gli script (es. UPLOAD_STREAMING=false python benchmarks/end_to_end.py).
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import contextlib
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List, Optional
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fake_webservice import FakeWebservice, add_arguments, service_options, start_process
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ('lookup', 'list', 'upload', 'upload-async')
+
+API_KEY = 'BENCHMARK'
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentile (nearest-rank) di una lista di valori"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+def peak_rss_mb() -> Optional[float]:
+    """Picco di memoria residente del processo corrente in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux in KB, macOS in byte
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def create_assets(directory: Path, products: int, images: int, image_kb: int):
+    """Cartelle prodotto con immagini di contenuto casuale (il negozio finto non le decodifica)"""
+    for product_id in range(1, products + 1):
+        folder = directory / FakeWebservice.reference(product_id)
+        folder.mkdir(parents=True, exist_ok=True)
+        for number in range(1, images + 1):
+            (folder / f"{number:02d}.jpg").write_bytes(os.urandom(image_kb * 1024))
+
+class LatencyRecorder:
+    """Registra la durata di ogni richiesta HTTP (senza le attese di semaforo e rate limiter)"""
+    
+    def __init__(self):
+        self.samples: List[float] = []
+    
+    def wrap(self, func):
+        samples = self.samples
+        
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - started)
+        return timed
+    
+    def wrap_async(self, func):
+        samples = self.samples
+        
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - started)
+        return timed
+
+def run_scenario(name: str, url: str, options: Dict, connection):
+    """Corpo del processo di uno scenario: esegue, misura e rimanda i risultati al padre"""
+    from config.config import Config
+    Config.ASSETS_DIR = Path(options['assets_dir'])
+    Config.UPLOAD_DELAY = 0
+    Config.IMAGE_DELAY = 0
+    logging.basicConfig(level=logging.ERROR)
+    
+    requests_latency = LatencyRecorder()
+    products_latency = LatencyRecorder()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if name == 'upload-async':
+                result = asyncio.run(_run_async_upload(url, options, requests_latency, products_latency))
+            else:
+                result = _run_sync(name, url, options, requests_latency, products_latency)
+    except Exception as e:
+        connection.send({'scenario': name, 'error': f"{type(e).__name__}: {e}"})
+        return
+    
+    samples = requests_latency.samples
+    result.update({
+        'scenario': name,
+        'requests': len(samples),
+        'latency_ms': {f"p{p}": round(percentile(samples, p) * 1000, 2) if samples else None for p in (50, 95, 99)},
+        'product_latency_ms': {
+            f"p{p}": round(percentile(products_latency.samples, p) * 1000, 2) for p in (50, 95, 99)
+        } if products_latency.samples else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1) if resource is not None else None,
+    })
+    elapsed = result['seconds']
+    result['products_per_s'] = round(result['products'] / elapsed, 2) if elapsed else None
+    result['images_per_s'] = round(result['images'] / elapsed, 2) if elapsed else None
+    connection.send(result)
+
+def _make_rate_limiter(options: Dict):
+    from src.rate_limiter import RateLimiter
+    return RateLimiter() if options['rate_limit'] else None
+
+def _run_sync(name: str, url: str, options: Dict, requests_latency, products_latency) -> Dict:
+    """Scenari con PrestaShopAPI (thread)"""
+    from src.api_client import PrestaShopAPI
+    from src.records import Product
+    from upload_images_only import ImageUploader
+    
+    with PrestaShopAPI(url, API_KEY, rate_limiter=_make_rate_limiter(options),
+                       wire_format=options['wire_format']) as api:
+        api.session.request = requests_latency.wrap(api.session.request)
+        references = [FakeWebservice.reference(product_id) for product_id in range(1, options['products'] + 1)]
+        
+        if name == 'lookup':
+            started = time.perf_counter()
+            found = api.search_references(references)
+            elapsed = time.perf_counter() - started
+            return {'seconds': elapsed, 'products': len(found), 'images': 0,
+                    'retries': api.retry_policy.retries}
+        
+        if name == 'list':
+            started = time.perf_counter()
+            count = sum(1 for _ in api.iter_records(Product, list(PrestaShopAPI.LOOKUP_FIELDS)))
+            elapsed = time.perf_counter() - started
+            return {'seconds': elapsed, 'products': count, 'images': 0,
+                    'retries': api.retry_policy.retries}
+        
+        uploader = ImageUploader(api, workers=options['workers'], image_workers=options['image_workers'])
+        uploader.upload_images_for_product = products_latency.wrap(uploader.upload_images_for_product)
+        upload = [(index, ref) for index, ref in enumerate(references[:options['upload_products']], 1)]
+        
+        started = time.perf_counter()
+        uploader.resolve_references(ref for _, ref in upload)
+        stats = uploader.process_references(upload, 0)
+        elapsed = time.perf_counter() - started
+        return {'seconds': elapsed, 'products': stats['products_processed'],
+                'images': stats['images_uploaded'], 'images_failed': stats['images_failed'],
+                'retries': api.retry_policy.retries}
+
+async def _run_async_upload(url: str, options: Dict, requests_latency, products_latency) -> Dict:
+    """Scenario upload con AsyncPrestaShopAPI"""
+    from src.async_api_client import AsyncPrestaShopAPI
+    from upload_images_only import AsyncImageUploader
+    
+    async with AsyncPrestaShopAPI(url, API_KEY, rate_limiter=_make_rate_limiter(options),
+                                  wire_format=options['wire_format']) as api:
+        api._send = requests_latency.wrap_async(api._send)
+        uploader = AsyncImageUploader(api, workers=options['async_workers'])
+        uploader.upload_images_for_product = products_latency.wrap_async(uploader.upload_images_for_product)
+        upload = [(index, FakeWebservice.reference(index)) for index in range(1, options['upload_products'] + 1)]
+        
+        started = time.perf_counter()
+        await uploader.resolve_references(ref for _, ref in upload)
+        stats = await uploader.process_references(upload, 0)
+        elapsed = time.perf_counter() - started
+        return {'seconds': elapsed, 'products': stats['products_processed'],
+                'images': stats['images_uploaded'], 'images_failed': stats['images_failed'],
+                'retries': api.retry_policy.retries}
+
+def run_isolated(name: str, url: str, options: Dict) -> Dict:
+    """Esegue uno scenario in un processo nuovo (spawn: memoria e stato puliti)"""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=run_scenario, args=(name, url, options, child), name=f"bench-{name}")
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {'scenario': name, 'error': f"processo terminato (exit code {process.exitcode})"}
+    process.join()
+    return result
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Regressioni rispetto al riferimento: throughput più basso o p95 più alto oltre la tolleranza"""
+    previous = {result['scenario']: result for result in baseline if 'error' not in result}
+    regressions = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if before is None or 'error' in result:
+            continue
+        
+        metric = 'images_per_s' if result['images'] else 'products_per_s'
+        if before.get(metric) and result[metric] < before[metric] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: {metric} {result[metric]} < {before[metric]}")
+        
+        p95, before_p95 = result['latency_ms']['p95'], (before.get('latency_ms') or {}).get('p95')
+        if p95 is not None and before_p95 and p95 > before_p95 * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: latenza p95 {p95} ms > {before_p95} ms")
+    return regressions
+
+def print_results(results: List[Dict]):
+    """Tabella riassuntiva degli scenari"""
+    print(f"\n{'='*96}")
+    print(f"{'scenario':<14}{'secondi':>9}{'prodotti/s':>12}{'immagini/s':>12}{'richieste':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'retry':>7}{'RSS MB':>9}")
+    print(f"{'='*96}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['scenario']:<14}❌ {result['error']}")
+            continue
+        latency = result['latency_ms']
+        print(f"{result['scenario']:<14}{result['seconds']:>9.2f}{result['products_per_s'] or 0:>12.1f}"
+              f"{result['images_per_s'] or 0:>12.1f}{result['requests']:>11}"
+              f"{latency['p50'] or 0:>9.1f}{latency['p95'] or 0:>9.1f}{latency['p99'] or 0:>9.1f}"
+              f"{result['retries']:>7}{result['peak_rss_mb'] or 0:>9.1f}")
+    print(f"{'='*96}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end contro il webservice finto")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help="Scenari da eseguire (default tutti)")
+    parser.add_argument('--upload-products', type=int, default=100, help="Prodotti caricati negli scenari upload (default 100)")
+    parser.add_argument('--images', type=int, default=3, help="Immagini per prodotto (default 3)")
+    parser.add_argument('--image-kb', type=int, default=200, help="Dimensione di ogni immagine in KB (default 200)")
+    parser.add_argument('--workers', type=int, default=4, help="Worker dello scenario upload (default 4)")
+    parser.add_argument('--image-workers', type=int, default=2, help="Immagini preparate in parallelo (default 2)")
+    parser.add_argument('--async-workers', type=int, default=32, help="Prodotti in corso nello scenario upload-async (default 32)")
+    parser.add_argument('--rate-limit', action='store_true', help="Usa il rate limiter adattivo (default disattivato)")
+    parser.add_argument('--wire-format', choices=['xml', 'json'], default=None, help="Formato delle letture (default da .env)")
+    parser.add_argument('--save', type=Path, help="Salva i risultati in JSON")
+    parser.add_argument('--baseline', type=Path, help="Confronta con i risultati salvati (exit 1 se c'è una regressione)")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Peggioramento tollerato rispetto al baseline (default 0.10)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.upload_products = min(args.upload_products, args.products)
+    
+    with tempfile.TemporaryDirectory(prefix='bench_assets_') as assets_dir:
+        if any(name.startswith('upload') for name in args.scenarios):
+            print(f"🧪 Creazione assets: {args.upload_products} prodotti × {args.images} immagini da {args.image_kb} KB")
+            create_assets(Path(assets_dir), args.upload_products, args.images, args.image_kb)
+        
+        print(f"🌐 Webservice finto: {args.products} prodotti, latenza {args.latency}s, "
+              f"errori {args.error_rate:.0%}, 429 {args.throttle_rate:.0%}")
+        
+        options = {
+            'assets_dir': assets_dir,
+            'products': args.products,
+            'upload_products': args.upload_products,
+            'workers': args.workers,
+            'image_workers': args.image_workers,
+            'async_workers': args.async_workers,
+            'rate_limit': args.rate_limit,
+            'wire_format': args.wire_format,
+        }
+        results = []
+        for name in args.scenarios:
+            print(f"⏱️  Scenario {name}...")
+            # Negozio nuovo per ogni scenario: gli upload precedenti non cambiano il lavoro
+            server, url = start_process(api_key=API_KEY, **service_options(args))
+            try:
+                results.append(run_isolated(name, url, options))
+            finally:
+                server.terminate()
+                server.join()
+    
+    print_results(results)
+    
+    if args.save:
+        args.save.write_text(json.dumps({'options': vars(args) | {'save': None, 'baseline': None},
+                                         'results': results}, indent=2, default=str), encoding='utf-8')
+        print(f"💾 Risultati salvati in {args.save}")
+    
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressioni rispetto a {args.baseline} (tolleranza {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"\n✅ Nessuna regressione rispetto a {args.baseline}")
+    
+    if any('error' in result for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,773 @@
+#!/usr/bin/env python3
+"""
+Webservice PrestaShop finto, in locale, per benchmark e prove offline
+
+Implementa le parti usate dagli script: products, categories e
+stock_availables (elenchi con filtri, display, sort, limit e
+output_format=JSON; singola risorsa con GET, PUT e PATCH; ETag e 304 con If-None-Match),
+images/products (elenco) e images/products/{id} (GET/POST/DELETE). Latenza, errori 5xx, risposte
+429 e banda sono configurabili, così le modifiche di prestazioni si
+possono misurare senza un negozio reale.
+
+Uso:
+    python benchmarks/fake_webservice.py --port 8080 --products 1000
+    python benchmarks/fake_webservice.py --latency 0.05 --error-rate 0.01 --throttle-rate 0.02 --bandwidth 5
+
+Poi nel .env:
+    PRESTASHOP_API_URL=http://127.0.0.1:8080/api
+    PRESTASHOP_API_KEY=BENCHMARK
+"""
+
+import sys
+import json
+import time
+import base64
+import hashlib
+import random
+import argparse
+import threading
+import multiprocessing
+import xml.etree.ElementTree as ET
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+XLINK = 'http://www.w3.org/1999/xlink'
+LANGUAGES = (1, 2)
+REFERENCE_FORMAT = 'BENCH-{:06d}'
+
+# Byte del corpo conservati per l'elaborazione (XML delle risorse, intestazioni multipart)
+BODY_HEAD = 64 * 1024
+
+# Endpoint a elenco -> tag della singola risorsa
+RESOURCES = {
+    'products': 'product',
+    'categories': 'category',
+    'stock_availables': 'stock_available',
+}
+
+class Bandwidth:
+    """Limite di banda condiviso da tutte le connessioni (byte al secondo, None = illimitata)"""
+    
+    def __init__(self, bytes_per_second: Optional[float]):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._free_at = 0.0
+    
+    def consume(self, size: int):
+        """Attende il tempo necessario a trasferire `size` byte sul collegamento"""
+        if not self.bytes_per_second or size <= 0:
+            return
+        with self._lock:
+            start = max(time.monotonic(), self._free_at)
+            self._free_at = start + size / self.bytes_per_second
+            done_at = self._free_at
+        delay = done_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+class FakeWebservice:
+    """Negozio finto in memoria servito da un ThreadingHTTPServer"""
+    
+    def __init__(self, products: int = 1000, images_per_product: int = 2, categories: int = 20,
+                 api_key: str = 'BENCHMARK', host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, image_latency: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 bandwidth: Optional[float] = None, seed: int = 0, patch: bool = True,
+                 etag: bool = True):
+        """
+        Args:
+            products: Prodotti nel negozio (reference BENCH-000001, BENCH-000002, ...)
+            images_per_product: Immagini già presenti per prodotto
+            categories: Categorie nel negozio
+            api_key: Chiave accettata (Basic auth come PrestaShop, None = qualsiasi)
+            host, port: Indirizzo di ascolto (porta 0 = scelta dal sistema)
+            latency: Secondi di attesa per ogni richiesta
+            jitter: Secondi casuali aggiunti alla latenza (0..jitter)
+            image_latency: Secondi extra per ogni upload (rigenerazione miniature)
+            error_rate: Frazione di richieste che falliscono con 500
+            throttle_rate: Frazione di richieste rifiutate con 429
+            retry_after: Valore di Retry-After nelle risposte 429
+            bandwidth: Banda in byte/s per direzione (None = illimitata)
+            seed: Seme per dati e guasti riproducibili
+            patch: Se False PATCH risponde 405 (come le versioni di PrestaShop senza PATCH)
+            etag: Se True le GET hanno ETag e rispondono 304 a un If-None-Match uguale
+        """
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.image_latency = image_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.patch = patch
+        self.etag = etag
+        self.upload_link = Bandwidth(bandwidth)
+        self.download_link = Bandwidth(bandwidth)
+        
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = Counter()      # (metodo, endpoint) -> richieste
+        self.injected = Counter()      # status iniettati (429, 500)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        
+        self.data: Dict[str, Dict[str, Dict]] = {name: {} for name in RESOURCES}
+        self.images: Dict[str, List[str]] = {}
+        self.image_sizes: Dict[str, int] = {}
+        self._next_image_id = 1
+        self._populate(products, images_per_product, categories)
+        
+        self._server = _Server((host, port), _Handler)
+        self._server.service = self
+        self._thread: Optional[threading.Thread] = None
+    
+    @staticmethod
+    def reference(product_id: int) -> str:
+        """Reference del prodotto con l'ID indicato"""
+        return REFERENCE_FORMAT.format(product_id)
+    
+    @property
+    def url(self) -> str:
+        """URL da usare come PRESTASHOP_API_URL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+    
+    def _populate(self, products: int, images_per_product: int, categories: int):
+        """Crea i dati iniziali del negozio"""
+        rnd = self._random
+        for category_id in range(1, categories + 1):
+            self.data['categories'][str(category_id)] = {
+                'id': str(category_id),
+                'id_parent': '1' if category_id <= 2 else str(rnd.randint(2, max(2, category_id - 1))),
+                'name': {lang: f"Categoria {category_id}" for lang in LANGUAGES},
+                'link_rewrite': {lang: f"categoria-{category_id}" for lang in LANGUAGES},
+                'active': '1',
+                'position': str(category_id),
+                'date_upd': '2024-01-01 00:00:00',
+            }
+        
+        for product_id in range(1, products + 1):
+            pid = str(product_id)
+            self.images[pid] = []
+            for _ in range(images_per_product):
+                self._add_image(pid, 0)
+            self.data['products'][pid] = {
+                'id': pid,
+                'reference': self.reference(product_id),
+                'name': {lang: f"Prodotto {product_id}" for lang in LANGUAGES},
+                'price': f"{rnd.randint(5, 500)}.000000",
+                'active': '1',
+                'id_category_default': str(rnd.randint(1, max(1, categories))),
+                'ean13': str(8000000000000 + product_id),
+                'date_upd': '2024-01-01 00:00:00',
+                'description': {lang: "<p>Descrizione di prova del prodotto.</p>" * 4 for lang in LANGUAGES},
+            }
+            self.data['stock_availables'][pid] = {
+                'id': pid,
+                'id_product': pid,
+                'id_product_attribute': '0',
+                'id_shop': '1',
+                'quantity': str(rnd.randint(0, 100)),
+                'depends_on_stock': '0',
+                'out_of_stock': '2',
+            }
+    
+    def _add_image(self, product_id: str, size: int) -> str:
+        """Registra una nuova immagine (chiamare con il lock o durante il popolamento)"""
+        image_id = str(self._next_image_id)
+        self._next_image_id += 1
+        self.images[product_id].append(image_id)
+        self.image_sizes[image_id] = size
+        return image_id
+    
+    # --- Ciclo di vita -------------------------------------------------
+    
+    def start(self) -> "FakeWebservice":
+        """Avvia il server in un thread in background"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-webservice', daemon=True)
+        self._thread.start()
+        return self
+    
+    def serve_forever(self):
+        """Serve richieste nel thread corrente (fino a Ctrl+C)"""
+        self._server.serve_forever()
+    
+    def stop(self):
+        """Ferma il server e chiude il socket"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+    
+    def stats(self) -> Dict:
+        """Contatori delle richieste servite"""
+        with self._lock:
+            return {
+                'requests': {f"{method} {endpoint}": count for (method, endpoint), count in sorted(self.requests.items())},
+                'injected': dict(self.injected),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'images': sum(len(ids) for ids in self.images.values()),
+            }
+    
+    # --- Guasti --------------------------------------------------------
+    
+    def inject(self, method: str, endpoint: str) -> Optional[int]:
+        """Conta la richiesta, applica la latenza e decide se fallire (status) o no (None)"""
+        with self._lock:
+            self.requests[(method, endpoint)] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            roll = self._random.random()
+        
+        if method == 'POST' and endpoint == 'images':
+            delay += self.image_latency
+        if delay > 0:
+            time.sleep(delay)
+        
+        status = None
+        if roll < self.throttle_rate:
+            status = 429
+        elif roll < self.throttle_rate + self.error_rate:
+            status = 500
+        if status is not None:
+            with self._lock:
+                self.injected[status] += 1
+        return status
+    
+    # --- Risorse -------------------------------------------------------
+    
+    def list_resources(self, endpoint: str, params: Dict[str, str]) -> List[Dict]:
+        """Risorse di un elenco dopo filtri, ordinamento e limit"""
+        with self._lock:
+            items = list(self.data[endpoint].values())
+        
+        for key, value in params.items():
+            if key.startswith('filter[') and key.endswith(']'):
+                items = _apply_filter(items, key[7:-1], value)
+        
+        sort = params.get('sort', '[id_ASC]').strip('[]')
+        field, _, direction = sort.rpartition('_')
+        if field:
+            items.sort(key=lambda item: _sort_key(item.get(field)), reverse=direction.upper() == 'DESC')
+        
+        limit = params.get('limit')
+        if limit:
+            offset, _, count = limit.rpartition(',')
+            offset = int(offset or 0)
+            items = items[offset:offset + int(count)]
+        return items
+    
+    def get_resource(self, endpoint: str, resource_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self.data[endpoint].get(resource_id)
+    
+    def update_resource(self, endpoint: str, resource_id: str, values: Dict) -> Optional[Dict]:
+        """
+        Aggiorna i campi indicati di una risorsa (i multilingua lingua per lingua)
+        
+        Returns:
+            La risorsa aggiornata, None se non esiste
+        
+        Raises:
+            ValueError: Campo sconosciuto o ID diverso da quello dell'URL
+        """
+        with self._lock:
+            item = self.data[endpoint].get(resource_id)
+            if item is None:
+                return None
+            unknown = [name for name in values if name not in item]
+            if unknown:
+                raise ValueError(f"Campi non validi: {', '.join(unknown)}")
+            if values.get('id', resource_id) != resource_id:
+                raise ValueError("ID della risorsa diverso da quello dell'URL")
+            for name, value in values.items():
+                if isinstance(item[name], dict) and isinstance(value, dict):
+                    item[name] = {**item[name], **value}
+                else:
+                    item[name] = value
+            if 'date_upd' in item:
+                item['date_upd'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            return dict(item)
+    
+    def products_with_images(self) -> List[str]:
+        with self._lock:
+            return [product_id for product_id, image_ids in self.images.items() if image_ids]
+    
+    def product_images(self, product_id: str) -> Optional[List[str]]:
+        with self._lock:
+            if product_id not in self.data['products']:
+                return None
+            return list(self.images[product_id])
+    
+    def create_image(self, product_id: str, size: int) -> Optional[str]:
+        with self._lock:
+            if product_id not in self.data['products']:
+                return None
+            return self._add_image(product_id, size)
+    
+    def delete_image(self, product_id: str, image_id: str) -> bool:
+        with self._lock:
+            ids = self.images.get(product_id)
+            if not ids or image_id not in ids:
+                return False
+            ids.remove(image_id)
+            self.image_sizes.pop(image_id, None)
+            return True
+    
+    def product_with_associations(self, item: Dict) -> Dict:
+        """Prodotto con le associations (immagini e categorie) aggiornate"""
+        with self._lock:
+            images = list(self.images.get(item['id'], []))
+        item = dict(item)
+        item['associations'] = {
+            'categories': ('category', [item['id_category_default']]),
+            'images': ('image', images),
+        }
+        return item
+
+def _apply_filter(items: List[Dict], field: str, value: str) -> List[Dict]:
+    """
+    Filtro come quello di PrestaShop: [A|B|C] (uno dei valori), [1,10]
+    (intervallo numerico) oppure valore esatto; senza distinzione maiuscole
+    """
+    if value.startswith('[') and value.endswith(']'):
+        inner = value[1:-1]
+        low, comma, high = inner.partition(',')
+        if comma and low.isdigit() and high.isdigit():
+            return [item for item in items
+                    if str(item.get(field, '')).isdigit() and int(low) <= int(item[field]) <= int(high)]
+        wanted = {v.lower() for v in inner.split('|')}
+    else:
+        wanted = {value.lower()}
+    return [item for item in items if str(_plain(item.get(field, ''))).lower() in wanted]
+
+def _plain(value):
+    """Valore di un campo multilingua nella prima lingua"""
+    if isinstance(value, dict):
+        return value.get(LANGUAGES[0], '')
+    return value
+
+def _sort_key(value):
+    value = _plain(value)
+    if value is None:
+        return (1, 0, '')
+    value = str(value)
+    return (0, int(value), '') if value.isdigit() else (0, 0, value)
+
+def _display_fields(display: Optional[str]) -> Tuple[bool, Optional[set]]:
+    """(risorse complete?, campi) dal parametro display"""
+    if display is None:
+        return False, None
+    if display == 'full':
+        return True, None
+    return True, {name.strip() for name in display.strip('[]').split(',') if name.strip()}
+
+def _cdata(value) -> str:
+    return '<![CDATA[' + str(value).replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+def _xml_resource(base_url: str, tag: str, item: Dict, fields: Optional[set]) -> str:
+    """Una risorsa in XML come la restituisce PrestaShop"""
+    parts = [f'<{tag}>']
+    for name, value in item.items():
+        if name == 'associations' or (fields is not None and name not in fields):
+            continue
+        if isinstance(value, dict):
+            languages = ''.join(
+                f'<language id="{lang}" xlink:href="{base_url}/languages/{lang}">{_cdata(text)}</language>'
+                for lang, text in value.items()
+            )
+            parts.append(f'<{name}>{languages}</{name}>')
+        else:
+            parts.append(f'<{name}>{_cdata(value)}</{name}>')
+    if fields is None and 'associations' in item:
+        parts.append('<associations>')
+        for name, (child, ids) in item['associations'].items():
+            nodes = ''.join(
+                f'<{child} xlink:href="{base_url}/{name}/{value}"><id>{_cdata(value)}</id></{child}>' for value in ids
+            )
+            parts.append(f'<{name} nodeType="{child}" api="{name}">{nodes}</{name}>')
+        parts.append('</associations>')
+    parts.append(f'</{tag}>')
+    return ''.join(parts)
+
+def _json_resource(item: Dict, fields: Optional[set]) -> Dict:
+    """Una risorsa in JSON come con output_format=JSON"""
+    result = {}
+    for name, value in item.items():
+        if name == 'associations' or (fields is not None and name not in fields):
+            continue
+        if isinstance(value, dict):
+            result[name] = [{'id': str(lang), 'value': text} for lang, text in value.items()]
+        elif name == 'id':
+            result[name] = int(value)
+        else:
+            result[name] = value
+    if fields is None and 'associations' in item:
+        result['associations'] = {
+            name: [{'id': value} for value in ids] for name, (_, ids) in item['associations'].items()
+        }
+    return result
+
+def _xml_document(body: str) -> bytes:
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<prestashop xmlns:xlink="{XLINK}">{body}</prestashop>').encode('utf-8')
+
+class _Server(ThreadingHTTPServer):
+    """Un thread per connessione, con coda di accept ampia per i client asincroni"""
+    
+    daemon_threads = True
+    request_queue_size = 256
+
+class _Handler(BaseHTTPRequestHandler):
+    """Richieste HTTP verso il negozio finto (keep-alive come un server reale)"""
+    
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakePrestaShop/1.0'
+    disable_nagle_algorithm = True   # intestazioni e corpo partono in write separate
+    
+    def log_message(self, format, *args):
+        pass
+    
+    @property
+    def service(self) -> FakeWebservice:
+        return self.server.service
+    
+    def do_GET(self):
+        self._handle('GET')
+    
+    def do_POST(self):
+        self._handle('POST')
+    
+    def do_PUT(self):
+        self._handle('PUT')
+    
+    def do_PATCH(self):
+        self._handle('PATCH')
+    
+    def do_DELETE(self):
+        self._handle('DELETE')
+    
+    def _handle(self, method: str):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        parts = [part for part in url.path.split('/') if part]
+        if parts[:1] == ['api']:
+            parts = parts[1:]
+        endpoint = parts[0] if parts else ''
+        
+        # Il corpo va letto sempre, anche per le risposte di errore (keep-alive)
+        body_head, body_size = self._read_body()
+        
+        if not self._authorized():
+            self._send(401, _xml_document('<errors><error><message>Unauthorized</message></error></errors>'),
+                       extra_headers={'WWW-Authenticate': 'Basic realm="Webservice"'})
+            return
+        
+        status = self.service.inject(method, endpoint)
+        if status == 429:
+            self._send(429, b'', extra_headers={'Retry-After': f"{self.service.retry_after:g}"})
+            return
+        if status is not None:
+            self._error(status, 'Errore simulato')
+            return
+        
+        try:
+            if not parts:
+                self._send_xml('<api shopName="Fake PrestaShop"></api>')
+            elif endpoint == 'images' and parts[1:2] == ['products']:
+                self._images(method, parts[2:], body_head, body_size)
+            elif endpoint in RESOURCES and method in ('PUT', 'PATCH'):
+                self._update(method, endpoint, parts[1:], body_head, body_size)
+            elif endpoint in RESOURCES:
+                self._resources(method, endpoint, parts[1:], params)
+            else:
+                self._error(404, f"Risorsa {endpoint} non disponibile")
+        except (ValueError, IndexError, ET.ParseError) as e:
+            self._error(400, str(e))
+    
+    def _authorized(self) -> bool:
+        if self.service.api_key is None:
+            return True
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Basic '):
+            return False
+        try:
+            user = base64.b64decode(header[6:]).decode('utf-8').split(':', 1)[0]
+        except (ValueError, UnicodeDecodeError):
+            return False
+        return user == self.service.api_key
+    
+    def _read_body(self) -> Tuple[bytes, int]:
+        """Legge il corpo a blocchi rispettando la banda; ritorna i primi byte e la dimensione"""
+        head = b''
+        size = 0
+        link = self.service.upload_link
+        
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                chunk_size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if chunk_size == 0:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunk = self.rfile.read(chunk_size)
+                self.rfile.readline()
+                link.consume(len(chunk))
+                if len(head) < BODY_HEAD:
+                    head += chunk[:BODY_HEAD - len(head)]
+                size += len(chunk)
+        else:
+            remaining = int(self.headers.get('Content-Length') or 0)
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    break
+                link.consume(len(chunk))
+                if len(head) < BODY_HEAD:
+                    head += chunk[:BODY_HEAD - len(head)]
+                size += len(chunk)
+                remaining -= len(chunk)
+        
+        with self.service._lock:
+            self.service.bytes_in += size
+        return head, size
+    
+    def _resources(self, method: str, endpoint: str, rest: List[str], params: Dict[str, str]):
+        """GET di elenchi e singole risorse (products, categories, stock_availables)"""
+        if method != 'GET':
+            self._error(405, f"Metodo {method} non supportato su {endpoint}")
+            return
+        
+        tag = RESOURCES[endpoint]
+        as_json = params.get('output_format', '').upper() == 'JSON'
+        decorate = self.service.product_with_associations if endpoint == 'products' else (lambda item: item)
+        
+        if rest:
+            item = self.service.get_resource(endpoint, rest[0])
+            if item is None:
+                self._error(404, f"{tag} {rest[0]} non trovato")
+                return
+            item = decorate(item)
+            if as_json:
+                self._send_json({tag: _json_resource(item, None)})
+            else:
+                self._send_xml(_xml_resource(self.service.url, tag, item, None))
+            return
+        
+        items = self.service.list_resources(endpoint, params)
+        full, fields = _display_fields(params.get('display'))
+        if full and fields is None:
+            items = [decorate(item) for item in items]
+        
+        if as_json:
+            if not items:
+                self._send_json([])
+            elif full:
+                self._send_json({endpoint: [_json_resource(item, fields) for item in items]})
+            else:
+                self._send_json({endpoint: [{'id': int(item['id'])} for item in items]})
+            return
+        
+        if full:
+            body = ''.join(_xml_resource(self.service.url, tag, item, fields) for item in items)
+        else:
+            body = ''.join(f'<{tag} id="{item["id"]}" xlink:href="{self.service.url}/{endpoint}/{item["id"]}"/>'
+                           for item in items)
+        self._send_xml(f'<{endpoint}>{body}</{endpoint}>')
+    
+    def _update(self, method: str, endpoint: str, rest: List[str], body_head: bytes, body_size: int):
+        """PUT e PATCH di una risorsa: <prestashop><product><campo>...</campo></product></prestashop>"""
+        if method == 'PATCH' and not self.service.patch:
+            self._error(405, f"Metodo {method} non supportato")
+            return
+        if len(rest) != 1:
+            self._error(405, f"Metodo {method} non supportato su {endpoint}")
+            return
+        if body_size > len(body_head):
+            self._error(413, "Corpo troppo grande")
+            return
+        
+        tag = RESOURCES[endpoint]
+        element = ET.fromstring(body_head).find(tag)
+        if element is None:
+            raise ValueError(f"Elemento {tag} mancante")
+        values = {}
+        for child in element:
+            if child.tag == 'associations':
+                continue
+            languages = child.findall('language')
+            if languages:
+                values[child.tag] = {int(node.get('id')): node.text or '' for node in languages}
+            else:
+                values[child.tag] = (child.text or '').strip()
+        
+        item = self.service.update_resource(endpoint, rest[0], values)
+        if item is None:
+            self._error(404, f"{tag} {rest[0]} non trovato")
+            return
+        self._send_xml(_xml_resource(self.service.url, tag, item, None))
+    
+    def _images(self, method: str, rest: List[str], body_head: bytes, body_size: int):
+        """images/products (GET), images/products/{id} (GET, POST) e images/products/{id}/{id_immagine} (DELETE)"""
+        if method == 'GET' and not rest:
+            body = ''.join(
+                f'<image id="{product_id}" xlink:href="{self.service.url}/images/products/{product_id}"/>'
+                for product_id in self.service.products_with_images()
+            )
+            self._send_xml(f'<images>{body}</images>')
+            return
+        
+        product_id = rest[0]
+        
+        if method == 'GET' and len(rest) == 1:
+            image_ids = self.service.product_images(product_id)
+            if image_ids is None:
+                self._error(404, f"Prodotto {product_id} non trovato")
+                return
+            declinations = ''.join(
+                f'<declination id="{image_id}" xlink:href="{self.service.url}/images/products/{product_id}/{image_id}"/>'
+                for image_id in image_ids
+            )
+            self._send_xml(f'<image id="{product_id}">{declinations}</image>')
+        
+        elif method == 'POST' and len(rest) == 1:
+            if not self.headers.get('Content-Type', '').startswith('multipart/form-data') \
+                    or b'name="image"' not in body_head:
+                self._error(400, "Campo image mancante")
+                return
+            image_id = self.service.create_image(product_id, body_size)
+            if image_id is None:
+                self._error(404, f"Prodotto {product_id} non trovato")
+                return
+            self._send_xml(f'<image><id>{_cdata(image_id)}</id><id_product>{_cdata(product_id)}</id_product></image>')
+        
+        elif method == 'DELETE' and len(rest) == 2:
+            if not self.service.delete_image(product_id, rest[1]):
+                self._error(404, f"Immagine {rest[1]} non trovata")
+                return
+            self._send(200, b'')
+        
+        else:
+            self._error(405, f"Metodo {method} non supportato")
+    
+    def _send_xml(self, body: str):
+        self._send(200, _xml_document(body), 'text/xml;charset=utf-8')
+    
+    def _send_json(self, payload):
+        self._send(200, json.dumps(payload).encode('utf-8'), 'application/json')
+    
+    def _error(self, status: int, message: str):
+        self._send(status, _xml_document(f'<errors><error><message>{_cdata(message)}</message></error></errors>'))
+    
+    def _send(self, status: int, content: bytes, content_type: str = 'text/xml;charset=utf-8',
+              extra_headers: Optional[Dict[str, str]] = None):
+        """Invia la risposta a blocchi rispettando la banda"""
+        if status == 200 and self.command == 'GET' and self.service.etag:
+            etag = '"' + hashlib.blake2b(content, digest_size=8).hexdigest() + '"'
+            extra_headers = dict(extra_headers or {}, ETag=etag)
+            if self.headers.get('If-None-Match') == etag:
+                status, content = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        
+        link = self.service.download_link
+        for offset in range(0, len(content), 64 * 1024):
+            chunk = content[offset:offset + 64 * 1024]
+            link.consume(len(chunk))
+            self.wfile.write(chunk)
+        with self.service._lock:
+            self.service.bytes_out += len(content)
+
+def _serve_in_process(options: Dict, connection):
+    """Corpo del processo separato: comunica l'URL al padre e serve fino al terminate()"""
+    service = FakeWebservice(**options)
+    connection.send(service.url)
+    connection.close()
+    service.serve_forever()
+
+def start_process(**options) -> Tuple[multiprocessing.Process, str]:
+    """
+    Avvia il webservice in un processo separato (non pesa su CPU e memoria del client misurato)
+    
+    Returns:
+        Tupla (processo da terminare con .terminate(), URL delle API)
+    """
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve_in_process, args=(options, child),
+                                      name='fake-webservice', daemon=True)
+    process.start()
+    child.close()
+    if not parent.poll(60):
+        process.terminate()
+        raise RuntimeError("Il webservice finto non si è avviato")
+    return process, parent.recv()
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Opzioni del negozio finto (condivise con il benchmark end-to-end)"""
+    parser.add_argument('--products', type=int, default=1000, help="Prodotti nel negozio (default 1000)")
+    parser.add_argument('--existing-images', type=int, default=2, help="Immagini già presenti per prodotto (default 2)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latenza per richiesta in secondi")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Latenza casuale aggiuntiva massima in secondi")
+    parser.add_argument('--image-latency', type=float, default=0.0, help="Secondi extra per ogni upload di immagine")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Frazione di risposte 500 (es. 0.01)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Frazione di risposte 429 (es. 0.02)")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After delle risposte 429 in secondi")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="Banda per direzione in MB/s (0 = illimitata)")
+    parser.add_argument('--seed', type=int, default=0, help="Seme per dati e guasti riproducibili")
+    parser.add_argument('--no-patch', action='store_true', help="PATCH risponde 405 (negozi senza PATCH)")
+    parser.add_argument('--no-etag', action='store_true', help="GET senza ETag (niente risposte 304)")
+
+def service_options(args) -> Dict:
+    """Argomenti di FakeWebservice dalle opzioni di add_arguments"""
+    return {
+        'products': args.products,
+        'images_per_product': args.existing_images,
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'image_latency': args.image_latency,
+        'error_rate': args.error_rate,
+        'throttle_rate': args.throttle_rate,
+        'retry_after': args.retry_after,
+        'bandwidth': args.bandwidth * 1024 * 1024 or None,
+        'seed': args.seed,
+        'patch': not args.no_patch,
+        'etag': not args.no_etag,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Webservice PrestaShop finto per prove offline")
+    parser.add_argument('--host', default='127.0.0.1', help="Indirizzo di ascolto (default 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Porta (default 8080, 0 = libera)")
+    parser.add_argument('--api-key', default='BENCHMARK', help="Chiave API accettata (default BENCHMARK)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    
+    service = FakeWebservice(host=args.host, port=args.port, api_key=args.api_key, **service_options(args))
+    print(f"🧪 Webservice finto con {args.products} prodotti su {service.url}")
+    print(f"   PRESTASHOP_API_URL={service.url}")
+    print(f"   PRESTASHOP_API_KEY={args.api_key}")
+    sys.stdout.flush()
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\n📊 Richieste servite:")
+        print(json.dumps(service.stats(), indent=2))
+    finally:
+        service.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark XML vs JSON (output_format=JSON) sugli elenchi del webservice
+
+Confronta byte trasferiti (anche compressi gzip) e tempo di parsing fino
+ai record Product, su pagine generate simili a quelle di PrestaShop
+oppure, con --live, su pagine reali del negozio configurato.
+
+Uso:
+    python benchmarks/wire_format.py
+    python benchmarks/wire_format.py --products 1000 --rounds 20
+    python benchmarks/wire_format.py --live --page-size 200
+"""
+
+import sys
+import io
+import gzip
+import json
+import time
+import argparse
+import statistics
+import xml.etree.ElementTree as ET
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config.config import Config
+from src.api_client import PrestaShopAPI, _iter_list_items
+from src.records import Product
+
+# Proiezioni misurate: elenco completo e ricerca per reference
+PROJECTIONS = {
+    'full': None,
+    'lookup': list(PrestaShopAPI.LOOKUP_FIELDS),
+}
+
+LANGUAGES = (1, 2)
+XLINK = 'http://www.w3.org/1999/xlink'
+
+def sample_product(product_id: int) -> dict:
+    """Dati di un prodotto verosimile (testi multilingua, associazioni)"""
+    return {
+        'id': product_id,
+        'reference': f"REF-{product_id:06d}",
+        'id_category_default': str(2 + product_id % 40),
+        'price': f"{10 + product_id % 90}.900000",
+        'active': '1',
+        'ean13': f"{8000000000000 + product_id}",
+        'date_upd': '2024-05-17 10:22:31',
+        'name': {lang: f"Prodotto di esempio {product_id} lingua {lang}" for lang in LANGUAGES},
+        'description': {lang: ("<p>Descrizione del prodotto con qualche dettaglio. </p>" * 6) for lang in LANGUAGES},
+        'link_rewrite': {lang: f"prodotto-di-esempio-{product_id}" for lang in LANGUAGES},
+        'categories': [str(2 + (product_id + n) % 40) for n in range(3)],
+        'images': [str(product_id * 10 + n) for n in range(4)],
+    }
+
+def render_xml(products, fields) -> bytes:
+    """Pagina XML come la restituisce PrestaShop"""
+    out = [f'<?xml version="1.0" encoding="UTF-8"?>\n<prestashop xmlns:xlink="{XLINK}">\n<products>\n']
+    for p in products:
+        out.append('<product>\n')
+        for name, value in p.items():
+            if fields and name not in fields:
+                continue
+            if name in ('categories', 'images'):
+                continue
+            if isinstance(value, dict):
+                out.append(f'<{name}>')
+                for lang, text in value.items():
+                    out.append(f'<language id="{lang}" xlink:href="https://shop/api/languages/{lang}"><![CDATA[{text}]]></language>')
+                out.append(f'</{name}>\n')
+            else:
+                out.append(f'<{name}><![CDATA[{value}]]></{name}>\n')
+        if not fields:
+            out.append('<associations>\n<categories nodeType="category" api="categories">')
+            out.extend(f'<category xlink:href="https://shop/api/categories/{c}"><id><![CDATA[{c}]]></id></category>'
+                       for c in p['categories'])
+            out.append('</categories>\n<images nodeType="image" api="images">')
+            out.extend(f'<image xlink:href="https://shop/api/images/products/{p["id"]}/{i}"><id><![CDATA[{i}]]></id></image>'
+                       for i in p['images'])
+            out.append('</images>\n</associations>\n')
+        out.append('</product>\n')
+    out.append('</products>\n</prestashop>\n')
+    return ''.join(out).encode('utf-8')
+
+def render_json(products, fields) -> bytes:
+    """Pagina JSON come la restituisce PrestaShop (output_format=JSON)"""
+    items = []
+    for p in products:
+        item = {}
+        for name, value in p.items():
+            if fields and name not in fields:
+                continue
+            if name in ('categories', 'images'):
+                continue
+            if isinstance(value, dict):
+                item[name] = [{'id': str(lang), 'value': text} for lang, text in value.items()]
+            else:
+                item[name] = value
+        if not fields:
+            item['associations'] = {
+                'categories': [{'id': c} for c in p['categories']],
+                'images': [{'id': i} for i in p['images']],
+            }
+        items.append(item)
+    return json.dumps({'products': items}, ensure_ascii=False).encode('utf-8')
+
+def parse_xml(content: bytes, fields):
+    return Product.from_list(ET.fromstring(content), fields)
+
+def parse_xml_stream(content: bytes, fields):
+    fields = Product.fields(fields)
+    return [Product.from_element(element, fields) for element in _iter_list_items(io.BytesIO(content))]
+
+def parse_json(content: bytes, fields):
+    return Product.from_list(json.loads(content), fields)
+
+PARSERS = {
+    'xml (fromstring)': ('xml', parse_xml),
+    'xml (iterparse)': ('xml', parse_xml_stream),
+    'json': ('json', parse_json),
+}
+
+def measure(parse, content: bytes, fields, rounds: int) -> float:
+    """Tempo mediano di parsing in millisecondi"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        parse(content, fields)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def fetch_live(page_size: int):
+    """Scarica la stessa pagina di prodotti nei due formati dal negozio configurato"""
+    pages = {}
+    with PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY) as api:
+        for projection, fields in PROJECTIONS.items():
+            params = {'display': Product.display(fields), 'sort': '[id_ASC]', 'limit': f"0,{page_size}"}
+            xml_response = api._send('GET', f"{api.api_url}/products", params=params, timeout=120)
+            json_response = api._send('GET', f"{api.api_url}/products",
+                                      params=dict(params, output_format='JSON'), timeout=120)
+            pages[projection] = {'xml': xml_response.content, 'json': json_response.content}
+    return pages
+
+def generate(count: int):
+    products = [sample_product(product_id) for product_id in range(1, count + 1)]
+    return {
+        projection: {'xml': render_xml(products, fields), 'json': render_json(products, fields)}
+        for projection, fields in PROJECTIONS.items()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark XML vs JSON sugli elenchi prodotti")
+    parser.add_argument('--products', type=int, default=500, help="Prodotti per pagina generata (default 500)")
+    parser.add_argument('--rounds', type=int, default=10, help="Ripetizioni per misura (default 10)")
+    parser.add_argument('--live', action='store_true', help="Usa pagine reali dal negozio configurato in .env")
+    parser.add_argument('--page-size', type=int, default=200, help="Prodotti per pagina con --live (default 200)")
+    args = parser.parse_args()
+    
+    if args.live:
+        if not Config.validate():
+            print("❌ Configurazione non valida!")
+            sys.exit(1)
+        print(f"🌐 Pagine reali da {Config.PRESTASHOP_API_URL} ({args.page_size} prodotti)")
+        pages = fetch_live(args.page_size)
+    else:
+        print(f"🧪 Pagine generate: {args.products} prodotti, {len(LANGUAGES)} lingue")
+        pages = generate(args.products)
+    
+    for projection, fields in PROJECTIONS.items():
+        contents = pages[projection]
+        records = len(parse_json(contents['json'], fields))
+        print(f"\n{'='*68}")
+        print(f"display={Product.display(fields)}  ({records} prodotti)")
+        print(f"{'='*68}")
+        print(f"{'formato':<20}{'byte':>12}{'gzip':>12}{'parse ms':>12}{'µs/prodotto':>12}")
+        for label, (wire_format, parse) in PARSERS.items():
+            content = contents[wire_format]
+            elapsed = measure(parse, content, fields, args.rounds)
+            print(f"{label:<20}{len(content):>12,}{len(gzip.compress(content)):>12,}"
+                  f"{elapsed:>12.2f}{elapsed * 1000 / max(records, 1):>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,98 @@ class Config:
     # Impostazioni generali
     DEFAULT_LANGUAGE_ID = int(os.getenv('DEFAULT_LANGUAGE_ID', '1'))
     UPLOAD_DELAY = float(os.getenv('UPLOAD_DELAY', '0.5'))
-    MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))
+    MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))              # retry per richiesta (0 = disattivati)
+    RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.5'))  # backoff esponenziale con jitter
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '30'))
+    RETRY_BUDGET = int(os.getenv('RETRY_BUDGET', '500'))           # retry totali per esecuzione (0 = illimitati)
+    IMAGE_DELAY = float(os.getenv('IMAGE_DELAY', '0.2'))        # pausa tra immagini dello stesso prodotto
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '1'))      # prodotti elaborati in parallelo
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '1'))        # immagini preparate in parallelo per prodotto
+    UPLOAD_STREAMING = os.getenv('UPLOAD_STREAMING', 'true').lower() == 'true'  # invia le immagini a blocchi dal disco
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(256 * 1024)))  # byte per blocco
+    UPLOAD_USE_MMAP = os.getenv('UPLOAD_USE_MMAP', 'false').lower() == 'true'  # legge i file tramite mmap
+    
+    # Connessioni HTTP (sessione condivisa con pool keep-alive)
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))   # host diversi tenuti in cache
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))          # connessioni max per host
+    HTTP_POOL_BLOCK = os.getenv('HTTP_POOL_BLOCK', 'true').lower() == 'true'
+    HTTP_KEEP_ALIVE = os.getenv('HTTP_KEEP_ALIVE', 'true').lower() == 'true'
+    ASYNC_MAX_CONCURRENCY = int(os.getenv('ASYNC_MAX_CONCURRENCY', '100'))  # richieste in volo (client asincrono)
+    
+    # Controllo velocità adattivo (sostituisce le pause fisse quando attivo)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_TARGET_RPS = float(os.getenv('RATE_TARGET_RPS', '5'))         # velocità iniziale (req/s)
+    RATE_MIN_RPS = float(os.getenv('RATE_MIN_RPS', '0.5'))
+    RATE_MAX_RPS = float(os.getenv('RATE_MAX_RPS', '50'))
+    RATE_LATENCY_TARGET = float(os.getenv('RATE_LATENCY_TARGET', '2.0'))  # secondi, oltre si rallenta
+    MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', '8'))                 # richieste contemporanee
+    
+    # Pre-elaborazione immagini prima dell'upload (richiede Pillow)
+    IMAGE_TRANSFORM_ENABLED = os.getenv('IMAGE_TRANSFORM_ENABLED', 'false').lower() == 'true'
+    IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '2000'))   # lato lungo in pixel (0 = nessun ridimensionamento)
+    IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+    IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '85'))
+    IMAGE_STRIP_EXIF = os.getenv('IMAGE_STRIP_EXIF', 'true').lower() == 'true'
+    IMAGE_TRANSFORM_WORKERS = int(os.getenv('IMAGE_TRANSFORM_WORKERS', '0'))  # processi (0 = tutti i core)
+    IMAGE_CACHE_DIR = BASE_DIR / 'data' / 'image_cache'
+    
+    # Sync immagini: 'replace' = elimina e ricarica tutto, 'diff' = solo le immagini cambiate
+    SYNC_MODE = os.getenv('SYNC_MODE', 'replace').lower()
+    MANIFEST_FILE = BASE_DIR / 'data' / 'image_manifest.db'
+    
+    # Aggiornamento prodotti da CSV (update_products.py)
+    UPDATE_METHOD = os.getenv('UPDATE_METHOD', 'auto').lower()   # auto (PATCH, PUT se non supportato), patch, put
+    PRODUCT_STATE_FILE = BASE_DIR / 'data' / 'product_state.db'
+    
+    # Sincronizzazione magazzino (sync_stock.py)
+    STOCK_WORKERS = int(os.getenv('STOCK_WORKERS', '8'))          # letture e aggiornamenti in parallelo
+    STOCK_BATCH_SIZE = int(os.getenv('STOCK_BATCH_SIZE', '100'))  # prodotti per lettura di stock_availables
+    
+    # Journal delle esecuzioni (ripresa con --resume)
+    JOURNAL_FSYNC_EVERY = int(os.getenv('JOURNAL_FSYNC_EVERY', '50'))         # record tra due fsync
+    JOURNAL_FSYNC_INTERVAL = float(os.getenv('JOURNAL_FSYNC_INTERVAL', '2.0'))  # secondi massimi tra due fsync
+    
+    # Formato delle letture di elenchi e record: 'xml' oppure 'json' (output_format=JSON)
+    WIRE_FORMAT = os.getenv('WIRE_FORMAT', 'xml').lower()
+    
+    # Ricerca prodotti
+    LOOKUP_BATCH_SIZE = int(os.getenv('LOOKUP_BATCH_SIZE', '50'))  # reference per richiesta
+    
+    # Pipeline di lettura CSV (code limitate tra gli stadi)
+    PIPELINE_BATCH_SIZE = int(os.getenv('PIPELINE_BATCH_SIZE', '500'))  # reference risolti in anticipo per blocco
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '1000'))  # prodotti in attesa tra due stadi
+    
+    # Indice locale reference -> ID prodotto
+    INDEX_ENABLED = os.getenv('INDEX_ENABLED', 'true').lower() == 'true'
+    INDEX_FILE = BASE_DIR / 'data' / 'reference_index.db'
+    INDEX_TTL_HOURS = float(os.getenv('INDEX_TTL_HOURS', '24'))  # 0 = nessuna scadenza
+    INDEX_PAGE_SIZE = int(os.getenv('INDEX_PAGE_SIZE', '200'))    # prodotti per pagina in ricostruzione
+    
+    # Cache delle risposte GET (LRU in memoria, SQLite opzionale)
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_TTL = float(os.getenv('CACHE_TTL', '60'))                   # secondi senza rivalidare (0 = rivalida sempre)
+    CACHE_TTLS = os.getenv('CACHE_TTLS', 'categories=600,stock_availables=0')  # eccezioni per endpoint
+    CACHE_MAX_MB = float(os.getenv('CACHE_MAX_MB', '64'))              # limite della memoria
+    CACHE_DISK = os.getenv('CACHE_DISK', 'false').lower() == 'true'   # conserva le risposte tra le esecuzioni
+    CACHE_FILE = BASE_DIR / 'data' / 'response_cache.db'
+    
+    # Indice delle immagini in assets (scansione incrementale per data di modifica delle cartelle)
+    ASSET_INDEX_ENABLED = os.getenv('ASSET_INDEX_ENABLED', 'true').lower() == 'true'
+    ASSET_INDEX_FILE = BASE_DIR / 'data' / 'asset_index.db'
+    
+    # Modalità --watch (upload dei prodotti appena cambiano le cartelle in assets)
+    WATCH_BACKEND = os.getenv('WATCH_BACKEND', 'auto')                          # auto, inotify, poll
+    WATCH_DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', '3'))                    # secondi senza modifiche prima dell'upload
+    WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '5'))          # secondi tra due controlli (poll)
+    WATCH_RECONCILE_MINUTES = float(os.getenv('WATCH_RECONCILE_MINUTES', '60'))  # riconciliazione completa (0 = mai)
+    
+    # Elenchi a pagine (iter_resources)
+    LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '200'))         # risorse per pagina
+    LIST_PREFETCH_PAGES = int(os.getenv('LIST_PREFETCH_PAGES', '0'))  # pagine scaricate in anticipo (0 = streaming)
+    
+    # Report delle richieste a fine esecuzione (in LOG_DIR)
+    METRICS_REPORT = os.getenv('METRICS_REPORT', 'true').lower() == 'true'          # JSON per endpoint
+    METRICS_PROMETHEUS = os.getenv('METRICS_PROMETHEUS', 'false').lower() == 'true'  # textfile per node_exporter
     
     # Percorsi delle cartelle
     INPUT_DIR = BASE_DIR / 'data' / 'input'
@@ -68,6 +159,22 @@ class Config:
         print(f"API Key: {cls.PRESTASHOP_API_KEY[:10]}..." if cls.PRESTASHOP_API_KEY else "API Key: NON IMPOSTATA")
         print(f"Language ID: {cls.DEFAULT_LANGUAGE_ID}")
         print(f"Upload Delay: {cls.UPLOAD_DELAY} secondi")
+        print(f"Retry: {cls.MAX_RETRIES} per richiesta, budget {cls.RETRY_BUDGET or 'illimitato'}")
+        print(f"Workers: {cls.UPLOAD_WORKERS} prodotti, {cls.IMAGE_WORKERS} immagini")
+        print(f"Upload immagini: {f'a blocchi da {cls.UPLOAD_CHUNK_SIZE // 1024} KB' if cls.UPLOAD_STREAMING else 'in memoria'}")
+        if cls.IMAGE_TRANSFORM_ENABLED:
+            print(f"Pre-elaborazione: max {cls.IMAGE_MAX_DIMENSION}px, JPEG q{cls.IMAGE_JPEG_QUALITY}, cache {cls.IMAGE_CACHE_DIR}")
+        print(f"Sync immagini: {'differenziale' if cls.SYNC_MODE == 'diff' else 'sostituzione completa'}")
+        if cls.RATE_LIMIT_ENABLED:
+            print(f"Rate limit: {cls.RATE_TARGET_RPS} req/s (max {cls.RATE_MAX_RPS}), {cls.MAX_IN_FLIGHT} in volo")
+        print(f"HTTP Pool: {cls.HTTP_POOL_MAXSIZE} connessioni/host (keep-alive: {'sì' if cls.HTTP_KEEP_ALIVE else 'no'})")
+        print(f"Indice reference: {cls.INDEX_FILE if cls.INDEX_ENABLED else 'disattivato'}")
+        print(f"Indice assets: {cls.ASSET_INDEX_FILE if cls.ASSET_INDEX_ENABLED else 'disattivato'}")
+        if cls.CACHE_ENABLED:
+            print(f"Cache risposte: TTL {cls.CACHE_TTL:g}s, max {cls.CACHE_MAX_MB:g} MB"
+                  f"{f', su disco in {cls.CACHE_FILE}' if cls.CACHE_DISK else ''}")
+        if cls.METRICS_REPORT:
+            print(f"Report richieste: JSON{' + Prometheus' if cls.METRICS_PROMETHEUS else ''} in {cls.LOG_DIR}")
         print(f"Input Dir: {cls.INPUT_DIR}")
         print(f"Log Level: {cls.LOG_LEVEL}")
         print("="*50 + "\n")
\ No newline at end of file
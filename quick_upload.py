@@ -1,16 +1,33 @@
 #!/usr/bin/env python3
 """
 Upload veloce immagini - versione senza menu
-Uso: python quick_images.py [csv_file | --all | reference]
+Uso: python quick_upload.py [csv_file | --all | reference] [opzioni]
 """
 
 import sys
+import asyncio
+import argparse
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from config.config import Config
 from src.api_client import PrestaShopAPI
-from upload_images_only import ImageUploader
+from src.async_api_client import AsyncPrestaShopAPI
+from src.reference_index import ReferenceIndex
+from src.response_cache import ResponseCache
+from src.image_manifest import ImageManifest
+from src.asset_index import AssetIndex
+from src.rate_limiter import RateLimiter
+from src.journal import RunJournal
+from src.image_processing import ImagePreprocessor
+from src.metrics import RequestMetrics, report_path, print_summary
+from src.planner import SyncPlanner, print_plan, write_plan
+from src.watcher import WatchDaemon
+from src.sharding import Shard, run_shards
+from src.pipeline import iter_csv_references
+from src.retry import RetryPolicy
+from src.profiling import start_profiler, stop_profiler
+from upload_images_only import ImageUploader, AsyncImageUploader
 import logging
 
 logging.basicConfig(
@@ -18,56 +35,351 @@ logging.basicConfig(
     format='%(asctime)s - %(message)s'
 )
 
-def main():
-    if len(sys.argv) < 2:
-        print("Uso:")
-        print("  python quick_images.py file.csv      # Upload da CSV")
-        print("  python quick_images.py --all         # Upload tutte le cartelle")
-        print("  python quick_images.py PROD001       # Upload singolo prodotto")
+def parse_args():
+    """Legge gli argomenti da riga di comando"""
+    parser = argparse.ArgumentParser(
+        description="Upload veloce immagini prodotto su PrestaShop",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Esempi:\n"
+            "  python quick_upload.py file.csv              # Upload da CSV\n"
+            "  python quick_upload.py --all                 # Upload tutte le cartelle\n"
+            "  python quick_upload.py PROD001               # Upload singolo prodotto\n"
+            "  python quick_upload.py file.csv --workers 8  # 8 prodotti in parallelo\n"
+            "  python quick_upload.py --all --async --workers 200  # Client asincrono\n"
+            "  python quick_upload.py --all --sync-mode diff   # Solo immagini cambiate\n"
+            "  python quick_upload.py --all --transform     # Ridimensiona prima dell'upload\n"
+            "  python quick_upload.py file.csv --resume     # Riprende un'esecuzione interrotta\n"
+            "  python quick_upload.py --all --plan          # Piano e stima dei tempi, senza modifiche\n"
+            "  python quick_upload.py --watch --sync-mode diff  # Resta in ascolto e carica le foto nuove\n"
+            "  python quick_upload.py --all --shard 2/4     # Solo la seconda di 4 parti (es. su 4 macchine)\n"
+            "  python quick_upload.py file.csv --shards 4   # 4 processi locali, report unito\n"
+            "  python quick_upload.py --all --profile       # Profilo CPU e tempi per fase\n"
+            "  python quick_upload.py --rebuild-index       # Ricostruisce l'indice reference -> ID\n"
+            "  python quick_upload.py --clear-index         # Svuota l'indice locale"
+        )
+    )
+    parser.add_argument('target', nargs='?', help="File CSV oppure reference del prodotto")
+    parser.add_argument('--all', action='store_true', help="Upload di tutte le cartelle in assets/")
+    parser.add_argument('--rebuild-index', action='store_true', help="Ricostruisce l'indice locale dal negozio")
+    parser.add_argument('--clear-index', action='store_true', help="Svuota l'indice locale")
+    parser.add_argument('--workers', type=int, default=Config.UPLOAD_WORKERS,
+                        help=f"Prodotti elaborati in parallelo, 1 = sequenziale (default {Config.UPLOAD_WORKERS})")
+    parser.add_argument('--image-workers', type=int, default=Config.IMAGE_WORKERS,
+                        help="Immagini preparate in parallelo per prodotto: lettura dei file (anticipata "
+                             f"con UPLOAD_STREAMING), hash in diff (default {Config.IMAGE_WORKERS})")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="Usa il client asincrono (asyncio) invece dei thread (non con --watch né --sync-mode diff)")
+    parser.add_argument('--sync-mode', choices=['replace', 'diff'], default=Config.SYNC_MODE,
+                        help="replace = elimina e ricarica tutto, diff = solo immagini cambiate "
+                             f"(default {Config.SYNC_MODE})")
+    parser.add_argument('--transform', action='store_true',
+                        help="Ridimensiona e ricomprime le immagini prima dell'upload (richiede Pillow)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Riprende l'ultima esecuzione saltando i prodotti già completati")
+    parser.add_argument('--plan', action='store_true',
+                        help="Calcola le azioni (eliminazioni, upload, byte) e stima la durata senza modificare il negozio")
+    parser.add_argument('--watch', action='store_true',
+                        help="Resta in esecuzione e carica i prodotti le cui cartelle in assets cambiano")
+    parser.add_argument('--shard', type=shard_arg, metavar='K/N',
+                        help="Elabora solo la parte K di N dei reference (suddivisione stabile, senza coordinamento)")
+    parser.add_argument('--shards', type=int, metavar='N',
+                        help="Lancia N processi locali, uno per shard, e unisce statistiche e report")
+    parser.add_argument('--report', type=Path, metavar='PATH',
+                        help="Percorso del report JSON delle richieste (scritto anche con METRICS_REPORT=false)")
+    parser.add_argument('--rescan-assets', action='store_true',
+                        help="Rilegge tutte le cartelle di assets ignorando l'indice salvato")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profilo CPU e tempi per fase (CSV, assets, ricerca, upload, pause...) in Config.LOG_DIR")
+    parser.add_argument('--trace-alloc', action='store_true',
+                        help="Traccia le allocazioni di memoria del percorso di lettura (tracemalloc, più lento)")
+    
+    args = parser.parse_args()
+    if not (args.target or args.all or args.rebuild_index or args.clear_index or args.watch):
+        parser.print_help()
         sys.exit(1)
     
-    arg = sys.argv[1]
+    batch = args.all or (args.target or '').endswith('.csv')
+    if args.shard is not None and not (batch or args.watch):
+        parser.error("--shard richiede un CSV, --all o --watch")
+    if args.shards is not None:
+        if args.shards < 1:
+            parser.error("--shards deve essere almeno 1")
+        if args.shard is not None or args.watch or args.plan or not batch:
+            parser.error("--shards richiede un CSV o --all (senza --shard, --watch o --plan)")
+    
+    return args
+
+def shard_arg(value):
+    """Tipo argparse per --shard K/N"""
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def resolve_csv(target):
+    """Trova il CSV indicato (percorso diretto o in data/input)"""
+    csv_path = Path(target)
+    if not csv_path.exists():
+        csv_path = Config.INPUT_DIR / target
     
+    if not csv_path.exists():
+        print(f"❌ File non trovato: {target}")
+        sys.exit(1)
+    return csv_path
+
+def open_journal(args, csv_path):
+    """Journal per le esecuzioni batch (CSV o --all), None per il singolo prodotto"""
+    if csv_path is None and not args.all:
+        return None
+    job_name = csv_path.stem if csv_path else 'assets'
+    if args.shard is not None:
+        # Un journal per shard: i processi non scrivono mai sullo stesso file
+        job_name = f"{job_name}_{args.shard.suffix}"
+    journal = RunJournal(job_name, resume=args.resume)
+    if args.resume and journal.completed():
+        print(f"⏭️  Ripresa: {len(journal.completed())} prodotti già completati verranno saltati")
+    return journal
+
+def main():
+    args = parse_args()
+    profiler = start_profiler('quick_upload', args.profile, args.trace_alloc)
+    try:
+        run(args)
+    finally:
+        stop_profiler(profiler)
+
+def run(args):
+    """Esegue l'operazione richiesta da riga di comando"""
     # Configurazione e connessione
     if not Config.validate():
         print("❌ Configurazione non valida!")
         sys.exit(1)
     
-    api = PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY)
-    if not api.test_connection():
-        print("❌ Connessione fallita!")
-        sys.exit(1)
+    if args.clear_index:
+        with ReferenceIndex() as index:
+            index.clear()
+        print(f"🗑️  Indice svuotato: {Config.INDEX_FILE}")
+        return
+    
+    index = ReferenceIndex() if Config.INDEX_ENABLED else None
+    rate_limiter = RateLimiter() if Config.RATE_LIMIT_ENABLED else None
+    retry_policy = RetryPolicy()
+    metrics = RequestMetrics()
+    
+    csv_path = None
+    if not args.all and args.target and args.target.endswith('.csv'):
+        csv_path = resolve_csv(args.target)
     
-    uploader = ImageUploader(api)
+    if args.transform:
+        Config.IMAGE_TRANSFORM_ENABLED = True
+    
+    if args.shards:
+        launch_shards(args, csv_path)
+        return
+    
+    asset_index = open_asset_index(args)
+    try:
+        upload(args, index, rate_limiter, retry_policy, metrics, csv_path, asset_index)
+    finally:
+        if asset_index is not None:
+            asset_index.close()
+
+def open_asset_index(args):
+    """Indice delle cartelle in assets (None se disattivato o non serve)"""
+    if args.rebuild_index or not (Config.ASSET_INDEX_ENABLED or args.watch):
+        return None
+    asset_index = AssetIndex()
+    if args.rescan_assets:
+        asset_index.clear()
+    return asset_index
+
+def upload(args, index, rate_limiter, retry_policy, metrics, csv_path, asset_index):
+    """Upload (o ricostruzione dell'indice) con il client sincrono o asincrono"""
+    if args.use_async and args.watch:
+        print("⚠️  --async non disponibile con --watch: upload con i thread")
+    elif args.use_async and args.sync_mode == 'diff' and not (args.rebuild_index or args.plan):
+        # Il client asincrono sostituisce sempre tutto: il diff resta al client con i thread
+        print("⚠️  Sync differenziale non disponibile con --async: upload con i thread")
+        args.use_async = False
+    elif args.use_async and not (args.rebuild_index or args.plan):
+        journal = open_journal(args, csv_path)
+        preprocessor = ImagePreprocessor.from_config()
+        try:
+            stats = asyncio.run(run_async(args, index, rate_limiter, csv_path, journal, preprocessor,
+                                          retry_policy, metrics, asset_index))
+        finally:
+            close_journal(journal)
+            if preprocessor is not None:
+                preprocessor.close()
+        print_report(stats)
+        write_run_report(metrics, stats, rate_limiter, retry_policy, args, csv_path)
+        return
     
-    # Determina cosa fare
-    if arg == '--all':
-        print("📸 Upload TUTTE le cartelle in assets/")
-        stats = uploader.process_all_assets_folders(Config.UPLOAD_DELAY)
+    cache = ResponseCache() if Config.CACHE_ENABLED else None
+    with PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY,
+                       index=index, rate_limiter=rate_limiter,
+                       retry_policy=retry_policy, metrics=metrics, cache=cache) as api:
+        if not api.test_connection():
+            print("❌ Connessione fallita!")
+            sys.exit(1)
         
-    elif arg.endswith('.csv'):
-        csv_path = Path(arg)
-        if not csv_path.exists():
-            csv_path = Config.INPUT_DIR / arg
+        if args.rebuild_index:
+            print("🔄 Ricostruzione indice dai prodotti del negozio...")
+            if index is not None:
+                total = index.rebuild(api)
+            else:
+                with ReferenceIndex() as target:
+                    total = target.rebuild(api)
+            print(f"✅ Indicizzati {total} prodotti in {Config.INDEX_FILE}")
+            write_run_report(metrics, {'products_indexed': total}, rate_limiter, retry_policy, args, None)
+            return
         
-        if not csv_path.exists():
-            print(f"❌ File non trovato: {arg}")
-            sys.exit(1)
+        manifest = ImageManifest() if args.sync_mode == 'diff' else None
+        if args.plan:
+            try:
+                run_plan(args, api, manifest, asset_index, csv_path)
+            finally:
+                if manifest is not None:
+                    manifest.close()
+            return
         
-        print(f"📸 Upload immagini da CSV: {csv_path.name}")
-        stats = uploader.process_csv(str(csv_path), Config.UPLOAD_DELAY)
+        journal = None if args.watch else open_journal(args, csv_path)
+        preprocessor = ImagePreprocessor.from_config()
+        uploader = ImageUploader(api, workers=args.workers, image_workers=args.image_workers,
+                                 manifest=manifest, journal=journal, preprocessor=preprocessor,
+                                 asset_index=asset_index, shard=args.shard)
         
+        try:
+            # Determina cosa fare
+            if args.watch:
+                stats = WatchDaemon(uploader, asset_index).run()
+                stats.update(uploader.stats)
+            
+            elif args.all:
+                print("📸 Upload TUTTE le cartelle in assets/")
+                stats = uploader.process_all_assets_folders(Config.UPLOAD_DELAY)
+            
+            elif csv_path is not None:
+                print(f"📸 Upload immagini da CSV: {csv_path.name}")
+                stats = uploader.process_csv(str(csv_path), Config.UPLOAD_DELAY)
+            
+            else:
+                # Assume sia un reference
+                print(f"📸 Upload immagini per: {args.target}")
+                stats = uploader.process_single_product(args.target)
+        finally:
+            close_journal(journal)
+            if manifest is not None:
+                manifest.close()
+            if preprocessor is not None:
+                preprocessor.close()
+    
+    print_report(stats)
+    write_run_report(metrics, stats, rate_limiter, retry_policy, args, csv_path)
+
+def run_plan(args, api, manifest, asset_index, csv_path):
+    """--plan: calcola e salva il piano senza modificare il negozio"""
+    uploader = ImageUploader(api, workers=args.workers, manifest=manifest, asset_index=asset_index,
+                             shard=args.shard)
+    if args.all:
+        references = uploader.find_asset_folders()
+    elif csv_path is not None:
+        references = [reference for _, reference in iter_csv_references(str(csv_path))]
     else:
-        # Assume sia un reference
-        print(f"📸 Upload immagini per: {arg}")
-        stats = uploader.process_single_product(arg)
+        references = [args.target]
+    references = [reference for reference in references if uploader.owns(reference)]
     
-    # Report
+    planner = SyncPlanner(api, uploader, sync_mode=args.sync_mode, workers=args.workers)
+    plan = planner.plan(references)
+    print_plan(plan)
+    print(f"📝 Piano completo: {write_plan(plan)}")
+
+async def run_async(args, index, rate_limiter, csv_path, journal, preprocessor, retry_policy, metrics,
+                    asset_index=None):
+    """Stesse modalità di main() con AsyncPrestaShopAPI"""
+    async with AsyncPrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY,
+                                  index=index, rate_limiter=rate_limiter,
+                                  retry_policy=retry_policy, metrics=metrics,
+                                  cache=ResponseCache() if Config.CACHE_ENABLED else None) as api:
+        if not await api.test_connection():
+            print("❌ Connessione fallita!")
+            sys.exit(1)
+        
+        uploader = AsyncImageUploader(api, workers=args.workers, journal=journal,
+                                      preprocessor=preprocessor, asset_index=asset_index,
+                                      shard=args.shard)
+        
+        if args.all:
+            print("📸 Upload TUTTE le cartelle in assets/ (asincrono)")
+            return await uploader.process_all_assets_folders(Config.UPLOAD_DELAY)
+        
+        if csv_path is not None:
+            print(f"📸 Upload immagini da CSV: {csv_path.name} (asincrono)")
+            return await uploader.process_csv(str(csv_path), Config.UPLOAD_DELAY)
+        
+        print(f"📸 Upload immagini per: {args.target}")
+        return await uploader.process_single_product(args.target)
+
+def close_journal(journal):
+    """Chiude il journal e segnala il CSV dei prodotti falliti"""
+    if journal is None:
+        return
+    failed_path = journal.close()
+    if failed_path:
+        print(f"📝 Prodotti falliti salvati in: {failed_path}")
+        print(f"   Rilancia con: python quick_upload.py {failed_path}")
+    print(f"📒 Journal: {journal.path}")
+
+def launch_shards(args, csv_path):
+    """--shards N: esegue gli shard come processi locali e scrive il report unito"""
+    print(f"🧩 Avvio di {args.shards} shard in processi separati")
+    metrics, stats, results = run_shards(Path(__file__).resolve(), sys.argv[1:], args.shards)
+    
+    print_report(stats)
+    write_run_report(metrics, stats, None, None, args, csv_path, shards=results)
+    failed = [result['shard'] for result in results if result['exit_code'] != 0]
+    if failed:
+        print(f"❌ Shard non completati: {', '.join(failed)} (output in {Config.LOG_DIR})")
+        print("   Rilancia con --resume per riprendere solo i prodotti mancanti")
+        sys.exit(1)
+
+def write_run_report(metrics, stats, rate_limiter, retry_policy, args, csv_path, **run_info):
+    """Scrive il report delle richieste in logs/ e mostra dove è andato il tempo"""
+    if not (Config.METRICS_REPORT or args.report):
+        return
+    if args.rebuild_index:
+        mode = 'rebuild-index'
+    elif args.watch:
+        mode = 'watch'
+    else:
+        mode = 'all' if args.all else 'csv' if csv_path is not None else 'single'
+    script = 'quick_upload'
+    if args.shard is not None:
+        script = f"{script}_{args.shard.suffix}"
+        run_info['shard'] = str(args.shard)
+    report = metrics.write_report(
+        args.report or report_path(script), stats, rate_limiter, retry_policy,
+        script=script, mode=mode, target=str(csv_path or args.target or ''),
+        client='async' if args.use_async else 'sync', workers=args.workers, **run_info,
+    )
+    print_summary(report)
+
+def print_report(stats):
+    """Stampa il riepilogo finale"""
     print(f"\n{'='*50}")
-    print(f"✅ Prodotti: {stats['products_processed']}")
-    print(f"📸 Immagini: {stats['images_uploaded']}")
-    print(f"❌ Errori: {stats['images_failed']}")
+    print(f"✅ Prodotti: {stats.get('products_processed', 0)}")
+    print(f"📸 Immagini: {stats.get('images_uploaded', 0)}")
+    print(f"❌ Errori: {stats.get('images_failed', 0)}")
+    if stats.get('lookup_failed'):
+        print(f"❌ Ricerche fallite: {stats['lookup_failed']} prodotti (da riprovare con --resume)")
+    if stats.get('images_unchanged') or stats.get('products_unchanged'):
+        print(f"♻️  Invariate: {stats['images_unchanged']} immagini, {stats['products_unchanged']} prodotti")
     print(f"{'='*50}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  Upload interrotto dall'utente (usa --resume per riprendere)")
+        sys.exit(130)
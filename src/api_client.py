@@ -3,37 +3,291 @@ Client API per comunicare con PrestaShop - VERSIONE CON IMMAGINI LOCALI
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import xml.etree.ElementTree as ET
 import logging
 import time
 import os
+import io
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple, Union, Iterator, Iterable, Set
+
+from config.config import Config
+from src.retry import RetryPolicy
+from src.metrics import RequestMetrics, endpoint_label
+from src.profiling import phase
+from src.multipart import MultipartBody
+from src.records import Record, Product, Image, StockAvailable, json_list_items
 
 # Configurazione logging
 logger = logging.getLogger(__name__)
 
+def _is_connect_error(error: Exception) -> bool:
+    """True se la connessione è fallita prima di inviare la richiesta"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+    return False
+
+def _request_size(kwargs: Dict) -> int:
+    """Byte del corpo di una richiesta (da Content-Length o dalla lunghezza dei dati)"""
+    length = (kwargs.get('headers') or {}).get('Content-Length')
+    if length:
+        return int(length)
+    data = kwargs.get('data')
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    try:
+        return len(data) if data is not None else 0
+    except TypeError:
+        return 0
+
+def _reference_filters(references: List[str], chunk_size: int) -> List[Tuple[str, List[str]]]:
+    """
+    Valori di filter[reference] a gruppi: [A|B|C], da soli quelli con caratteri speciali
+    
+    Returns:
+        Lista di coppie (valore del filtro, reference del gruppo)
+    """
+    # I caratteri speciali del filtro non possono stare in una lista OR
+    batchable = [ref for ref in references if not any(c in ref for c in '|[]')]
+    single = [ref for ref in references if any(c in ref for c in '|[]')]
+    
+    chunks = [
+        ('[' + '|'.join(batchable[i:i + chunk_size]) + ']', batchable[i:i + chunk_size])
+        for i in range(0, len(batchable), chunk_size)
+    ]
+    chunks.extend((ref, [ref]) for ref in single)
+    return chunks
+
+def _parse_image_id(content: bytes) -> Optional[str]:
+    """Legge l'ID dalla risposta all'upload di un'immagine (None se assente)"""
+    try:
+        return ET.fromstring(content).findtext('.//image/id') or None
+    except ET.ParseError:
+        return None
+
+def _iter_list_items(source) -> Iterator[ET.Element]:
+    """
+    Elementi di una risposta a elenco (<prestashop><products><product>...)
+    letti con iterparse: ogni elemento è staccato dal documento appena
+    restituito, quindi in memoria resta solo quello corrente.
+    """
+    depth = 0
+    container = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2:
+                container = element
+            continue
+        
+        depth -= 1
+        if depth == 2:
+            yield element
+            container.remove(element)
+
+def _iter_json_items(source) -> Iterator[Dict]:
+    """Risorse di una risposta JSON a elenco (la pagina intera è decodificata in una volta)"""
+    yield from json_list_items(json.load(source))
+
 class PrestaShopAPI:
     """Gestisce tutte le comunicazioni con le API di PrestaShop"""
     
-    def __init__(self, api_url: str, api_key: str):
+    # Formati immagine accettati dal webservice
+    IMAGE_CONTENT_TYPES = {
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png',
+        '.gif': 'image/gif',
+        '.webp': 'image/webp'
+    }
+    
+    # Campi chiesti per risolvere i reference
+    LOOKUP_FIELDS = ('id', 'reference', 'date_upd')
+    
+    def __init__(self, api_url: str, api_key: str,
+                 pool_connections: Optional[int] = None,
+                 pool_maxsize: Optional[int] = None,
+                 pool_block: Optional[bool] = None,
+                 keep_alive: Optional[bool] = None,
+                 index=None,
+                 rate_limiter=None,
+                 retry_policy=None,
+                 wire_format: Optional[str] = None,
+                 metrics=None,
+                 cache=None):
         """
         Inizializza il client API
         
         Args:
             api_url: URL base delle API (es. https://shop.com/api)
             api_key: Chiave API di PrestaShop
+            pool_connections: Numero di host diversi tenuti nel pool (default da Config)
+            pool_maxsize: Connessioni massime verso lo stesso host (default da Config)
+            pool_block: Se True, attende una connessione libera invece di aprirne di extra
+            keep_alive: Se False, chiude la connessione dopo ogni richiesta
+            index: ReferenceIndex opzionale consultato prima di interrogare il negozio
+                   (viene chiuso insieme al client)
+            rate_limiter: RateLimiter condiviso che regola tutte le richieste (None = nessun limite)
+            retry_policy: RetryPolicy per gli errori temporanei (default da Config.MAX_RETRIES)
+            wire_format: Formato delle letture di record, 'xml' o 'json' (default Config.WIRE_FORMAT)
+            metrics: RequestMetrics dove registrare ogni richiesta (default: una nuova)
+            cache: ResponseCache opzionale per le letture di get() e get_json()
+                   (invalidata dalle scritture, viene chiusa insieme al client)
         """
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
         self.auth = (api_key, "")  # PrestaShop usa solo username, password vuota
         
+        self.pool_connections = pool_connections if pool_connections is not None else Config.HTTP_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else Config.HTTP_POOL_MAXSIZE
+        self.pool_block = pool_block if pool_block is not None else Config.HTTP_POOL_BLOCK
+        self.keep_alive = keep_alive if keep_alive is not None else Config.HTTP_KEEP_ALIVE
+        self.index = index
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.wire_format = (wire_format or Config.WIRE_FORMAT).lower()
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.cache = cache
+        # PATCH accettato dal negozio (None = non ancora provato)
+        self.patch_supported: Optional[bool] = None
+        
+        # Sessione condivisa: riusa le connessioni TCP/TLS tra le chiamate
+        self.session = self._create_session()
+    
+    def _create_session(self) -> requests.Session:
+        """Crea la sessione HTTP con pool di connessioni keep-alive"""
+        session = requests.Session()
+        session.auth = self.auth
+        
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        
+        return session
+    
+    def close(self):
+        """Chiude la sessione e tutte le connessioni del pool"""
+        self.session.close()
+        if self.index is not None:
+            self.index.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+        
+    def _send(self, method: str, url: str, latency_sensitive: bool = True, **kwargs) -> requests.Response:
+        """
+        Invia una richiesta con la sessione condivisa, con retry e rate limiter
+        
+        Args:
+            method: Metodo HTTP
+            url: URL completo
+            latency_sensitive: False per richieste lente per natura (upload immagini)
+            **kwargs: Parametri passati a requests (params, data, files, timeout...)
+            
+        Returns:
+            Ultima risposta ricevuta (anche se con status di errore)
+            
+        Raises:
+            requests.RequestException: Errore di rete non più ripetibile
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self._send_once(method, url, latency_sensitive, **kwargs)
+            except requests.exceptions.RequestException as e:
+                connect_error = _is_connect_error(e)
+                delay = self.retry_policy.next_delay(
+                    method, attempt,
+                    connect_error=connect_error,
+                    transport_error=not connect_error
+                )
+                if delay is None:
+                    raise
+                reason = str(e)
+            else:
+                delay = self.retry_policy.next_delay(
+                    method, attempt,
+                    status_code=response.status_code,
+                    retry_after=response.headers.get('Retry-After')
+                )
+                if delay is None:
+                    return response
+                reason = f"Status {response.status_code}"
+                response.close()
+            
+            attempt += 1
+            self.metrics.record_retry(method, endpoint_label(self.api_url, url))
+            logger.warning(
+                f"🔁 {method} {url[len(self.api_url):] or '/'}: {reason} - "
+                f"tentativo {attempt}/{self.retry_policy.max_retries} tra {delay:.1f}s"
+            )
+            with phase('backoff'):
+                time.sleep(delay)
+    
+    def _send_once(self, method: str, url: str, latency_sensitive: bool, **kwargs) -> requests.Response:
+        """Un singolo tentativo, passando dal rate limiter se presente"""
+        try:
+            if self.rate_limiter is None:
+                return self._request_measured(method, url, **kwargs)
+            
+            with self.rate_limiter.slot(latency_sensitive) as slot:
+                response = self._request_measured(method, url, **kwargs)
+                slot.record(response.status_code, response.headers.get('Retry-After'))
+                return response
+        finally:
+            if method != 'GET' and self.cache is not None:
+                # Anche una scrittura fallita o interrotta può aver cambiato la risorsa
+                self.cache.invalidate(url[len(self.api_url):])
+    
+    def _request_measured(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Esegue la richiesta registrandone durata, status e byte in self.metrics
+        
+        Con stream=True la durata arriva alle intestazioni e i byte ricevuti
+        sono quelli di Content-Length (se il server lo invia).
+        """
+        endpoint = endpoint_label(self.api_url, url)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.metrics.record(method, endpoint, None, time.perf_counter() - started, _request_size(kwargs))
+            raise
+        
+        length = response.headers.get('Content-Length')
+        if length is not None:
+            received = int(length)
+        else:
+            received = 0 if kwargs.get('stream') else len(response.content)
+        self.metrics.record(method, endpoint, response.status_code, time.perf_counter() - started,
+                            _request_size(kwargs), received)
+        return response
+    
     def test_connection(self) -> bool:
         """Testa se la connessione funziona"""
         try:
-            response = requests.get(
-                self.api_url,
-                auth=self.auth,
+            response = self._send(
+                'GET', self.api_url,
                 timeout=10
             )
             
@@ -48,36 +302,236 @@ class PrestaShopAPI:
             logger.error(f"❌ Errore connessione: {e}")
             return False
     
-    def get(self, endpoint: str, params: Optional[Dict] = None) -> Optional[ET.Element]:
+    def get(self, endpoint: str, params: Optional[Dict] = None, cache: bool = True) -> Optional[ET.Element]:
         """
         Esegue una richiesta GET
         
         Args:
             endpoint: Endpoint API (es. 'products', 'categories')
             params: Parametri query opzionali
+            cache: Se False legge sempre dal negozio (es. prima di un PUT)
             
         Returns:
             Risposta XML parsata o None se errore
         """
         try:
-            url = f"{self.api_url}/{endpoint}"
-            response = requests.get(
-                url,
-                auth=self.auth,
-                params=params,
-                timeout=30
-            )
+            content = self._get_content(endpoint, params, cache)
+            return ET.fromstring(content) if content is not None else None
+                
+        except Exception as e:
+            logger.error(f"Errore GET {endpoint}: {e}")
+            return None
+    
+    def _get_content(self, endpoint: str, params: Optional[Dict], cache: bool = True) -> Optional[bytes]:
+        """
+        Corpo di una GET passando da self.cache (se presente)
+        
+        Una voce valida si riusa senza richieste; una scaduta con ETag o
+        Last-Modified si rivalida con una GET condizionale (304 = corpo in cache).
+        
+        Returns:
+            Corpo della risposta 200 (o della voce in cache), None se errore
             
-            if response.status_code == 200:
-                return ET.fromstring(response.content)
-            else:
-                logger.error(f"GET {endpoint} fallito: Status {response.status_code}")
-                return None
+        Raises:
+            requests.RequestException: Errore di rete non più ripetibile
+        """
+        entry = None
+        generation = None
+        if cache and self.cache is not None:
+            entry, fresh = self.cache.lookup(endpoint, params)
+            if fresh:
+                return entry.body
+            # Una scrittura concorrente durante la GET rende la risposta non salvabile
+            generation = self.cache.generation(endpoint)
+        
+        response = self._send(
+            'GET', f"{self.api_url}/{endpoint}",
+            params=params,
+            headers=entry.conditional_headers() if entry is not None else None,
+            timeout=30
+        )
+        if response.status_code == 304 and entry is not None:
+            self.cache.revalidated(endpoint, params, entry, generation)
+            return entry.body
+        if response.status_code != 200:
+            logger.error(f"GET {endpoint} fallito: Status {response.status_code}")
+            return None
+        if cache and self.cache is not None:
+            self.cache.store(endpoint, params, response.content, response.headers, generation)
+        return response.content
+    
+    def iter_resources(self, endpoint: str, display: str = 'full',
+                       filters: Optional[Dict[str, str]] = None,
+                       page_size: Optional[int] = None,
+                       prefetch: Optional[int] = None,
+                       sort: str = '[id_ASC]') -> Iterator[ET.Element]:
+        """
+        Scorre tutte le risorse di un endpoint a pagine, senza caricare l'elenco in memoria
+        
+        Le pagine si richiedono con limit=offset,count e si leggono con
+        iterparse. Senza prefetch la pagina è letta direttamente dalla
+        connessione mentre arriva; con prefetch le pagine successive si
+        scaricano in parallelo mentre si elabora quella corrente.
+        
+        Args:
+            endpoint: Endpoint API (es. 'products', 'combinations')
+            display: Campi da includere ('full' o es. '[id,reference]')
+            filters: Filtri come {'active': '1'} -> filter[active]=1
+            page_size: Risorse per pagina (default Config.LIST_PAGE_SIZE)
+            prefetch: Pagine scaricate in anticipo (default Config.LIST_PREFETCH_PAGES, 0 = streaming)
+            sort: Ordinamento stabile, necessario per non perdere risorse tra le pagine
+            
+        Yields:
+            Un elemento per risorsa (es. <product>), già staccato dal documento
+            
+        Raises:
+            requests.RequestException: Pagina non scaricabile (elenco incompleto)
+        """
+        params = self._list_params(display, filters, sort)
+        return self._iter_pages(endpoint, params, page_size, prefetch, _iter_list_items)
+    
+    def _list_params(self, display: str, filters: Optional[Dict[str, str]], sort: str = '[id_ASC]') -> Dict:
+        """Parametri di un elenco: display, ordinamento e filtri"""
+        params = {'display': display, 'sort': sort}
+        for field, value in (filters or {}).items():
+            params[f'filter[{field}]'] = value
+        return params
+    
+    def _iter_pages(self, endpoint: str, params: Dict, page_size: Optional[int],
+                    prefetch: Optional[int], parse) -> Iterator:
+        """
+        Scorre le pagine di un elenco passando ogni risposta a `parse`
+        
+        Args:
+            parse: Funzione file -> risorse della pagina (XML con iterparse o JSON)
+        """
+        page_size = page_size or Config.LIST_PAGE_SIZE
+        prefetch = Config.LIST_PREFETCH_PAGES if prefetch is None else prefetch
+        
+        if prefetch <= 0:
+            offset = 0
+            while True:
+                response = self._get_page(endpoint, params, offset, page_size, stream=True)
+                try:
+                    response.raw.decode_content = True
+                    count = 0
+                    for item in parse(response.raw):
+                        count += 1
+                        yield item
+                finally:
+                    response.close()
+                
+                if count < page_size:
+                    return
+                offset += page_size
+        
+        with ThreadPoolExecutor(max_workers=prefetch) as pool:
+            pages = deque(
+                pool.submit(self._get_page, endpoint, params, number * page_size, page_size)
+                for number in range(prefetch + 1)
+            )
+            next_page = prefetch + 1
+            try:
+                while pages:
+                    response = pages.popleft().result()
+                    count = 0
+                    for item in parse(io.BytesIO(response.content)):
+                        count += 1
+                        yield item
+                    
+                    if count < page_size:
+                        return
+                    pages.append(pool.submit(self._get_page, endpoint, params, next_page * page_size, page_size))
+                    next_page += 1
+            finally:
+                for page in pages:
+                    page.cancel()
+    
+    def iter_records(self, record_cls, fields: Optional[List[str]] = None,
+                     filters: Optional[Dict[str, str]] = None,
+                     page_size: Optional[int] = None,
+                     prefetch: Optional[int] = None) -> Iterator[Record]:
+        """
+        Come iter_resources, ma restituisce record tipizzati con i soli campi richiesti
+        
+        Args:
+            record_cls: Classe del record (Product, Category, StockAvailable)
+            fields: Campi da scaricare (display=[...]), default tutti
+            filters: Filtri come {'active': '1'}
+        
+        Esempio:
+            for product in api.iter_records(Product, ['reference', 'date_upd']):
+                print(product.id, product.reference)
+        """
+        fields = record_cls.fields(fields)
+        params = self._list_params(record_cls.display(fields), filters)
+        
+        if self.wire_format == 'json':
+            params['output_format'] = 'JSON'
+            for item in self._iter_pages(record_cls.ENDPOINT, params, page_size, prefetch, _iter_json_items):
+                yield record_cls.from_json(item, fields)
+            return
+        
+        for element in self._iter_pages(record_cls.ENDPOINT, params, page_size, prefetch, _iter_list_items):
+            yield record_cls.from_element(element, fields)
+    
+    def find_records(self, record_cls, fields: Optional[List[str]] = None,
+                     filters: Optional[Dict[str, str]] = None,
+                     limit: Optional[int] = None) -> Optional[List[Record]]:
+        """
+        Una sola richiesta per pochi record (ricerche, controlli)
+        
+        Returns:
+            Lista di record, None se la richiesta è fallita
+        """
+        fields = record_cls.fields(fields)
+        params = {'display': record_cls.display(fields)}
+        for field, value in (filters or {}).items():
+            params[f'filter[{field}]'] = value
+        if limit:
+            params['limit'] = str(limit)
+        
+        root = self._get_list(record_cls.ENDPOINT, params)
+        if root is None:
+            return None
+        return record_cls.from_list(root, fields)
+    
+    def _get_page(self, endpoint: str, params: Dict, offset: int, page_size: int,
+                  stream: bool = False) -> requests.Response:
+        """Scarica una pagina di un elenco (errore se lo status non è 200)"""
+        response = self._send(
+            'GET', f"{self.api_url}/{endpoint}",
+            params=dict(params, limit=f"{offset},{page_size}"),
+            stream=stream,
+            timeout=60
+        )
+        if response.status_code != 200:
+            response.close()
+            logger.error(f"GET {endpoint} (offset {offset}) fallito: Status {response.status_code}")
+            raise requests.HTTPError(f"Status {response.status_code}", response=response)
+        return response
+    
+    def get_json(self, endpoint: str, params: Optional[Dict] = None, cache: bool = True):
+        """
+        Come get(), ma con output_format=JSON
+        
+        Returns:
+            Risposta JSON decodificata (dict, oppure [] per un elenco vuoto) o None se errore
+        """
+        try:
+            content = self._get_content(endpoint, dict(params or {}, output_format='JSON'), cache)
+            return json.loads(content) if content is not None else None
                 
         except Exception as e:
             logger.error(f"Errore GET {endpoint}: {e}")
             return None
     
+    def _get_list(self, endpoint: str, params: Dict):
+        """Legge un elenco nel formato scelto (ET.Element o JSON), da passare a Record.from_list"""
+        if self.wire_format == 'json':
+            return self.get_json(endpoint, params)
+        return self.get(endpoint, params)
+    
     def post(self, endpoint: str, xml_data: str) -> Optional[ET.Element]:
         """
         Esegue una richiesta POST (per creare risorse)
@@ -91,10 +545,9 @@ class PrestaShopAPI:
         """
         try:
             url = f"{self.api_url}/{endpoint}"
-            response = requests.post(
-                url,
-                auth=self.auth,
-                data=xml_data,
+            response = self._send(
+                'POST', url,
+                data=xml_data.encode('utf-8'),
                 headers={'Content-Type': 'application/xml'},
                 timeout=30
             )
@@ -124,10 +577,9 @@ class PrestaShopAPI:
         """
         try:
             url = f"{self.api_url}/{endpoint}"
-            response = requests.put(
-                url,
-                auth=self.auth,
-                data=xml_data,
+            response = self._send(
+                'PUT', url,
+                data=xml_data.encode('utf-8'),
                 headers={'Content-Type': 'application/xml'},
                 timeout=30
             )
@@ -143,6 +595,83 @@ class PrestaShopAPI:
             logger.error(f"Errore PUT {endpoint}: {e}")
             return False
     
+    def patch(self, endpoint: str, xml_data: str) -> bool:
+        """
+        Esegue una richiesta PATCH (aggiorna solo i campi inviati)
+        
+        Se il negozio non supporta PATCH (405/501) imposta patch_supported
+        a False, così update_record passa al PUT.
+        
+        Args:
+            endpoint: Endpoint API con ID (es. 'products/123')
+            xml_data: Dati XML con i soli campi da modificare
+            
+        Returns:
+            True se successo, False altrimenti
+        """
+        try:
+            url = f"{self.api_url}/{endpoint}"
+            response = self._send(
+                'PATCH', url,
+                data=xml_data.encode('utf-8'),
+                headers={'Content-Type': 'application/xml'},
+                timeout=30
+            )
+            
+            if response.status_code == 200:
+                self.patch_supported = True
+                logger.info(f"✅ Risorsa aggiornata (PATCH): {endpoint}")
+                return True
+            if response.status_code in (405, 501) and not self.patch_supported:
+                if self.patch_supported is None:
+                    logger.warning("⚠️  PATCH non supportato dal negozio: aggiornamenti con PUT della risorsa completa")
+                self.patch_supported = False
+                return False
+            logger.error(f"PATCH {endpoint} fallito: Status {response.status_code}")
+            logger.debug(f"Risposta: {response.text[:500]}")
+            return False
+                
+        except Exception as e:
+            logger.error(f"Errore PATCH {endpoint}: {e}")
+            return False
+    
+    def update_record(self, record_cls, resource_id: str, values: Dict, method: Optional[str] = None) -> bool:
+        """
+        Aggiorna alcuni campi di una risorsa
+        
+        Con PATCH si inviano solo i campi cambiati; se il negozio non lo
+        supporta si rilegge la risorsa completa, si modificano i campi e
+        la si rimanda con PUT (due richieste e un documento intero).
+        
+        Args:
+            record_cls: Classe del record (Product, StockAvailable)
+            resource_id: ID della risorsa
+            values: Campo -> nuovo valore (solo campi in record_cls.WRITABLE)
+            method: 'auto', 'patch' o 'put' (default Config.UPDATE_METHOD)
+        
+        Returns:
+            True se successo, False altrimenti
+        """
+        method = (method or Config.UPDATE_METHOD).lower()
+        endpoint = f"{record_cls.ENDPOINT}/{resource_id}"
+        
+        if method != 'put' and self.patch_supported is not False:
+            if self.patch(endpoint, record_cls.to_xml(resource_id, values)):
+                return True
+            if method == 'patch' or self.patch_supported is not False:
+                return False
+        elif method == 'patch':
+            logger.error(f"PATCH {endpoint} non supportato dal negozio")
+            return False
+        
+        # La risorsa completa va riletta dal negozio: il PUT la sovrascrive tutta
+        root = self.get(endpoint, cache=False)
+        element = root.find(record_cls.TAG) if root is not None else None
+        if element is None:
+            return False
+        record_cls.apply(element, values)
+        return self.put(endpoint, ET.tostring(root, encoding='unicode'))
+    
     def delete(self, endpoint: str) -> bool:
         """
         Esegue una richiesta DELETE
@@ -155,9 +684,8 @@ class PrestaShopAPI:
         """
         try:
             url = f"{self.api_url}/{endpoint}"
-            response = requests.delete(
-                url,
-                auth=self.auth,
+            response = self._send(
+                'DELETE', url,
                 timeout=30
             )
             
@@ -182,47 +710,144 @@ class PrestaShopAPI:
         Returns:
             ID del prodotto se trovato, None altrimenti
         """
-        params = {
-            'filter[reference]': reference,
-            'display': 'full'
-        }
+        product_id = self.search_references([reference]).get(reference)
         
-        root = self.get('products', params)
-        if root is not None:
-            products = root.findall('.//product')
-            if products:
-                product_id = products[0].find('id').text
-                logger.info(f"Prodotto trovato: {reference} (ID: {product_id})")
-                return product_id
-        
-        logger.info(f"Prodotto non trovato: {reference}")
-        return None
+        if product_id:
+            logger.info(f"Prodotto trovato: {reference} (ID: {product_id})")
+        else:
+            logger.info(f"Prodotto non trovato: {reference}")
+        return product_id
     
-    def search_by_reference(self, reference: str) -> Optional[str]:
+    def search_references(self, references: List[str], chunk_size: Optional[int] = None) -> Dict[str, str]:
         """
-        Cerca un prodotto per reference
+        Risolve in blocco molti reference nei rispettivi ID prodotto
+        
+        Usa il filtro OR di PrestaShop (filter[reference]=[A|B|C]) chiedendo
+        solo i campi id e reference, quindi poche richieste leggere invece
+        di una richiesta display=full per ogni prodotto.
         
         Args:
-            reference: Reference del prodotto
+            references: Lista di reference da cercare
+            chunk_size: Reference per richiesta (default Config.LOOKUP_BATCH_SIZE)
             
         Returns:
-            ID del prodotto se trovato, None altrimenti
+            Dizionario reference -> ID prodotto (solo per i prodotti trovati;
+            lookup_references distingue anche le richieste fallite)
+        """
+        return self.lookup_references(references, chunk_size)[0]
+    
+    def lookup_references(self, references: List[str],
+                          chunk_size: Optional[int] = None) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Come search_references, ma separa i reference delle richieste fallite
+        
+        Returns:
+            Tupla (reference -> ID prodotto, reference non verificati per
+            richieste fallite): un reference assente da entrambi non esiste sul negozio
+        """
+        unique, cached, missing, requests_params = self._plan_reference_lookup(references, chunk_size)
+        roots = [self._get_list('products', params) for _, params in requests_params]
+        return self._collect_reference_results(roots, unique, cached, requests_params)
+    
+    def _plan_reference_lookup(self, references: List[str], chunk_size: Optional[int] = None):
         """
-        params = {
-            'filter[reference]': reference,
-            'display': 'full'
-        }
+        Prepara le richieste per lookup_references (condiviso col client asincrono)
         
-        root = self.get('products', params)
-        if root is not None:
-            products = root.findall('.//product')
-            if products:
-                product_id = products[0].find('id').text
-                logger.info(f"Prodotto trovato: {reference} (ID: {product_id})")
-                return product_id
+        Returns:
+            Tupla (reference unici, trovati in indice, mancanti,
+            coppie (reference del gruppo, parametri della richiesta))
+        """
+        chunk_size = chunk_size or Config.LOOKUP_BATCH_SIZE
         
-        logger.info(f"Prodotto non trovato: {reference}")
-        return None
+        # Rimuove duplicati e vuoti mantenendo l'ordine
+        unique = [ref for ref in dict.fromkeys(r.strip() for r in references) if ref]
+        
+        # Prima l'indice locale, poi il negozio solo per i reference mancanti
+        cached = self.index.get_many(unique) if self.index is not None else {}
+        missing = [ref for ref in unique if ref not in cached]
+        
+        requests_params = [
+            (chunk, {'filter[reference]': filter_value, 'display': Product.display(self.LOOKUP_FIELDS)})
+            for filter_value, chunk in _reference_filters(missing, chunk_size)
+        ]
+        return unique, cached, missing, requests_params
+    
+    def find_by_reference(self, references: Iterable[str], fields: Iterable[str],
+                          chunk_size: Optional[int] = None) -> Tuple[Dict[str, Product], List[str]]:
+        """
+        Prodotti con i campi indicati, cercati in blocco per reference
+        
+        Come lookup_references, ma restituisce anche lo stato attuale dei
+        campi (per confrontarlo con i valori desiderati) senza passare
+        dall'indice locale.
+        
+        Args:
+            references: Reference da cercare
+            fields: Campi da leggere oltre a id e reference
+            chunk_size: Reference per richiesta (default Config.LOOKUP_BATCH_SIZE)
+        
+        Returns:
+            Tupla (reference (come richiesto) -> Product, reference non
+            verificati per richieste fallite)
+        """
+        chunk_size = chunk_size or Config.LOOKUP_BATCH_SIZE
+        unique = [ref for ref in dict.fromkeys(r.strip() for r in references) if ref]
+        fields = Product.fields(('reference',) + tuple(fields))
+        
+        found = {}
+        failed = []
+        for filter_value, chunk in _reference_filters(unique, chunk_size):
+            products = self.find_records(Product, fields, filters={'reference': filter_value})
+            if products is None:
+                failed.extend(chunk)
+                continue
+            for product in products:
+                if product.reference:
+                    # Con reference duplicati sul negozio vince il primo (come search_references)
+                    found.setdefault(product.reference.lower(), product)
+        return {ref: found[ref.lower()] for ref in unique if ref.lower() in found}, failed
+    
+    def _collect_reference_results(self, roots, unique, cached,
+                                   requests_params) -> Tuple[Dict[str, str], List[str]]:
+        """Unisce le risposte di lookup_references e aggiorna l'indice locale"""
+        found = {}
+        dates = {}
+        missing = []
+        failed = []
+        for root, (chunk, _) in zip(roots, requests_params):
+            if root is None:
+                # Richiesta fallita: i reference del gruppo non sono "non trovati"
+                failed.extend(chunk)
+                continue
+            missing.extend(chunk)
+            for product in Product.from_list(root, self.LOOKUP_FIELDS):
+                if product.id and product.reference and product.reference not in found:
+                    # Con reference duplicati sul negozio vince il primo (come prima)
+                    found[product.reference] = product.id
+                    dates[product.reference] = product.date_upd
+        
+        # Il confronto lato MySQL non distingue maiuscole/minuscole
+        by_lower = {}
+        for ref, product_id in found.items():
+            by_lower.setdefault(ref.lower(), product_id)
+        result = dict(cached)
+        for ref in missing:
+            product_id = found.get(ref) or by_lower.get(ref.lower())
+            if product_id:
+                result[ref] = product_id
+        
+        if self.index is not None:
+            self.index.set_many(
+                (ref, result[ref], dates.get(ref)) for ref in missing if ref in result
+            )
+        
+        logger.info(
+            f"Risolti {len(result)}/{len(unique)} reference "
+            f"({len(cached)} da indice locale, {len(roots)} richieste)"
+        )
+        if failed:
+            logger.warning(f"{len(failed)} reference non verificati per richieste fallite")
+        return {ref: result[ref] for ref in unique if ref in result}, failed
     
     def upload_image_from_path(self, product_id: str, image_path: str, position: int = 1) -> bool:
         """
@@ -236,63 +861,220 @@ class PrestaShopAPI:
         Returns:
             True se successo, False altrimenti
         """
+        prepared = self.prepare_image(image_path)
+        if prepared is None:
+            return False
+        
+        filename, image_data, content_type = prepared
+        return self.upload_image_data(product_id, filename, image_data, position, content_type)
+    
+    def prepare_image(self, image_path) -> Optional[Tuple[str, Union[bytes, Path], str]]:
+        """
+        Verifica e legge un file immagine locale (nessuna chiamata di rete)
+        
+        Separato dall'upload così la lettura da disco può avvenire in
+        parallelo mentre un'altra immagine è in trasferimento. Con
+        Config.UPLOAD_STREAMING il file non viene letto (l'upload lo
+        invierà a blocchi dal disco): si chiede invece al sistema di
+        caricarlo in anticipo nella cache delle pagine.
+        
+        Args:
+            image_path: Percorso del file immagine sul PC
+            
+        Returns:
+            Tupla (nome file, contenuto o percorso, content type) o None se non valido
+        """
         try:
             # Verifica che il file esista
-            image_path = Path(image_path.strip())
-            if not image_path.exists():
+            image_path = Path(str(image_path).strip())
+            try:
+                file_size = image_path.stat().st_size
+            except FileNotFoundError:
                 logger.error(f"❌ File immagine non trovato: {image_path}")
-                return False
+                return None
             
             # Verifica che sia un'immagine valida
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-            if image_path.suffix.lower() not in valid_extensions:
+            if image_path.suffix.lower() not in self.IMAGE_CONTENT_TYPES:
                 logger.error(f"❌ Formato immagine non valido: {image_path.suffix}")
-                return False
+                if image_path.suffix.lower() == '.bmp':
+                    logger.error("   Attiva IMAGE_TRANSFORM_ENABLED per convertire i BMP in JPEG")
+                return None
             
             # Verifica dimensione file (max 8MB per sicurezza)
-            file_size_mb = image_path.stat().st_size / (1024 * 1024)
+            file_size_mb = file_size / (1024 * 1024)
             if file_size_mb > 8:
                 logger.warning(f"⚠️  Immagine molto grande ({file_size_mb:.1f}MB): {image_path.name}")
             
+            content_type = self.IMAGE_CONTENT_TYPES[image_path.suffix.lower()]
+            if Config.UPLOAD_STREAMING:
+                if hasattr(os, 'posix_fadvise'):
+                    # Lettura anticipata in background: l'invio a blocchi non aspetterà il disco
+                    with open(image_path, 'rb') as f:
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                return image_path.name, image_path, content_type
+            
             # Leggi il file
             with open(image_path, 'rb') as f:
                 image_data = f.read()
             
-            # Determina il content type
-            content_types = {
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.png': 'image/png',
-                '.gif': 'image/gif',
-                '.webp': 'image/webp'
-            }
-            content_type = content_types.get(image_path.suffix.lower(), 'image/jpeg')
-            
-            # Prepara il file per l'upload
-            files = {
-                'image': (image_path.name, image_data, content_type)
-            }
+            return image_path.name, image_data, content_type
+            
+        except Exception as e:
+            logger.error(f"❌ Errore lettura immagine {image_path}: {e}")
+            return None
+    
+    def upload_image_data(self, product_id: str, filename: str, image_data: Union[bytes, Path],
+                          position: int = 1, content_type: Optional[str] = None) -> bool:
+        """
+        Carica un'immagine già preparata da prepare_image
+        
+        Args:
+            product_id: ID del prodotto
+            filename: Nome del file da inviare
+            image_data: Contenuto dell'immagine, oppure percorso del file da inviare a blocchi
+            position: Posizione dell'immagine (solo per il log)
+            content_type: Content type (default dedotto dall'estensione)
+            
+        Returns:
+            True se successo, False altrimenti
+        """
+        return self.upload_image(product_id, filename, image_data, position, content_type) is not None
+    
+    def upload_image(self, product_id: str, filename: str, image_data: Union[bytes, Path],
+                     position: int = 1, content_type: Optional[str] = None) -> Optional[str]:
+        """
+        Come upload_image_data, ma ritorna l'ID dell'immagine creata
+        
+        Returns:
+            ID immagine, stringa vuota se caricata ma senza ID nella risposta, None se fallito
+        """
+        try:
+            if content_type is None:
+                content_type = self.IMAGE_CONTENT_TYPES.get(Path(filename).suffix.lower(), 'image/jpeg')
+            
+            # Corpo multipart generato a blocchi (ripetibile in caso di retry)
+            body = MultipartBody('image', filename, image_data, content_type)
             
             # Upload immagine
             url = f"{self.api_url}/images/products/{product_id}"
-            response = requests.post(
-                url,
-                auth=self.auth,
-                files=files,
+            response = self._send(
+                'POST', url,
+                latency_sensitive=False,
+                data=body,
+                headers=body.headers,
                 timeout=60
             )
             
             if response.status_code in [200, 201]:
-                logger.info(f"   🖼️  Immagine {position} caricata: {image_path.name}")
-                return True
+                logger.info(f"   🖼️  Immagine {position} caricata: {filename}")
+                image_id = _parse_image_id(response.content)
+                if image_id is None:
+                    logger.warning(f"   ⚠️  Risposta all'upload di {filename} senza ID immagine")
+                    return ''
+                return image_id
             else:
                 logger.error(f"   ❌ Upload immagine fallito: Status {response.status_code}")
                 logger.debug(f"   Risposta: {response.text[:200]}")
-                return False
+                return None
                 
         except Exception as e:
-            logger.error(f"❌ Errore upload immagine {image_path}: {e}")
-            return False
+            logger.error(f"❌ Errore upload immagine {filename}: {e}")
+            return None
+    
+    def get_product_images(self, product_id: str, cache: bool = True) -> Optional[List[Image]]:
+        """
+        Elenca le immagini di un prodotto, nell'ordine restituito dal negozio
+        
+        Args:
+            product_id: ID del prodotto
+            cache: Se False legge sempre dal negozio (prima di eliminare o di
+                   confrontare con il manifest)
+        
+        Returns:
+            Lista di Image, None se la richiesta è fallita
+        """
+        response = self.get(f'images/products/{product_id}', cache=cache)
+        if response is None:
+            return None
+        return Image.from_product_images(response, product_id)
+    
+    def get_product_image_ids(self, product_id: str, cache: bool = True) -> Optional[List[str]]:
+        """
+        Elenca gli ID delle immagini di un prodotto, nell'ordine restituito dal negozio
+        
+        La risposta è <image id="ID prodotto"> con un <declination id="ID immagine">
+        per ogni immagine.
+        
+        Returns:
+            Lista di ID immagine, None se la richiesta è fallita
+        """
+        images = self.get_product_images(product_id, cache)
+        if images is None:
+            return None
+        return [image.id for image in images]
+    
+    def get_products_with_images(self) -> Optional[Set[str]]:
+        """
+        ID dei prodotti che hanno almeno un'immagine, con un solo elenco (images/products)
+        
+        Returns:
+            Insieme di ID prodotto, None se la richiesta è fallita
+        """
+        root = self.get('images/products')
+        if root is None:
+            return None
+        return {node.get('id') for node in root.iter('image') if node.get('id')}
+    
+    def get_image_ids_many(self, product_ids: Iterable[str], chunk_size: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        ID delle immagini di molti prodotti con poche richieste
+        
+        Usa filter[id]=[1|2|3] sull'elenco prodotti: le associations delle
+        immagini arrivano solo con display=full, quindi è comunque molto
+        meno di una richiesta images/products/{id} per prodotto.
+        
+        Args:
+            product_ids: ID dei prodotti
+            chunk_size: Prodotti per richiesta (default Config.LOOKUP_BATCH_SIZE)
+        
+        Returns:
+            Dizionario ID prodotto -> ID immagine in ordine di posizione
+            (mancano i prodotti delle richieste fallite)
+        """
+        chunk_size = chunk_size or Config.LOOKUP_BATCH_SIZE
+        unique = list(dict.fromkeys(str(product_id) for product_id in product_ids))
+        result = {}
+        for start in range(0, len(unique), chunk_size):
+            chunk = unique[start:start + chunk_size]
+            products = self.find_records(Product, ['image_ids'], filters={'id': '[' + '|'.join(chunk) + ']'})
+            if products is None:
+                continue
+            for product in products:
+                result[product.id] = list(product.image_ids or [])
+        return result
+    
+    def get_stock_availables(self, product_ids: Iterable[str],
+                             fields: Iterable[str] = ('id_product', 'id_product_attribute', 'quantity')
+                             ) -> Optional[List[StockAvailable]]:
+        """
+        Righe di magazzino di più prodotti (anche delle combinazioni) con una sola richiesta
+        
+        Args:
+            product_ids: ID dei prodotti (filter[id_product]=[1|2|3])
+            fields: Campi da leggere (display=[...])
+        
+        Returns:
+            Lista di StockAvailable, None se la richiesta è fallita
+        """
+        filter_value = '[' + '|'.join(str(product_id) for product_id in product_ids) + ']'
+        return self.find_records(StockAvailable, list(fields), filters={'id_product': filter_value})
+    
+    def delete_image(self, product_id: str, image_id: str) -> bool:
+        """Elimina una singola immagine di un prodotto"""
+        if self.delete(f'images/products/{product_id}/{image_id}'):
+            logger.info(f"   🗑️  Immagine {image_id} eliminata")
+            return True
+        return False
     
     def delete_product_images(self, product_id: str) -> int:
         """
@@ -306,17 +1088,12 @@ class PrestaShopAPI:
         """
         deleted = 0
         try:
-            # Ottieni lista immagini del prodotto
-            response = self.get(f'images/products/{product_id}')
-            if response is not None:
-                images = response.findall('.//image')
-                for image in images:
-                    image_id = image.get('id')
-                    if image_id:
-                        # Elimina l'immagine
-                        if self.delete(f'images/products/{product_id}/{image_id}'):
-                            deleted += 1
-                            logger.info(f"   🗑️  Immagine {image_id} eliminata")
+            # Lista immagini letta dal negozio: una in cache potrebbe non essere più attuale
+            image_ids = self.get_product_image_ids(product_id, cache=False)
+            if image_ids is not None:
+                for image_id in image_ids:
+                    if self.delete_image(product_id, image_id):
+                        deleted += 1
             
             if deleted > 0:
                 logger.info(f"   Eliminate {deleted} immagini esistenti")
@@ -0,0 +1,286 @@
+"""
+Indice delle immagini in data/assets (una sola scansione con os.scandir)
+
+Per ogni cartella prodotto ricorda le immagini (nome, dimensione, data di
+modifica) e la data di modifica della cartella stessa. L'indice è salvato
+in SQLite e alle esecuzioni successive si rilegge solo il contenuto delle
+cartelle la cui data di modifica è cambiata: su una condivisione di rete
+con decine di migliaia di cartelle basta una stat per cartella invece di
+un elenco e una stat per ogni file.
+
+La data della cartella cambia quando si aggiungono, rimuovono o rinominano
+file, non quando un file viene sovrascritto sul posto: dimensioni e date
+delle immagini sono quindi solo indicative (la sync differenziale ricontrolla
+comunque ogni file) e --rescan-assets forza una rilettura completa.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Optional, Dict, List
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Estensioni delle immagini cercate nelle cartelle prodotto
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+# Cartelle modificate da meno di così non sono considerate stabili
+# (un file aggiunto nello stesso istante potrebbe non cambiare la data)
+_SETTLE_NS = 2 * 10**9
+
+def scan_folder(folder: str) -> List[List]:
+    """
+    Immagini di una cartella prodotto, ordinate per nome
+    
+    Returns:
+        Lista di [nome, dimensione, mtime_ns]
+    """
+    images = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            images.append([entry.name, stat.st_size, stat.st_mtime_ns])
+    images.sort(key=lambda image: image[0].lower())
+    return images
+
+class AssetIndex:
+    """Indice persistente reference -> immagini locali, aggiornato in modo incrementale"""
+    
+    def __init__(self, assets_dir: Optional[Path] = None, db_path: Optional[Path] = None):
+        """
+        Carica in memoria l'indice salvato (nessun accesso alla cartella assets)
+        
+        Args:
+            assets_dir: Cartella delle immagini (default Config.ASSETS_DIR)
+            db_path: File SQLite (default Config.ASSET_INDEX_FILE)
+        """
+        self.assets_dir = Path(assets_dir or Config.ASSETS_DIR)
+        self.root = str(self.assets_dir.resolve())
+        self.db_path = Path(db_path or Config.ASSET_INDEX_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS folders (
+                root TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                images TEXT NOT NULL,
+                PRIMARY KEY (root, reference)
+            )
+        """)
+        self._conn.commit()
+        
+        # reference -> [mtime_ns della cartella, immagini]
+        self._folders: Dict[str, List] = {
+            reference: [mtime_ns, json.loads(images)]
+            for reference, mtime_ns, images in self._conn.execute(
+                "SELECT reference, mtime_ns, images FROM folders WHERE root = ?", (self.root,)
+            )
+        }
+        # Cartelle già verificate in questa esecuzione
+        self._checked = set()
+        self._refreshed = False
+        # Modifiche da salvare (None = cartella rimossa)
+        self._dirty: Dict[str, Optional[List]] = {}
+        # Cartelle con immagini diverse da quelle indicizzate (per la modalità --watch)
+        self._changed = set()
+        self.stats = {'folders': 0, 'rescanned': 0, 'removed': 0}
+    
+    def __len__(self):
+        """Cartelle presenti nell'indice"""
+        return len(self._folders)
+    
+    def close(self):
+        """Salva le modifiche e chiude il database"""
+        self.save()
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def _update(self, reference: str, mtime_ns: int, now_ns: int) -> List:
+        """Rilegge una cartella se la sua data di modifica è cambiata"""
+        cached = self._folders.get(reference)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        
+        images = scan_folder(os.path.join(self.root, reference))
+        # Cartella appena modificata: al prossimo giro va riletta comunque
+        stored_mtime = mtime_ns if now_ns - mtime_ns > _SETTLE_NS else 0
+        with self._lock:
+            if cached is None or cached[1] != images:
+                self._changed.add(reference)
+            self._folders[reference] = [stored_mtime, images]
+            self._dirty[reference] = self._folders[reference]
+            self.stats['rescanned'] += 1
+        return images
+    
+    def _remove(self, reference: str):
+        with self._lock:
+            if self._folders.pop(reference, None) is not None:
+                self._dirty[reference] = None
+                self.stats['removed'] += 1
+    
+    def refresh(self, full: bool = False) -> Dict[str, int]:
+        """
+        Aggiorna l'indice con una sola scansione della cartella assets
+        
+        Args:
+            full: Rilegge tutte le cartelle ignorando le date salvate
+        
+        Returns:
+            Statistiche: cartelle trovate, rilette e rimosse
+        """
+        if full:
+            with self._lock:
+                for folder in self._folders.values():
+                    folder[0] = -1
+        
+        now_ns = time.time_ns()
+        seen = set()
+        if self.assets_dir.is_dir():
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_dir():
+                            continue
+                        mtime_ns = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                    seen.add(entry.name)
+                    self._update(entry.name, mtime_ns, now_ns)
+        
+        for reference in set(self._folders) - seen:
+            self._remove(reference)
+        
+        with self._lock:
+            self._checked = seen
+            self._refreshed = True
+            self.stats['folders'] = len(seen)
+        self.save()
+        
+        logger.info(
+            f"Indice assets: {len(seen)} cartelle, {self.stats['rescanned']} rilette, "
+            f"{self.stats['removed']} rimosse"
+        )
+        return dict(self.stats)
+    
+    def references(self) -> List[str]:
+        """Cartelle prodotto presenti, in ordine di nome (scansione alla prima chiamata)"""
+        if not self._refreshed:
+            self.refresh()
+        with self._lock:
+            return sorted(reference for reference in self._checked if reference in self._folders)
+    
+    def entries(self, reference: str) -> List[List]:
+        """
+        Immagini di un prodotto come [nome, dimensione, mtime_ns]
+        
+        Una cartella non ancora verificata in questa esecuzione viene
+        controllata con una sola stat (e riletta solo se cambiata).
+        """
+        with self._lock:
+            checked = reference in self._checked
+            cached = self._folders.get(reference)
+        if checked:
+            return cached[1] if cached is not None else []
+        
+        try:
+            mtime_ns = os.stat(os.path.join(self.root, reference)).st_mtime_ns
+            images = self._update(reference, mtime_ns, time.time_ns())
+        except OSError:
+            # Cartella assente (o non è una cartella)
+            self._remove(reference)
+            images = []
+        with self._lock:
+            self._checked.add(reference)
+        return images
+    
+    def rescan(self, reference: str) -> bool:
+        """
+        Rilegge subito una cartella, anche se la sua data non è cambiata
+        (es. file sovrascritto sul posto)
+        
+        Returns:
+            True se le immagini sono diverse da quelle indicizzate
+        """
+        with self._lock:
+            cached = self._folders.get(reference)
+            before = cached[1] if cached is not None else []
+            if cached is not None:
+                cached[0] = -1
+            self._checked.discard(reference)
+        changed = self.entries(reference) != before
+        with self._lock:
+            self._changed.discard(reference)
+        return changed
+    
+    def pop_changed(self) -> List[str]:
+        """Cartelle le cui immagini sono cambiate dall'ultima chiamata"""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return sorted(changed)
+    
+    def images(self, reference: str) -> List[Path]:
+        """Percorsi delle immagini di un prodotto, ordinati per nome"""
+        folder = self.assets_dir / reference
+        return [folder / name for name, _, _ in self.entries(reference)]
+    
+    def size(self, path: Path) -> Optional[int]:
+        """Dimensione indicizzata di un'immagine (None se sconosciuta)"""
+        with self._lock:
+            cached = self._folders.get(path.parent.name)
+        if cached is None:
+            return None
+        for name, size, _ in cached[1]:
+            if name == path.name:
+                return size
+        return None
+    
+    def save(self):
+        """Scrive su disco le cartelle cambiate"""
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            self._conn.executemany(
+                "DELETE FROM folders WHERE root = ? AND reference = ?",
+                [(self.root, ref) for ref, folder in dirty.items() if folder is None]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO folders (root, reference, mtime_ns, images) VALUES (?, ?, ?, ?)",
+                [(self.root, ref, folder[0], json.dumps(folder[1]))
+                 for ref, folder in dirty.items() if folder is not None]
+            )
+            self._conn.commit()
+    
+    def clear(self):
+        """Svuota l'indice (la prossima scansione rilegge tutto)"""
+        with self._lock:
+            self._folders.clear()
+            self._checked.clear()
+            self._refreshed = False
+            self._dirty.clear()
+            self._conn.execute("DELETE FROM folders WHERE root = ?", (self.root,))
+            self._conn.commit()
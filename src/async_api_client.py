@@ -0,0 +1,404 @@
+"""
+Client API asincrono per PrestaShop (asyncio + aiohttp)
+
+Stessi metodi e stessi risultati di PrestaShopAPI, ma come coroutine:
+centinaia di richieste in volo con un solo thread, limitate da un semaforo.
+"""
+
+import asyncio
+import aiohttp
+import json
+import time
+import xml.etree.ElementTree as ET
+import logging
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple, Union
+
+from config.config import Config
+from src.api_client import PrestaShopAPI, _request_size
+from src.retry import RetryPolicy
+from src.metrics import RequestMetrics, endpoint_label
+from src.profiling import phase
+from src.multipart import MultipartBody
+from src.records import Image
+
+logger = logging.getLogger(__name__)
+
+class AsyncPrestaShopAPI:
+    """Versione asincrona di PrestaShopAPI"""
+    
+    # Logica condivisa con il client sincrono (nessun I/O di rete)
+    IMAGE_CONTENT_TYPES = PrestaShopAPI.IMAGE_CONTENT_TYPES
+    LOOKUP_FIELDS = PrestaShopAPI.LOOKUP_FIELDS
+    prepare_image = PrestaShopAPI.prepare_image
+    _plan_reference_lookup = PrestaShopAPI._plan_reference_lookup
+    _collect_reference_results = PrestaShopAPI._collect_reference_results
+    
+    def __init__(self, api_url: str, api_key: str,
+                 max_concurrency: Optional[int] = None,
+                 keep_alive: Optional[bool] = None,
+                 index=None,
+                 rate_limiter=None,
+                 retry_policy=None,
+                 wire_format: Optional[str] = None,
+                 metrics=None,
+                 cache=None):
+        """
+        Inizializza il client API asincrono
+        
+        La sessione HTTP viene aperta al primo utilizzo (serve un event loop attivo).
+        
+        Args:
+            api_url: URL base delle API (es. https://shop.com/api)
+            api_key: Chiave API di PrestaShop
+            max_concurrency: Richieste contemporanee massime (default Config.ASYNC_MAX_CONCURRENCY)
+            keep_alive: Se False, chiude la connessione dopo ogni richiesta
+            index: ReferenceIndex opzionale (viene chiuso insieme al client)
+            rate_limiter: RateLimiter condiviso che regola tutte le richieste (None = nessun limite)
+            retry_policy: RetryPolicy per gli errori temporanei (default da Config.MAX_RETRIES)
+            wire_format: Formato delle letture di record, 'xml' o 'json' (default Config.WIRE_FORMAT)
+            metrics: RequestMetrics dove registrare ogni richiesta (default: una nuova)
+            cache: ResponseCache condivisa, invalidata dalle scritture (le letture
+                   asincrone non la usano; viene chiusa insieme al client)
+        """
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.auth = aiohttp.BasicAuth(api_key, "")  # PrestaShop usa solo username, password vuota
+        
+        self.max_concurrency = max_concurrency or Config.ASYNC_MAX_CONCURRENCY
+        self.keep_alive = keep_alive if keep_alive is not None else Config.HTTP_KEEP_ALIVE
+        self.index = index
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.wire_format = (wire_format or Config.WIRE_FORMAT).lower()
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.cache = cache
+        
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Crea la sessione (e il semaforo) nell'event loop corrente"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=0,  # il limite reale è il semaforo
+                force_close=not self.keep_alive
+            )
+            self.session = aiohttp.ClientSession(auth=self.auth, connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+    
+    async def close(self):
+        """Chiude la sessione e tutte le connessioni"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        if self.index is not None:
+            self.index.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    async def __aenter__(self):
+        self._get_session()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+    
+    async def _request(self, method: str, url: str, timeout: float = 30,
+                       latency_sensitive: bool = True, **kwargs):
+        """
+        Esegue una richiesta con retry, rispettando il limite di concorrenza e il rate limiter
+        
+        Se `data` è una funzione viene richiamata ad ogni tentativo (un corpo
+        inviato in streaming non può essere riletto).
+        
+        Returns:
+            Tupla (status code, contenuto della risposta)
+        """
+        data_factory = kwargs.pop('data') if callable(kwargs.get('data')) else None
+        
+        attempt = 0
+        while True:
+            if data_factory is not None:
+                kwargs['data'] = data_factory()
+            try:
+                status, content, headers = await self._request_once(
+                    method, url, timeout, latency_sensitive, **kwargs
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                connect_error = isinstance(e, aiohttp.ClientConnectorError)
+                delay = self.retry_policy.next_delay(
+                    method, attempt,
+                    connect_error=connect_error,
+                    transport_error=not connect_error
+                )
+                if delay is None:
+                    raise
+                reason = str(e) or type(e).__name__
+            else:
+                delay = self.retry_policy.next_delay(
+                    method, attempt,
+                    status_code=status,
+                    retry_after=headers.get('Retry-After')
+                )
+                if delay is None:
+                    return status, content
+                reason = f"Status {status}"
+            
+            attempt += 1
+            self.metrics.record_retry(method, endpoint_label(self.api_url, url))
+            logger.warning(
+                f"🔁 {method} {url[len(self.api_url):] or '/'}: {reason} - "
+                f"tentativo {attempt}/{self.retry_policy.max_retries} tra {delay:.1f}s"
+            )
+            with phase('backoff'):
+                await asyncio.sleep(delay)
+    
+    async def _request_once(self, method: str, url: str, timeout: float,
+                            latency_sensitive: bool, **kwargs):
+        """Un singolo tentativo: semaforo, rate limiter e richiesta"""
+        session = self._get_session()
+        try:
+            async with self._semaphore:
+                if self.rate_limiter is None:
+                    return await self._send(session, method, url, timeout, **kwargs)
+                
+                async with self.rate_limiter.async_slot(latency_sensitive) as slot:
+                    status, content, headers = await self._send(session, method, url, timeout, **kwargs)
+                    slot.record(status, headers.get('Retry-After'))
+                    return status, content, headers
+        finally:
+            if method != 'GET' and self.cache is not None:
+                # Anche una scrittura fallita o interrotta può aver cambiato la risorsa;
+                # con CACHE_DISK l'invalidazione scrive su SQLite, quindi in un thread
+                await asyncio.to_thread(self.cache.invalidate, url[len(self.api_url):])
+    
+    async def _send(self, session, method: str, url: str, timeout: float, **kwargs):
+        """Invia la richiesta e legge tutta la risposta (registrandola in self.metrics)"""
+        endpoint = endpoint_label(self.api_url, url)
+        started = time.perf_counter()
+        try:
+            async with session.request(
+                method, url,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                **kwargs
+            ) as response:
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.metrics.record(method, endpoint, None, time.perf_counter() - started, _request_size(kwargs))
+            raise
+        
+        self.metrics.record(method, endpoint, response.status, time.perf_counter() - started,
+                            _request_size(kwargs), len(content))
+        return response.status, content, response.headers
+    
+    async def test_connection(self) -> bool:
+        """Testa se la connessione funziona"""
+        try:
+            status, _ = await self._request('GET', self.api_url, timeout=10)
+            
+            if status == 200:
+                logger.info("✅ Connessione API OK")
+                return True
+            else:
+                logger.error(f"❌ Connessione fallita: Status {status}")
+                return False
+        
+        except Exception as e:
+            logger.error(f"❌ Errore connessione: {e}")
+            return False
+    
+    async def get(self, endpoint: str, params: Optional[Dict] = None) -> Optional[ET.Element]:
+        """Esegue una richiesta GET (vedi PrestaShopAPI.get)"""
+        try:
+            status, content = await self._request('GET', f"{self.api_url}/{endpoint}", params=params)
+            
+            if status == 200:
+                return ET.fromstring(content)
+            else:
+                logger.error(f"GET {endpoint} fallito: Status {status}")
+                return None
+        
+        except Exception as e:
+            logger.error(f"Errore GET {endpoint}: {e}")
+            return None
+    
+    async def get_json(self, endpoint: str, params: Optional[Dict] = None):
+        """Esegue una richiesta GET con output_format=JSON (vedi PrestaShopAPI.get_json)"""
+        try:
+            status, content = await self._request(
+                'GET', f"{self.api_url}/{endpoint}",
+                params=dict(params or {}, output_format='JSON')
+            )
+            
+            if status == 200:
+                return json.loads(content)
+            else:
+                logger.error(f"GET {endpoint} fallito: Status {status}")
+                return None
+        
+        except Exception as e:
+            logger.error(f"Errore GET {endpoint}: {e}")
+            return None
+    
+    async def _get_list(self, endpoint: str, params: Dict):
+        """Legge un elenco nel formato scelto (vedi PrestaShopAPI._get_list)"""
+        if self.wire_format == 'json':
+            return await self.get_json(endpoint, params)
+        return await self.get(endpoint, params)
+    
+    async def post(self, endpoint: str, xml_data: str) -> Optional[ET.Element]:
+        """Esegue una richiesta POST (vedi PrestaShopAPI.post)"""
+        try:
+            status, content = await self._request(
+                'POST', f"{self.api_url}/{endpoint}",
+                data=xml_data,
+                headers={'Content-Type': 'application/xml'}
+            )
+            
+            if status == 201:  # 201 = Created
+                logger.info(f"✅ Risorsa creata su {endpoint}")
+                return ET.fromstring(content)
+            else:
+                logger.error(f"POST {endpoint} fallito: Status {status}")
+                logger.debug(f"Risposta: {content[:500]!r}")
+                return None
+        
+        except Exception as e:
+            logger.error(f"Errore POST {endpoint}: {e}")
+            return None
+    
+    async def put(self, endpoint: str, xml_data: str) -> bool:
+        """Esegue una richiesta PUT (vedi PrestaShopAPI.put)"""
+        try:
+            status, _ = await self._request(
+                'PUT', f"{self.api_url}/{endpoint}",
+                data=xml_data,
+                headers={'Content-Type': 'application/xml'}
+            )
+            
+            if status == 200:
+                logger.info(f"✅ Risorsa aggiornata: {endpoint}")
+                return True
+            else:
+                logger.error(f"PUT {endpoint} fallito: Status {status}")
+                return False
+        
+        except Exception as e:
+            logger.error(f"Errore PUT {endpoint}: {e}")
+            return False
+    
+    async def delete(self, endpoint: str) -> bool:
+        """Esegue una richiesta DELETE (vedi PrestaShopAPI.delete)"""
+        try:
+            status, _ = await self._request('DELETE', f"{self.api_url}/{endpoint}")
+            
+            if status in [200, 204]:  # 204 = No Content
+                logger.info(f"✅ Risorsa eliminata: {endpoint}")
+                return True
+            else:
+                logger.error(f"DELETE {endpoint} fallito: Status {status}")
+                return False
+        
+        except Exception as e:
+            logger.error(f"Errore DELETE {endpoint}: {e}")
+            return False
+    
+    async def search_by_reference(self, reference: str) -> Optional[str]:
+        """Cerca un prodotto per reference (vedi PrestaShopAPI.search_by_reference)"""
+        product_id = (await self.search_references([reference])).get(reference)
+        
+        if product_id:
+            logger.info(f"Prodotto trovato: {reference} (ID: {product_id})")
+        else:
+            logger.info(f"Prodotto non trovato: {reference}")
+        return product_id
+    
+    async def search_references(self, references: List[str], chunk_size: Optional[int] = None) -> Dict[str, str]:
+        """Risolve in blocco molti reference (vedi PrestaShopAPI.search_references)"""
+        return (await self.lookup_references(references, chunk_size))[0]
+    
+    async def lookup_references(self, references: List[str],
+                                chunk_size: Optional[int] = None) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Risolve in blocco molti reference (vedi PrestaShopAPI.lookup_references)
+        
+        Le richieste dei vari blocchi partono tutte insieme; l'indice locale
+        (SQLite) si legge e si aggiorna in un thread per non bloccare l'event loop.
+        """
+        unique, cached, missing, requests_params = await asyncio.to_thread(
+            self._plan_reference_lookup, references, chunk_size
+        )
+        roots = await asyncio.gather(*(self._get_list('products', params) for _, params in requests_params))
+        return await asyncio.to_thread(self._collect_reference_results, roots, unique, cached, requests_params)
+    
+    async def upload_image_from_path(self, product_id: str, image_path: str, position: int = 1) -> bool:
+        """Carica un'immagine da file locale (vedi PrestaShopAPI.upload_image_from_path)"""
+        # La lettura da disco avviene in un thread per non bloccare l'event loop
+        prepared = await asyncio.to_thread(self.prepare_image, image_path)
+        if prepared is None:
+            return False
+        
+        filename, image_data, content_type = prepared
+        return await self.upload_image_data(product_id, filename, image_data, position, content_type)
+    
+    async def upload_image_data(self, product_id: str, filename: str, image_data: Union[bytes, Path],
+                                position: int = 1, content_type: Optional[str] = None) -> bool:
+        """Carica un'immagine già preparata (vedi PrestaShopAPI.upload_image_data)"""
+        try:
+            if content_type is None:
+                suffix = filename[filename.rfind('.'):].lower() if '.' in filename else ''
+                content_type = self.IMAGE_CONTENT_TYPES.get(suffix, 'image/jpeg')
+            
+            # Corpo multipart a blocchi: un nuovo generatore ad ogni tentativo
+            body = MultipartBody('image', filename, image_data, content_type)
+            
+            status, content = await self._request(
+                'POST', f"{self.api_url}/images/products/{product_id}",
+                data=body.aiter,
+                headers=body.headers,
+                timeout=60,
+                latency_sensitive=False
+            )
+            
+            if status in [200, 201]:
+                logger.info(f"   🖼️  Immagine {position} caricata: {filename}")
+                return True
+            else:
+                logger.error(f"   ❌ Upload immagine fallito: Status {status}")
+                logger.debug(f"   Risposta: {content[:200]!r}")
+                return False
+        
+        except Exception as e:
+            logger.error(f"❌ Errore upload immagine {filename}: {e}")
+            return False
+    
+    async def delete_product_images(self, product_id: str) -> int:
+        """
+        Elimina tutte le immagini di un prodotto (in parallelo)
+        
+        Returns:
+            Numero di immagini eliminate
+        """
+        deleted = 0
+        try:
+            response = await self.get(f'images/products/{product_id}')
+            if response is not None:
+                image_ids = [image.id for image in Image.from_product_images(response, product_id)]
+                results = await asyncio.gather(*(
+                    self.delete(f'images/products/{product_id}/{image_id}') for image_id in image_ids
+                ))
+                for image_id, ok in zip(image_ids, results):
+                    if ok:
+                        deleted += 1
+                        logger.info(f"   🗑️  Immagine {image_id} eliminata")
+            
+            if deleted > 0:
+                logger.info(f"   Eliminate {deleted} immagini esistenti")
+        
+        except Exception as e:
+            logger.error(f"Errore eliminazione immagini: {e}")
+        
+        return deleted
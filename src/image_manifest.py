@@ -0,0 +1,145 @@
+"""
+Manifest delle immagini caricate (sync differenziale)
+
+Per ogni reference ricorda quali file locali (per hash del contenuto)
+sono stati caricati e con quale ID immagine sul negozio, così le
+esecuzioni successive toccano solo le immagini cambiate.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, List, Iterable, Tuple
+
+from config.config import Config
+
+class ImageManifest:
+    """Archivio SQLite reference -> immagini caricate (nome, hash, ID immagine)"""
+    
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        Args:
+            db_path: File SQLite (default Config.MANIFEST_FILE)
+        """
+        self.db_path = Path(db_path or Config.MANIFEST_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                reference TEXT PRIMARY KEY,
+                product_id TEXT NOT NULL,
+                images TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    def close(self):
+        """Chiude il database"""
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def get(self, reference: str) -> Optional[Dict]:
+        """
+        Ritorna il manifest di un prodotto
+        
+        Returns:
+            {'product_id': str, 'images': [{'name', 'sha256', 'size', 'mtime', 'image_id'}, ...]}
+            oppure None se il prodotto non è mai stato sincronizzato
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT product_id, images FROM manifest WHERE reference = ?", (reference,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'product_id': row[0], 'images': json.loads(row[1])}
+    
+    def set(self, reference: str, product_id: str, images: List[Dict]):
+        """Salva il manifest di un prodotto (immagini nell'ordine di posizione)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest (reference, product_id, images, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (reference, str(product_id), json.dumps(images), time.time())
+            )
+            self._conn.commit()
+    
+    def invalidate(self, references: Iterable[str]):
+        """Dimentica alcuni prodotti (al prossimo giro si rifà la sostituzione completa)"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM manifest WHERE reference = ?", [(ref,) for ref in references]
+            )
+            self._conn.commit()
+    
+    def clear(self):
+        """Svuota completamente il manifest"""
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest")
+            self._conn.commit()
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 del contenuto di un file, letto a blocchi"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def describe_local_image(path: Path, previous: Optional[Dict] = None) -> Dict:
+    """
+    Descrive un file locale per il manifest
+    
+    Se dimensione e data di modifica coincidono con la voce precedente,
+    l'hash viene riutilizzato senza rileggere il file.
+    """
+    stat = path.stat()
+    entry = {'name': path.name, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime:
+        entry['sha256'] = previous['sha256']
+    else:
+        entry['sha256'] = hash_file(path)
+    return entry
+
+def plan_image_diff(local: List[Dict], remote: List[Dict]) -> Tuple[List[Dict], List[str], int]:
+    """
+    Calcola le operazioni minime per portare il negozio allo stato locale
+    
+    PrestaShop aggiunge le nuove immagini in fondo, quindi si tengono le
+    immagini remote che, nell'ordine, formano il prefisso più lungo della
+    lista locale; le altre si eliminano e la parte restante della lista
+    locale si carica in ordine. La copertina (prima immagine) deve
+    coincidere, altrimenti si ricarica tutto.
+    
+    Args:
+        local: Immagini locali in ordine di posizione (con 'sha256')
+        remote: Voci del manifest in ordine di posizione (con 'sha256' e 'image_id')
+    
+    Returns:
+        Tupla (voci remote da tenere, ID immagine da eliminare, indice locale da cui caricare)
+    """
+    keep = []
+    matched = 0
+    if local and remote and local[0]['sha256'] == remote[0]['sha256']:
+        for entry in remote:
+            if matched < len(local) and entry['sha256'] == local[matched]['sha256']:
+                keep.append(entry)
+                matched += 1
+    
+    kept_ids = {entry['image_id'] for entry in keep}
+    delete_ids = [entry['image_id'] for entry in remote if entry['image_id'] not in kept_ids]
+    return keep, delete_ids, matched
@@ -0,0 +1,178 @@
+"""
+Pre-elaborazione delle immagini prima dell'upload
+
+Ridimensiona gli originali troppo grandi, ricomprime JPEG/WebP, rimuove
+i dati EXIF e converte i BMP in JPEG. Il lavoro (CPU) avviene in un
+pool di processi; i risultati finiscono in una cache indirizzata per
+contenuto, così un originale invariato non viene mai ricodificato.
+
+Richiede Pillow (opzionale): senza, le immagini si caricano così come sono.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, Future
+from pathlib import Path
+from typing import Optional, Dict
+
+from config.config import Config
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Cambiare se cambia il modo di codificare (invalida la cache)
+TRANSFORM_VERSION = 1
+
+# Formato di uscita per estensione di ingresso (None = si lascia il file com'è)
+OUTPUT_FORMATS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.bmp': 'JPEG',
+    '.webp': 'WEBP',
+    '.png': 'PNG',
+    '.gif': None,   # possibili animazioni: nessuna conversione
+}
+
+OUTPUT_SUFFIXES = {'JPEG': '.jpg', 'WEBP': '.webp', 'PNG': '.png'}
+
+def transform_options() -> Dict:
+    """Opzioni di trasformazione correnti (fanno parte della chiave di cache)"""
+    return {
+        'max_dimension': Config.IMAGE_MAX_DIMENSION,
+        'jpeg_quality': Config.IMAGE_JPEG_QUALITY,
+        'webp_quality': Config.IMAGE_WEBP_QUALITY,
+        'strip_exif': Config.IMAGE_STRIP_EXIF,
+        'version': TRANSFORM_VERSION,
+    }
+
+def transform_image(source: str, options: Dict, cache_dir: str) -> str:
+    """
+    Trasforma un'immagine e ritorna il percorso del risultato in cache
+    
+    Eseguita nei processi del pool: riceve e restituisce solo stringhe e dict.
+    Se il formato non va trasformato, o il risultato non è più leggero
+    dell'originale senza bisogno di conversioni, ritorna il file originale.
+    """
+    source_path = Path(source)
+    output_format = OUTPUT_FORMATS.get(source_path.suffix.lower())
+    if output_format is None:
+        return source
+    
+    # Chiave: contenuto dell'originale + opzioni
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8'))
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    key = digest.hexdigest()
+    
+    target = Path(cache_dir) / key[:2] / f"{key}{OUTPUT_SUFFIXES[output_format]}"
+    if not target.exists():
+        _encode(source_path, target, output_format, options)
+    
+    # Con cambio di formato (BMP) serve sempre il risultato; altrimenti
+    # si sceglie il file più leggero tra originale e ricompresso
+    suffix = source_path.suffix.lower()
+    converted = OUTPUT_SUFFIXES[output_format] != ('.jpg' if suffix == '.jpeg' else suffix)
+    if converted or target.stat().st_size < source_path.stat().st_size:
+        return str(target)
+    return source
+
+def _encode(source_path: Path, target: Path, output_format: str, options: Dict):
+    """Apre, ridimensiona e salva l'immagine (scrittura atomica in cache)"""
+    with Image.open(source_path) as image:
+        # Applica la rotazione EXIF prima di scartare i metadati
+        image = ImageOps.exif_transpose(image)
+        
+        max_dimension = options['max_dimension']
+        if max_dimension and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        
+        save_args = {'optimize': True}
+        icc_profile = image.info.get('icc_profile')
+        if icc_profile:
+            save_args['icc_profile'] = icc_profile
+        if not options['strip_exif'] and image.getexif():
+            save_args['exif'] = image.getexif()
+        
+        if output_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = _flatten(image)
+            save_args.update(quality=options['jpeg_quality'], progressive=True)
+        elif output_format == 'WEBP':
+            save_args.update(quality=options['webp_quality'], method=4)
+        
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        image.save(temp, format=output_format, **save_args)
+        os.replace(temp, target)
+
+def _flatten(image):
+    """Porta l'immagine in RGB, con la trasparenza su sfondo bianco"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+class ImagePreprocessor:
+    """Pool di processi che prepara le immagini prima dell'upload"""
+    
+    def __init__(self, workers: Optional[int] = None, cache_dir: Optional[Path] = None):
+        """
+        Args:
+            workers: Processi del pool (default Config.IMAGE_TRANSFORM_WORKERS, 0 = tutti i core)
+            cache_dir: Cartella della cache (default Config.IMAGE_CACHE_DIR)
+        """
+        if not PIL_AVAILABLE:
+            raise RuntimeError("Pillow non installato: pip install Pillow")
+        
+        self.workers = workers or Config.IMAGE_TRANSFORM_WORKERS or os.cpu_count() or 1
+        self.cache_dir = Path(cache_dir or Config.IMAGE_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.options = transform_options()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+    
+    @classmethod
+    def from_config(cls) -> Optional["ImagePreprocessor"]:
+        """Crea il pool se la pre-elaborazione è attiva e Pillow è disponibile"""
+        if not Config.IMAGE_TRANSFORM_ENABLED:
+            return None
+        if not PIL_AVAILABLE:
+            logger.warning("⚠️  IMAGE_TRANSFORM_ENABLED attivo ma Pillow non è installato: immagini originali")
+            return None
+        return cls()
+    
+    def submit(self, image_path: Path) -> Future:
+        """Avvia la trasformazione in background"""
+        return self._pool.submit(transform_image, str(image_path), self.options, str(self.cache_dir))
+    
+    def result(self, image_path: Path, future: Future) -> Path:
+        """Attende il risultato; in caso di errore si usa l'originale"""
+        try:
+            return Path(future.result())
+        except Exception as e:
+            logger.warning(f"⚠️  Pre-elaborazione fallita per {Path(image_path).name}: {e}")
+            return Path(image_path)
+    
+    def process(self, image_path: Path) -> Path:
+        """Trasforma un'immagine attendendo il risultato"""
+        return self.result(image_path, self.submit(image_path))
+    
+    def close(self):
+        """Chiude il pool di processi"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,158 @@
+"""
+Journal delle esecuzioni lunghe (checkpoint e ripresa)
+
+Registra in append l'esito di ogni prodotto in data/processed/,
+con fsync a blocchi, così un'esecuzione interrotta può ripartire
+saltando i reference già completati. A fine esecuzione i reference
+falliti vengono scritti in data/failed/ come CSV ricaricabile.
+"""
+
+import csv
+import json
+import os
+import re
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Set
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Esiti che non vanno ripetuti in caso di --resume
+COMPLETED_STATUSES = {'done', 'unchanged'}
+
+# Esiti da riportare nel CSV dei falliti
+FAILED_STATUSES = {'failed', 'partial', 'not_found'}
+
+class RunJournal:
+    """Journal append-only degli esiti per prodotto"""
+    
+    def __init__(self, job_name: str, resume: bool = False,
+                 fsync_every: Optional[int] = None,
+                 fsync_interval: Optional[float] = None):
+        """
+        Args:
+            job_name: Nome del lavoro (es. nome del CSV), identifica il journal
+            resume: Se True riprende il journal esistente, altrimenti ne inizia uno nuovo
+            fsync_every: Record dopo cui forzare la scrittura su disco (default Config.JOURNAL_FSYNC_EVERY)
+            fsync_interval: Secondi massimi tra due fsync (default Config.JOURNAL_FSYNC_INTERVAL)
+        """
+        self.job_name = re.sub(r'[^\w.-]+', '_', job_name)
+        self.path = Config.PROCESSED_DIR / f"{self.job_name}.journal.jsonl"
+        self.fsync_every = fsync_every or Config.JOURNAL_FSYNC_EVERY
+        self.fsync_interval = fsync_interval or Config.JOURNAL_FSYNC_INTERVAL
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Ultimo esito per reference (dal journal precedente se si riprende)
+        self.outcomes: Dict[str, str] = self._load() if resume else {}
+        if not resume:
+            self._rotate()
+        
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and self._ends_mid_line():
+            # Riga troncata da un'interruzione: il primo record nuovo va a capo, non in coda
+            self._file.write('\n')
+        self._pending = 0
+        self._last_sync = time.monotonic()
+    
+    def _ends_mid_line(self) -> bool:
+        """True se il journal esistente non termina con un a capo"""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    
+    def _rotate(self):
+        """Un nuovo inizio non cancella il checkpoint precedente: lo rinomina con data e ora"""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        stamp = datetime.fromtimestamp(self.path.stat().st_mtime).strftime('%Y%m%d_%H%M%S')
+        rotated = self.path.with_name(f"{self.job_name}.journal.{stamp}.jsonl")
+        self.path.replace(rotated)
+        logger.info(f"📒 Journal precedente conservato in {rotated} (rinominalo per riprenderlo con --resume)")
+    
+    def _load(self) -> Dict[str, str]:
+        """Legge il journal esistente (ignora un'eventuale riga troncata in fondo)"""
+        outcomes = {}
+        if not self.path.exists():
+            return outcomes
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                outcomes[record['reference']] = record['status']
+        
+        logger.info(f"📒 Journal ripreso: {len(outcomes)} prodotti già registrati")
+        return outcomes
+    
+    def completed(self) -> Set[str]:
+        """Reference già completati con successo"""
+        return {ref for ref, status in self.outcomes.items() if status in COMPLETED_STATUSES}
+    
+    def record(self, reference: str, status: str, **details):
+        """
+        Registra l'esito di un prodotto
+        
+        Args:
+            reference: Reference del prodotto
+            status: done, unchanged, partial, no_images, not_found o failed
+            **details: Dati aggiuntivi (es. immagini caricate)
+        """
+        line = json.dumps({'reference': reference, 'status': status, 'ts': time.time(), **details})
+        with self._lock:
+            self.outcomes[reference] = status
+            self._file.write(line + '\n')
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+    
+    def _sync(self):
+        """Scrive su disco i record in sospeso (chiamare con il lock)"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+    
+    def close(self) -> Optional[Path]:
+        """
+        Chiude il journal e scrive i reference falliti in Config.FAILED_DIR
+        
+        Returns:
+            Percorso del CSV dei falliti, None se non ce ne sono
+        """
+        with self._lock:
+            if self._file.closed:
+                return None
+            self._sync()
+            self._file.close()
+        
+        failed = [ref for ref, status in self.outcomes.items() if status in FAILED_STATUSES]
+        if not failed:
+            return None
+        
+        Config.FAILED_DIR.mkdir(parents=True, exist_ok=True)
+        failed_path = Config.FAILED_DIR / f"{self.job_name}_failed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        with open(failed_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['reference', 'status'])
+            for ref in failed:
+                writer.writerow([ref, self.outcomes[ref]])
+        
+        logger.info(f"📝 {len(failed)} prodotti falliti salvati in {failed_path}")
+        return failed_path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
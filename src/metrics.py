@@ -0,0 +1,317 @@
+"""
+Metriche delle richieste verso il webservice e report dell'esecuzione
+
+Per ogni coppia metodo/endpoint (gli ID diventano {id}) si contano
+richieste, status, byte inviati e ricevuti, retry, risposte di
+rallentamento (429/503) e un istogramma delle latenze a bucket fissi,
+quindi la memoria non cresce con la durata dell'esecuzione.
+A fine esecuzione il report va in Config.LOG_DIR in JSON e, se
+richiesto, in formato textfile di Prometheus (node_exporter).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import logging
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+from config.config import Config
+from src.rate_limiter import THROTTLE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Limiti superiori dei bucket di latenza in secondi (come i default di Prometheus, più quelli lunghi degli upload)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_ID_SEGMENT = re.compile(r'^\d+$')
+
+def endpoint_label(api_url: str, url: str) -> str:
+    """Endpoint senza host né ID: .../api/images/products/12/34 -> images/products/{id}/{id}"""
+    path = url[len(api_url):] if url.startswith(api_url) else url
+    path = path.split('?', 1)[0].strip('/')
+    if not path:
+        return '/'
+    return '/'.join('{id}' if _ID_SEGMENT.match(part) else part for part in path.split('/'))
+
+class _EndpointStats:
+    """Contatori di una coppia metodo/endpoint"""
+    
+    __slots__ = ('count', 'statuses', 'bytes_sent', 'bytes_received', 'seconds',
+                 'min', 'max', 'buckets', 'retries', 'throttled')
+    
+    def __init__(self):
+        self.count = 0
+        self.statuses: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)   # l'ultimo è +Inf
+        self.retries = 0
+        self.throttled = 0
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile stimato dall'istogramma (interpolazione lineare nel bucket, come histogram_quantile)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            if cumulative + count >= rank and count:
+                lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+                upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+                value = lower + (upper - lower) * (rank - cumulative) / count
+                return min(max(value, self.min), self.max)
+            cumulative += count
+        return self.max
+
+class RequestMetrics:
+    """Raccoglie le metriche delle richieste HTTP (condiviso tra thread e task)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[Tuple[str, str], _EndpointStats] = {}
+        self.started = time.time()
+    
+    def _stats(self, method: str, endpoint: str) -> _EndpointStats:
+        """Contatori della coppia metodo/endpoint (chiamare con il lock)"""
+        key = (method.upper(), endpoint)
+        stats = self._endpoints.get(key)
+        if stats is None:
+            stats = self._endpoints[key] = _EndpointStats()
+        return stats
+    
+    def record(self, method: str, endpoint: str, status: Optional[int], seconds: float,
+               bytes_sent: int = 0, bytes_received: int = 0):
+        """
+        Registra un tentativo HTTP
+        
+        Args:
+            method: Metodo HTTP
+            endpoint: Endpoint normalizzato (vedi endpoint_label)
+            status: Status ricevuto, None per errore di rete
+            seconds: Durata della richiesta
+            bytes_sent: Byte del corpo inviato
+            bytes_received: Byte del corpo ricevuto (se noti)
+        """
+        with self._lock:
+            stats = self._stats(method, endpoint)
+            stats.count += 1
+            label = str(status) if status is not None else 'error'
+            stats.statuses[label] = stats.statuses.get(label, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.seconds += seconds
+            stats.min = seconds if stats.min is None else min(stats.min, seconds)
+            stats.max = max(stats.max, seconds)
+            stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if status in THROTTLE_STATUSES:
+                stats.throttled += 1
+    
+    def record_retry(self, method: str, endpoint: str):
+        """Registra un nuovo tentativo deciso dalla RetryPolicy"""
+        with self._lock:
+            self._stats(method, endpoint).retries += 1
+    
+    def merge(self, endpoints: List[Dict]):
+        """
+        Aggiunge i contatori di un altro report (output di endpoints(),
+        es. il report JSON di uno shard): con gli istogrammi grezzi i
+        percentili restano quelli dell'insieme delle richieste
+        """
+        with self._lock:
+            for item in endpoints:
+                stats = self._stats(item['method'], item['endpoint'])
+                stats.count += item['count']
+                for status, count in item['statuses'].items():
+                    stats.statuses[status] = stats.statuses.get(status, 0) + count
+                stats.bytes_sent += item['bytes_sent']
+                stats.bytes_received += item['bytes_received']
+                stats.seconds += item['seconds']
+                stats.retries += item['retries']
+                stats.throttled += item['throttled']
+                latency = item['latency_ms']
+                if latency['min'] is not None:
+                    low = latency['min'] / 1000
+                    stats.min = low if stats.min is None else min(stats.min, low)
+                if latency['max'] is not None:
+                    stats.max = max(stats.max, latency['max'] / 1000)
+                for index, count in enumerate(item.get('buckets', ())):
+                    stats.buckets[index] += count
+    
+    def endpoints(self) -> List[Dict]:
+        """Riepilogo per metodo/endpoint, dal più costoso in tempo totale"""
+        with self._lock:
+            items = [(key, stats) for key, stats in self._endpoints.items()]
+            total_seconds = sum(stats.seconds for _, stats in items) or 1.0
+            summary = []
+            for (method, endpoint), stats in sorted(items, key=lambda item: -item[1].seconds):
+                summary.append({
+                    'method': method,
+                    'endpoint': endpoint,
+                    'count': stats.count,
+                    'statuses': dict(sorted(stats.statuses.items())),
+                    'retries': stats.retries,
+                    'throttled': stats.throttled,
+                    'bytes_sent': stats.bytes_sent,
+                    'bytes_received': stats.bytes_received,
+                    'seconds': round(stats.seconds, 3),
+                    'time_share': round(stats.seconds / total_seconds, 4),
+                    'latency_ms': {
+                        'mean': _ms(stats.seconds / stats.count) if stats.count else None,
+                        'min': _ms(stats.min),
+                        'p50': _ms(stats.quantile(0.50)),
+                        'p95': _ms(stats.quantile(0.95)),
+                        'p99': _ms(stats.quantile(0.99)),
+                        'max': _ms(stats.max) if stats.count else None,
+                    },
+                    # Istogramma grezzo (conteggi per bucket di LATENCY_BUCKETS, l'ultimo è +Inf)
+                    'buckets': list(stats.buckets),
+                })
+            return summary
+    
+    def report(self, stats: Optional[Dict] = None, rate_limiter=None, retry_policy=None,
+               **run_info) -> Dict:
+        """
+        Report completo dell'esecuzione
+        
+        Args:
+            stats: Statistiche dell'uploader (prodotti, immagini...)
+            rate_limiter: RateLimiter usato, per velocità finale e attese
+            retry_policy: RetryPolicy usata, per retry totali e budget
+            **run_info: Dati descrittivi (script, modalità, file CSV...)
+        """
+        endpoints = self.endpoints()
+        finished = time.time()
+        report = {
+            'run': dict(run_info,
+                        started=datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                        finished=datetime.fromtimestamp(finished).isoformat(timespec='seconds'),
+                        duration_s=round(finished - self.started, 3)),
+            'stats': dict(stats or {}),
+            'requests': {
+                'total': sum(item['count'] for item in endpoints),
+                'errors': sum(count for item in endpoints for status, count in item['statuses'].items()
+                              if status == 'error' or int(status) >= 400),
+                'retries': sum(item['retries'] for item in endpoints),
+                'throttled': sum(item['throttled'] for item in endpoints),
+                'bytes_sent': sum(item['bytes_sent'] for item in endpoints),
+                'bytes_received': sum(item['bytes_received'] for item in endpoints),
+                'seconds': round(sum(item['seconds'] for item in endpoints), 3),
+            },
+            'endpoints': endpoints,
+        }
+        if rate_limiter is not None:
+            report['rate_limiter'] = {
+                'final_rps': round(rate_limiter.rate, 2),
+                'throttle_events': rate_limiter.throttle_events,
+                'total_wait_s': round(rate_limiter.total_wait, 3),
+            }
+        if retry_policy is not None:
+            report['retry'] = {
+                'retries': retry_policy.retries,
+                'budget': retry_policy.budget,
+                'budget_exhausted': retry_policy.budget_exhausted,
+            }
+        return report
+    
+    def prometheus(self, report: Dict) -> str:
+        """Report in formato textfile di Prometheus"""
+        lines = []
+        
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP prestashop_{name} {help_text}")
+            lines.append(f"# TYPE prestashop_{name} {kind}")
+        
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            
+            metric('requests_total', 'counter', 'Richieste HTTP per metodo, endpoint e status')
+            for (method, endpoint), stats in items:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'prestashop_requests_total{{{_labels(method, endpoint)},status="{status}"}} {count}')
+            
+            metric('request_duration_seconds', 'histogram', 'Durata delle richieste HTTP')
+            for (method, endpoint), stats in items:
+                labels = _labels(method, endpoint)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.buckets):
+                    cumulative += count
+                    lines.append(f'prestashop_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'prestashop_request_duration_seconds_sum{{{labels}}} {stats.seconds:.6f}')
+                lines.append(f'prestashop_request_duration_seconds_count{{{labels}}} {stats.count}')
+            
+            for name, attribute, help_text in (
+                ('request_bytes_sent_total', 'bytes_sent', 'Byte inviati nel corpo delle richieste'),
+                ('request_bytes_received_total', 'bytes_received', 'Byte ricevuti nel corpo delle risposte'),
+                ('retries_total', 'retries', 'Nuovi tentativi dopo errori temporanei'),
+                ('throttled_total', 'throttled', 'Risposte 429/503 del server'),
+            ):
+                metric(name, 'counter', help_text)
+                for (method, endpoint), stats in items:
+                    lines.append(f'prestashop_{name}{{{_labels(method, endpoint)}}} {getattr(stats, attribute)}')
+        
+        script = report['run'].get('script', 'run')
+        metric('run_duration_seconds', 'gauge', "Durata dell'ultima esecuzione")
+        lines.append(f'prestashop_run_duration_seconds{{script="{script}"}} {report["run"]["duration_s"]}')
+        metric('run_timestamp_seconds', 'gauge', "Fine dell'ultima esecuzione (epoch)")
+        lines.append(f'prestashop_run_timestamp_seconds{{script="{script}"}} {int(time.time())}')
+        metric('run_stat', 'gauge', "Statistiche dell'ultima esecuzione")
+        for name, value in report['stats'].items():
+            if isinstance(value, (int, float)):
+                lines.append(f'prestashop_run_stat{{script="{script}",stat="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+    
+    def write_report(self, path: Path, stats: Optional[Dict] = None, rate_limiter=None,
+                     retry_policy=None, **run_info) -> Dict:
+        """
+        Scrive il report JSON in `path` e, con Config.METRICS_PROMETHEUS,
+        il textfile Prometheus in Config.LOG_DIR (sovrascritto ad ogni esecuzione)
+        
+        Returns:
+            Il report scritto
+        """
+        report = self.report(stats, rate_limiter, retry_policy, **run_info)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        logger.info(f"📈 Report richieste: {path}")
+        
+        if Config.METRICS_PROMETHEUS:
+            textfile = Config.LOG_DIR / f"{report['run'].get('script', 'run')}.prom"
+            # Scrittura atomica: node_exporter non deve mai leggere un file a metà
+            temp = textfile.with_name(textfile.name + '.tmp')
+            temp.write_text(self.prometheus(report), encoding='utf-8')
+            os.replace(temp, textfile)
+            logger.info(f"📈 Metriche Prometheus: {textfile}")
+        return report
+
+def report_path(prefix: str) -> Path:
+    """Percorso del report JSON in Config.LOG_DIR (es. quick_upload_20240517_102231.report.json)"""
+    return Config.LOG_DIR / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.report.json"
+
+def print_summary(report: Dict, limit: int = 5):
+    """Dove è andato il tempo: gli endpoint più costosi del report"""
+    requests_info = report['requests']
+    print(f"\n⏱️  Richieste: {requests_info['total']}, {requests_info['seconds']:.1f}s cumulati in rete, "
+          f"esecuzione {report['run']['duration_s']:.1f}s "
+          f"(retry {requests_info['retries']}, 429/503 {requests_info['throttled']}, errori {requests_info['errors']})")
+    if 'rate_limiter' in report:
+        limiter = report['rate_limiter']
+        print(f"   Rate limiter: {limiter['final_rps']} req/s finali, {limiter['total_wait_s']:.1f}s di attesa")
+    for item in report['endpoints'][:limit]:
+        latency = item['latency_ms']
+        print(f"   {item['method']:<6} {item['endpoint']:<28} {item['count']:>6}× "
+              f"{item['time_share']:>6.1%}  p50 {latency['p50']:.0f} ms  p95 {latency['p95']:.0f} ms")
+
+def _labels(method: str, endpoint: str) -> str:
+    return f'method="{method}",endpoint="{endpoint}"'
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
@@ -0,0 +1,93 @@
+"""
+Corpo multipart/form-data inviato a blocchi
+
+L'immagine non viene mai letta tutta in memoria: il corpo è generato
+al volo leggendo il file (o una sua mappatura mmap) a blocchi di
+dimensione configurabile, con Content-Length noto in anticipo.
+La memoria per upload in corso resta quindi costante, qualunque sia
+la dimensione dell'immagine.
+"""
+
+import asyncio
+import mmap
+import uuid
+from pathlib import Path
+from typing import Iterator, AsyncIterator, Optional, Union
+
+from config.config import Config
+
+class MultipartBody:
+    """Corpo multipart con un solo campo file, ripetibile (nuovo giro ad ogni iterazione)"""
+    
+    def __init__(self, field: str, filename: str, source: Union[bytes, str, Path],
+                 content_type: str, chunk_size: Optional[int] = None,
+                 use_mmap: Optional[bool] = None):
+        """
+        Args:
+            field: Nome del campo del form (per PrestaShop 'image')
+            filename: Nome del file da dichiarare
+            source: Percorso del file da inviare, oppure contenuto già in memoria
+            content_type: Content type del file
+            chunk_size: Byte letti e inviati per blocco (default Config.UPLOAD_CHUNK_SIZE)
+            use_mmap: Legge il file tramite mmap (default Config.UPLOAD_USE_MMAP)
+        """
+        self.chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+        self.use_mmap = Config.UPLOAD_USE_MMAP if use_mmap is None else use_mmap
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        
+        # Stesso escaping delle intestazioni usato da requests/urllib3
+        quoted = filename.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{quoted}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8')
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode('ascii')
+        
+        if isinstance(source, (bytes, bytearray)):
+            self._data, self._path = bytes(source), None
+            size = len(self._data)
+        else:
+            self._data, self._path = None, Path(source)
+            size = self._path.stat().st_size
+        self._length = len(self._head) + size + len(self._tail)
+    
+    @property
+    def headers(self) -> dict:
+        """Intestazioni da inviare con il corpo"""
+        return {'Content-Type': self.content_type, 'Content-Length': str(self._length)}
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        yield from self._iter_content()
+        yield self._tail
+    
+    def _iter_content(self) -> Iterator[bytes]:
+        """Contenuto del file, un blocco alla volta"""
+        if self._data is not None:
+            for offset in range(0, len(self._data), self.chunk_size):
+                yield self._data[offset:offset + self.chunk_size]
+            return
+        
+        with open(self._path, 'rb') as f:
+            if self.use_mmap and self._length > len(self._head) + len(self._tail):
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for offset in range(0, len(mapped), self.chunk_size):
+                        yield mapped[offset:offset + self.chunk_size]
+                return
+            
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                yield chunk
+    
+    async def aiter(self) -> AsyncIterator[bytes]:
+        """Come __iter__, con le letture da disco in un thread (per aiohttp)"""
+        chunks = iter(self)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
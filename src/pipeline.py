@@ -0,0 +1,81 @@
+"""
+Pipeline a stadi per i file CSV di grandi dimensioni
+
+Ogni stadio gira in un thread proprio e passa i risultati al successivo
+attraverso una coda limitata: se lo stadio a valle è lento, quello a
+monte si ferma (backpressure) e la memoria resta costante.
+"""
+
+import csv
+import queue
+import threading
+import logging
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Segnale di fine stadio
+_DONE = object()
+
+def background(iterable: Iterable, maxsize: int, name: str = 'stage') -> Iterator:
+    """
+    Consuma `iterable` in un thread separato, fino a `maxsize` elementi in anticipo
+    
+    Le eccezioni dello stadio vengono rilanciate nel consumatore; se il
+    consumatore smette di leggere, lo stadio si ferma al primo elemento successivo.
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def run():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+    
+    worker = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+    worker.start()
+    
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Raggruppa gli elementi in liste di al massimo `size`"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_csv_references(csv_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Legge il CSV una riga alla volta
+    
+    Yields:
+        Tuple (numero riga, reference); reference vuoto se la colonna manca
+    """
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+        for index, row in enumerate(csv.DictReader(file, delimiter=';'), 1):
+            yield index, (row.get('reference') or '').strip()
@@ -0,0 +1,275 @@
+"""
+Piano di sincronizzazione senza modifiche al negozio (--plan)
+
+Calcola cosa farebbe un'esecuzione reale: quali reference esistono sul
+negozio, quali immagini verrebbero eliminate e quali caricate, con i byte
+da inviare e una stima della durata. Lo stato del negozio si legge con
+poche richieste in blocco (ricerca per reference a gruppi, elenco
+images/products e associations dei prodotti a gruppi) invece di una
+richiesta per prodotto; non si eseguono POST né DELETE.
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, List, Iterable
+
+from config.config import Config
+from src.image_manifest import describe_local_image, plan_image_diff
+
+logger = logging.getLogger(__name__)
+
+class SyncPlanner:
+    """Piano delle azioni di un upload, dallo stato attuale del negozio e di data/assets"""
+    
+    def __init__(self, api, uploader, sync_mode: str = 'replace', workers: Optional[int] = None):
+        """
+        Args:
+            api: Istanza di PrestaShopAPI (solo letture)
+            uploader: ImageUploader da cui si usano ricerca delle immagini locali e manifest
+            sync_mode: 'replace' o 'diff', come l'esecuzione da pianificare
+            workers: Prodotti in parallelo nell'esecuzione reale (per la stima dei tempi)
+        """
+        self.api = api
+        self.uploader = uploader
+        self.sync_mode = sync_mode
+        self.workers = max(1, workers or Config.UPLOAD_WORKERS)
+    
+    def plan(self, references: Iterable[str]) -> Dict:
+        """
+        Calcola il piano per i reference indicati (nell'ordine, senza duplicati)
+        
+        Returns:
+            {'products': [...], 'totals': {...}, 'estimate': {...}}
+        """
+        references = [ref for ref in dict.fromkeys(references) if ref]
+        
+        # Stato del negozio in blocco: ID prodotto, prodotti con immagini, ID immagine
+        print(f"🔎 Ricerca di {len(references)} reference su PrestaShop...")
+        product_ids, failed = self.api.lookup_references(references)
+        failed = set(failed)
+        print(f"   ✅ Trovati {len(product_ids)}/{len(references)} prodotti")
+        if failed:
+            print(f"   ⚠️  {len(failed)} reference non verificati (richieste fallite)")
+        
+        with_images = self.api.get_products_with_images()
+        candidates = [product_ids[ref] for ref in references
+                      if ref in product_ids and (with_images is None or product_ids[ref] in with_images)]
+        print(f"🖼️  Lettura delle immagini sul negozio per {len(candidates)} prodotti...")
+        remote_images = self.api.get_image_ids_many(candidates)
+        
+        products = []
+        for reference in references:
+            product_id = product_ids.get(reference)
+            if reference in failed:
+                products.append({'reference': reference, 'action': 'lookup_failed'})
+                continue
+            if product_id is None:
+                products.append({'reference': reference, 'action': 'not_found'})
+                continue
+            if with_images is not None and product_id not in with_images:
+                remote_ids = []
+            else:
+                remote_ids = remote_images.get(product_id)
+            products.append(self._plan_product(reference, product_id, remote_ids))
+        
+        totals = self._totals(products)
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'sync_mode': self.sync_mode,
+            'workers': self.workers,
+            'totals': totals,
+            'estimate': estimate_duration(totals, self.workers, self.api.metrics),
+            'products': products,
+        }
+    
+    def _plan_product(self, reference: str, product_id: str, remote_ids: Optional[List[str]]) -> Dict:
+        """Azioni per un prodotto (remote_ids None = immagini sul negozio non lette)"""
+        images = self.uploader.find_product_images(reference)
+        entry = {'reference': reference, 'product_id': product_id,
+                 'remote_images': len(remote_ids) if remote_ids is not None else None}
+        if not images:
+            entry['action'] = 'no_images'
+            return entry
+        
+        sizes = [self.uploader._image_size(path) for path in images]
+        upload_from = 0
+        delete_ids = remote_ids
+        
+        manifest = self.uploader.manifest if self.sync_mode == 'diff' else None
+        previous = manifest.get(reference) if manifest is not None else None
+        if previous and previous['product_id'] == str(product_id) and remote_ids is not None \
+                and remote_ids == [image['image_id'] for image in previous['images']]:
+            # Come _sync_images_diff: hash locali (riusati se invariati) contro il manifest
+            previous_by_name = {image['name']: image for image in previous['images']}
+            local = [describe_local_image(path, previous_by_name.get(path.name)) for path in images]
+            _, delete_ids, upload_from = plan_image_diff(local, previous['images'])
+        
+        uploads = images[upload_from:]
+        entry.update({
+            'action': 'unchanged' if not uploads and not delete_ids else 'sync',
+            'delete': list(delete_ids) if delete_ids is not None else None,
+            'upload': [path.name for path in uploads],
+            'unchanged': upload_from,
+            'bytes': sum(sizes[upload_from:]),
+        })
+        return entry
+    
+    def _totals(self, products: List[Dict]) -> Dict:
+        """Conteggi complessivi del piano"""
+        totals = {
+            'products': len(products),
+            'not_found': 0,
+            'lookup_failed': 0,
+            'no_images': 0,
+            'unchanged': 0,
+            'to_sync': 0,
+            'images_delete': 0,
+            'images_upload': 0,
+            'images_unchanged': 0,
+            'remote_unknown': 0,
+            'bytes_upload': 0,
+        }
+        for entry in products:
+            action = entry['action']
+            if action in ('not_found', 'lookup_failed', 'no_images', 'unchanged'):
+                totals[action] += 1
+            if action not in ('sync', 'unchanged'):
+                continue
+            if action == 'sync':
+                totals['to_sync'] += 1
+            totals['images_upload'] += len(entry['upload'])
+            totals['images_unchanged'] += entry['unchanged']
+            totals['bytes_upload'] += entry['bytes']
+            if entry['delete'] is None:
+                totals['remote_unknown'] += 1
+            else:
+                totals['images_delete'] += len(entry['delete'])
+        return totals
+
+def latest_report(prefix: str = 'quick_upload') -> Optional[Dict]:
+    """Ultimo report richieste con upload reali in Config.LOG_DIR (None se non c'è)"""
+    for path in sorted(Config.LOG_DIR.glob(f"{prefix}_*.report.json"), reverse=True):
+        try:
+            report = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        if any(item['method'] == 'POST' and item['count'] for item in report.get('endpoints', [])):
+            report['path'] = str(path)
+            return report
+    return None
+
+def _mean_seconds(endpoints: List[Dict], method: str, endpoint: str) -> Optional[float]:
+    for item in endpoints:
+        if item['method'] == method and item['endpoint'] == endpoint and item['count']:
+            return item['seconds'] / item['count']
+    return None
+
+def estimate_duration(totals: Dict, workers: int, metrics=None, report: Optional[Dict] = None) -> Dict:
+    """
+    Stima della durata dell'esecuzione reale
+    
+    Le latenze per tipo di richiesta e la velocità di upload si prendono
+    dall'ultimo report di un upload reale; senza report si usa la latenza
+    delle letture appena fatte dal piano (stima meno affidabile, senza
+    il tempo di trasferimento dei byte). Le richieste di un prodotto sono
+    in sequenza, i prodotti procedono `workers` alla volta; con il rate
+    limiter la velocità non supera RATE_MAX_RPS, senza si aggiungono le
+    pause fisse UPLOAD_DELAY e IMAGE_DELAY.
+    """
+    report = report if report is not None else latest_report()
+    to_sync = totals['to_sync']
+    requests_count = {
+        # Una lettura delle immagini per prodotto (delete_product_images o controllo del manifest)
+        'GET images/products/{id}': to_sync,
+        'DELETE images/products/{id}/{id}': totals['images_delete'],
+        'POST images/products/{id}': totals['images_upload'],
+    }
+    
+    source = 'plan'
+    if report is not None:
+        endpoints = report['endpoints']
+        source = report['path']
+    elif metrics is not None:
+        endpoints = metrics.endpoints()
+    else:
+        endpoints = []
+    fallback = _mean_seconds(endpoints, 'GET', 'products') or 0.5
+    
+    seconds = 0.0
+    for key, count in requests_count.items():
+        method, endpoint = key.split(' ', 1)
+        seconds += count * (_mean_seconds(endpoints, method, endpoint) or fallback)
+    
+    # Trasferimento: il tempo degli upload del report è in proporzione ai byte inviati
+    upload_rate = None
+    for item in endpoints:
+        if item['method'] == 'POST' and item['bytes_sent'] and item['seconds']:
+            upload_rate = item['bytes_sent'] / item['seconds']
+    if upload_rate:
+        mean_upload = _mean_seconds(endpoints, 'POST', 'images/products/{id}') or fallback
+        seconds -= totals['images_upload'] * mean_upload
+        seconds += totals['bytes_upload'] / upload_rate
+    
+    parallel = min(workers, to_sync) or 1
+    duration = seconds / parallel
+    total_requests = sum(requests_count.values())
+    if Config.RATE_LIMIT_ENABLED:
+        duration = max(duration, total_requests / Config.RATE_MAX_RPS)
+    else:
+        pauses = to_sync * Config.UPLOAD_DELAY + max(0, totals['images_upload'] - to_sync) * Config.IMAGE_DELAY
+        duration += pauses / parallel
+    
+    return {
+        'requests': total_requests,
+        'network_s': round(seconds, 1),
+        'duration_s': round(duration, 1),
+        'upload_bytes_per_s': round(upload_rate) if upload_rate else None,
+        'source': source,
+    }
+
+def write_plan(plan: Dict, prefix: str = 'quick_upload') -> Path:
+    """Salva il piano completo in Config.LOG_DIR"""
+    Config.LOG_DIR.mkdir(parents=True, exist_ok=True)
+    path = Config.LOG_DIR / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.plan.json"
+    path.write_text(json.dumps(plan, indent=2, ensure_ascii=False), encoding='utf-8')
+    return path
+
+def _format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+def print_plan(plan: Dict):
+    """Riepilogo del piano a video"""
+    totals = plan['totals']
+    estimate = plan['estimate']
+    print("\n" + "="*60)
+    print(f"🧭 PIANO ({plan['sync_mode']}, nessuna modifica eseguita)")
+    print("="*60)
+    print(f"📦 Prodotti: {totals['products']}")
+    print(f"   🔄 da sincronizzare: {totals['to_sync']}")
+    print(f"   ♻️  invariati: {totals['unchanged']}")
+    print(f"   ⚠️  senza immagini locali: {totals['no_images']}")
+    print(f"   ❌ non trovati: {totals['not_found']}")
+    if totals['lookup_failed']:
+        print(f"   ❌ ricerca fallita (stato sconosciuto): {totals['lookup_failed']}")
+    print(f"🗑️  Immagini da eliminare: {totals['images_delete']}")
+    if totals['remote_unknown']:
+        print(f"   ⚠️  immagini sul negozio non lette per {totals['remote_unknown']} prodotti")
+    print(f"📤 Immagini da caricare: {totals['images_upload']} ({totals['bytes_upload'] / 1024 / 1024:.1f} MB)")
+    if totals['images_unchanged']:
+        print(f"♻️  Immagini invariate: {totals['images_unchanged']}")
+    if Config.IMAGE_TRANSFORM_ENABLED:
+        print("   (byte prima della pre-elaborazione: l'invio reale sarà minore)")
+    
+    print(f"⏱️  Stima: {estimate['requests']} richieste, circa {_format_duration(estimate['duration_s'])} "
+          f"con {plan['workers']} worker")
+    if estimate['source'] == 'plan':
+        print("   (nessun report di upload in logs/: stima dalle sole letture del piano)")
+    else:
+        print(f"   (velocità misurate in {estimate['source']})")
+    print("="*60)
@@ -0,0 +1,115 @@
+"""
+Ultimo stato noto dei campi prodotto aggiornati da CSV (SQLite)
+
+Per ogni reference ricorda l'ID prodotto e il valore (come testo per il
+webservice) dei campi letti o scritti dall'ultimo aggiornamento: le righe
+di un listino uguali a questo stato si saltano senza alcuna richiesta.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Iterable, Tuple
+
+from config.config import Config
+
+class ProductState:
+    """Archivio SQLite reference -> ID prodotto e valori dei campi"""
+    
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        Args:
+            db_path: File SQLite (default Config.PRODUCT_STATE_FILE)
+        """
+        self.db_path = Path(db_path or Config.PRODUCT_STATE_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                reference TEXT PRIMARY KEY,
+                product_id TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    def close(self):
+        """Chiude il database"""
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def get_many(self, references: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Stato noto di molti reference
+        
+        Returns:
+            Dizionario reference -> {'product_id': str, 'fields': {campo: testo}}
+        """
+        references = list(references)
+        result = {}
+        with self._lock:
+            # SQLite limita il numero di parametri per query
+            for i in range(0, len(references), 500):
+                chunk = references[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT reference, product_id, fields FROM products WHERE reference IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for reference, product_id, fields in rows:
+                    result[reference] = {'product_id': product_id, 'fields': json.loads(fields)}
+        return result
+    
+    def set_many(self, entries: Iterable[Tuple[str, str, Dict[str, str]]]):
+        """
+        Salva molte voci in una sola transazione
+        
+        Args:
+            entries: Tuple (reference, product_id, {campo: testo}); i campi
+                     si aggiungono a quelli già salvati per lo stesso prodotto
+        """
+        entries = list(entries)
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            previous = {}
+            for i in range(0, len(entries), 500):
+                chunk = [reference for reference, _, _ in entries[i:i + 500]]
+                placeholders = ','.join('?' * len(chunk))
+                previous.update(
+                    (reference, (product_id, json.loads(fields)))
+                    for reference, product_id, fields in self._conn.execute(
+                        f"SELECT reference, product_id, fields FROM products WHERE reference IN ({placeholders})",
+                        chunk
+                    )
+                )
+            rows = []
+            for reference, product_id, fields in entries:
+                old_id, old_fields = previous.get(reference, (None, {}))
+                merged = dict(old_fields, **fields) if old_id == str(product_id) else dict(fields)
+                rows.append((reference, str(product_id), json.dumps(merged, ensure_ascii=False), now))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO products (reference, product_id, fields, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+    
+    def clear(self):
+        """Svuota lo stato (il prossimo aggiornamento rilegge tutto dal negozio)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM products")
+            self._conn.commit()
@@ -0,0 +1,269 @@
+"""
+Aggiornamento dei campi prodotto da CSV (prezzi, nomi, stato...)
+
+Il CSV ha la colonna reference e una colonna per ogni campo da
+aggiornare (tra quelli di Product.WRITABLE); una cella vuota lascia il
+campo com'è. Le righe si elaborano a blocchi:
+
+1. le righe uguali all'ultimo stato noto (ProductState) si saltano
+   senza richieste;
+2. per le altre si legge lo stato attuale dei soli campi del CSV con
+   poche richieste in blocco (filter[reference]=[A|B|C]);
+3. si inviano in parallelo solo i campi davvero diversi, con PATCH o,
+   se il negozio non lo supporta, con PUT della risorsa completa.
+
+Un listino giornaliero di decine di migliaia di righe con poche
+variazioni si riduce così alle sole righe cambiate.
+"""
+
+import csv
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Iterator, Tuple
+
+from config.config import Config
+from src.pipeline import batched
+from src.profiling import phase, timed_iter
+from src.records import Product
+
+logger = logging.getLogger(__name__)
+
+_TRUE_VALUES = {'1', 'true', 'si', 'sì', 'yes', 'y'}
+_FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+def parse_csv_value(name: str, text: str):
+    """
+    Valore di una cella del CSV nel tipo del campo (decimali anche con la virgola)
+    
+    Raises:
+        ValueError: Valore non valido per il campo
+    """
+    kind = Product.TYPES.get(name)
+    if kind is float:
+        return float(text.replace(',', '.'))
+    if name == 'active':
+        value = text.lower()
+        if value not in _TRUE_VALUES | _FALSE_VALUES:
+            raise ValueError(f"valore non valido per {name}: {text!r}")
+        return value in _TRUE_VALUES
+    return text
+
+def csv_fields(header: List[str]) -> List[str]:
+    """Colonne del CSV che corrispondono a campi modificabili (avviso per le altre)"""
+    fields = [name for name in header if name in Product.WRITABLE]
+    ignored = [name for name in header if name and name != 'reference' and name not in Product.WRITABLE]
+    if ignored:
+        logger.warning(f"Colonne ignorate (non modificabili): {', '.join(ignored)}")
+    return fields
+
+def iter_csv_updates(csv_path: str, fields: List[str]) -> Iterator[Tuple[int, str, Dict[str, str]]]:
+    """
+    Legge il CSV una riga alla volta
+    
+    Yields:
+        Tuple (numero riga, reference, {campo: testo}) con le sole celle non vuote
+    """
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+        for index, row in enumerate(csv.DictReader(file, delimiter=';'), 1):
+            values = {name: (row.get(name) or '').strip() for name in fields}
+            yield index, (row.get('reference') or '').strip(), {name: text for name, text in values.items() if text}
+
+def read_csv_header(csv_path: str) -> List[str]:
+    """Intestazione del CSV"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+        return next(csv.reader(file, delimiter=';'), [])
+
+def diff_fields(desired: Dict, current: Dict[str, str]) -> Dict:
+    """
+    Campi da modificare
+    
+    Args:
+        desired: Campo -> valore desiderato (già convertito)
+        current: Campo -> valore attuale come testo del webservice
+    
+    Returns:
+        Campo -> valore desiderato, solo per i campi diversi
+    """
+    return {
+        name: value for name, value in desired.items()
+        if Product.format_value(value) != current.get(name)
+    }
+
+def _current_fields(product: Product, fields: List[str]) -> Dict[str, str]:
+    """Valori attuali di un prodotto come testo del webservice (come quelli desiderati)"""
+    values = {}
+    for name in fields:
+        value = getattr(product, name)
+        if value is not None:
+            values[name] = Product.format_value(value)
+    return values
+
+class ProductUpdater:
+    """Aggiorna i prodotti di un CSV inviando solo i campi cambiati"""
+    
+    def __init__(self, api, state=None, workers: Optional[int] = None,
+                 method: Optional[str] = None, dry_run: bool = False, refresh: bool = False):
+        """
+        Args:
+            api: Istanza di PrestaShopAPI (condivisa tra i worker)
+            state: ProductState con l'ultimo stato noto (None = confronto sempre col negozio)
+            workers: Aggiornamenti inviati in parallelo (default Config.UPLOAD_WORKERS)
+            method: 'auto', 'patch' o 'put' (default Config.UPDATE_METHOD)
+            dry_run: Se True mostra le modifiche senza inviarle
+            refresh: Se True confronta ogni riga con il negozio (lo stato si aggiorna comunque)
+        """
+        self.api = api
+        self.state = state
+        self.workers = max(1, workers or Config.UPLOAD_WORKERS)
+        self.method = method or Config.UPDATE_METHOD
+        self.dry_run = dry_run
+        self.refresh = refresh
+        self.stats = {
+            'rows': 0,
+            'rows_invalid': 0,
+            'products_updated': 0,
+            'products_unchanged': 0,
+            'products_unchanged_cached': 0,
+            'products_not_found': 0,
+            'products_failed': 0,
+            'fields_updated': 0,
+        }
+        self._stats_lock = threading.Lock()
+        self._print_lock = threading.Lock()
+    
+    def _count(self, key: str, amount: int = 1):
+        """Incrementa una statistica in modo thread-safe"""
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def _print(self, message: str):
+        """Stampa un messaggio senza mescolarlo con quelli degli altri worker"""
+        with self._print_lock:
+            print(message)
+    
+    def process_csv(self, csv_path: str, fields: Optional[List[str]] = None) -> Dict:
+        """
+        Aggiorna i prodotti del CSV a blocchi di Config.PIPELINE_BATCH_SIZE righe
+        
+        Args:
+            csv_path: File CSV
+            fields: Colonne da aggiornare (default: quelle modificabili dell'intestazione)
+        """
+        if fields is None:
+            fields = csv_fields(read_csv_header(csv_path))
+        if not fields:
+            print(f"⚠️  Nessuna colonna da aggiornare (campi ammessi: {', '.join(sorted(Product.WRITABLE))})")
+            return self.stats
+        
+        print(f"\n📂 File CSV: {csv_path}")
+        print(f"🧾 Campi: {', '.join(fields)} (invio con {self.method}, {self.workers} in parallelo)")
+        rows = timed_iter('csv', iter_csv_updates(csv_path, fields))
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='update') as pool:
+            for batch in batched(rows, Config.PIPELINE_BATCH_SIZE):
+                self._process_batch(batch, fields, pool)
+        
+        if self.state is not None and not self.dry_run:
+            print(f"💾 Stato aggiornato in {self.state.db_path}")
+        return self.stats
+    
+    def _desired(self, batch) -> Dict[str, Tuple[int, Dict]]:
+        """Valori desiderati del blocco per reference (con più righe vince l'ultima)"""
+        desired = {}
+        for index, reference, values in batch:
+            self.stats['rows'] = index
+            if not reference:
+                self._print(f"[{index}] ⚠️  Reference mancante, skip")
+                self._count('rows_invalid')
+                continue
+            try:
+                parsed = {name: parse_csv_value(name, text) for name, text in values.items()}
+            except ValueError as e:
+                self._print(f"[{index}] ⚠️  {reference}: {e}")
+                self._count('rows_invalid')
+                continue
+            if parsed:
+                desired[reference] = (index, parsed)
+        return desired
+    
+    def _process_batch(self, batch, fields: List[str], pool: ThreadPoolExecutor):
+        """Confronta un blocco di righe con lo stato noto e con il negozio, poi invia le modifiche"""
+        desired = self._desired(batch)
+        
+        # 1. Stato noto: righe identiche all'ultimo aggiornamento
+        pending = list(desired)
+        if self.state is not None and not self.refresh:
+            known = self.state.get_many(pending)
+            unchanged = [ref for ref in pending if ref in known
+                         and not diff_fields(desired[ref][1], known[ref]['fields'])]
+            self._count('products_unchanged_cached', len(unchanged))
+            unchanged = set(unchanged)
+            pending = [ref for ref in pending if ref not in unchanged]
+        if not pending:
+            return
+        
+        # 2. Stato attuale dei soli campi del CSV, in blocco
+        with phase('lookup'):
+            products, failed = self.api.find_by_reference(pending, fields)
+        failed = set(failed)
+        
+        jobs = []
+        refreshed = []
+        for reference in pending:
+            index, values = desired[reference]
+            product = products.get(reference)
+            if reference in failed:
+                self._print(f"[{index}] ❌ {reference}: ricerca del prodotto fallita")
+                self._count('products_failed')
+                continue
+            if product is None:
+                self._print(f"[{index}] ❌ {reference}: prodotto non trovato")
+                self._count('products_not_found')
+                continue
+            current = _current_fields(product, fields)
+            changes = diff_fields(values, current)
+            if not changes:
+                self._count('products_unchanged')
+                refreshed.append((reference, product.id, current))
+                continue
+            jobs.append((index, reference, product.id, current, changes))
+        
+        if self.state is not None and not self.dry_run:
+            self.state.set_many(refreshed)
+        
+        # 3. Solo i campi cambiati, in parallelo
+        results = pool.map(lambda job: self._update(*job), jobs)
+        updated = [result for result in results if result is not None]
+        if self.state is not None and updated:
+            self.state.set_many(updated)
+    
+    def _update(self, index: int, reference: str, product_id: str, current: Dict[str, str],
+                changes: Dict) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        """
+        Invia le modifiche di un prodotto
+        
+        Returns:
+            Voce per ProductState se l'aggiornamento è riuscito, altrimenti None
+        """
+        summary = ', '.join(
+            f"{name} {current.get(name, '∅')} → {Product.format_value(value)}" for name, value in changes.items()
+        )
+        if self.dry_run:
+            self._print(f"[{index}] 🔎 {reference} (ID {product_id}): {summary}")
+            self._count('products_updated')
+            self._count('fields_updated', len(changes))
+            return None
+        
+        with phase('update'):
+            ok = self.api.update_record(Product, product_id, changes, self.method)
+        if not ok:
+            self._print(f"[{index}] ❌ {reference} (ID {product_id}): aggiornamento fallito")
+            self._count('products_failed')
+            return None
+        
+        self._print(f"[{index}] ✅ {reference} (ID {product_id}): {summary}")
+        self._count('products_updated')
+        self._count('fields_updated', len(changes))
+        written = {name: Product.format_value(value) for name, value in changes.items()}
+        return reference, product_id, dict(current, **written)
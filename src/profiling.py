@@ -0,0 +1,300 @@
+"""
+Profilazione delle esecuzioni (--profile)
+
+Due viste complementari, scritte in Config.LOG_DIR:
+- profilo CPU con cProfile (anche dei thread dei worker), in formato
+  pstats (.prof, apribile con snakeviz) e come testo;
+- ripartizione del tempo reale per fase (lettura CSV, scansione assets,
+  ricerca, eliminazione, lettura, upload, pause...), per distinguere le
+  attese volute dal lavoro vero.
+
+Le fasi sono esclusive: una fase annidata (es. l'attesa del rate limiter
+dentro un upload) sospende quella esterna, quindi ogni secondo è contato
+una volta sola per thread/task. Con più worker la somma delle fasi può
+superare la durata dell'esecuzione.
+
+Con trace_alloc si attiva anche tracemalloc per vedere dove si alloca
+memoria (in particolare nel percorso di lettura delle immagini).
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Moduli del percorso di lettura delle immagini (sezione dedicata nel report allocazioni)
+READ_PATH_FILES = ('api_client.py', 'multipart.py', 'image_processing.py', 'upload_images_only.py')
+
+# Fasi in cui, con trace_alloc, si fotografa la memoria ai nuovi massimi
+# (i buffer delle immagini sono già liberati quando l'esecuzione finisce)
+ALLOC_PHASES = ('read', 'transform', 'upload')
+
+_NO_PHASE = contextlib.nullcontext()
+
+# Fase in corso nel thread/task corrente: [nome, inizio, proprietario]
+_current_phase = contextvars.ContextVar('current_phase', default=None)
+
+# Profilazione attiva (None = phase() non fa nulla)
+_active: Optional["RunProfiler"] = None
+
+def phase(name: str):
+    """
+    Context manager che attribuisce il tempo del blocco alla fase `name`
+    
+    Senza profilazione attiva non misura nulla (costo trascurabile).
+    """
+    if _active is None:
+        return _NO_PHASE
+    return _Phase(_active, name)
+
+def timed_iter(name: str, iterable: Iterable) -> Iterator:
+    """Attribuisce alla fase `name` il tempo speso a produrre ogni elemento di `iterable`"""
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def _owner():
+    """Thread e task asyncio correnti (le fasi si sospendono solo nello stesso flusso)"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), id(task) if task is not None else None
+
+class _Phase:
+    """Una fase in corso (sospende quella esterna dello stesso thread/task)"""
+    
+    __slots__ = ('profiler', 'name', 'frame', 'parent', 'token')
+    
+    def __init__(self, profiler: "RunProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        now = time.perf_counter()
+        owner = _owner()
+        parent = _current_phase.get()
+        if parent is not None and parent[2] != owner:
+            parent = None
+        if parent is not None:
+            self.profiler._add(parent[0], now - parent[1], calls=0)
+        self.parent = parent
+        self.frame = [self.name, now, owner]
+        self.token = _current_phase.set(self.frame)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        now = time.perf_counter()
+        self.profiler._add(self.name, now - self.frame[1])
+        if self.profiler.trace_alloc and self.name in ALLOC_PHASES:
+            self.profiler._sample_memory(self.name)
+        _current_phase.reset(self.token)
+        if self.parent is not None:
+            self.parent[1] = now
+        return False
+
+class RunProfiler:
+    """Profilo CPU, fasi e (opzionale) allocazioni di un'esecuzione"""
+    
+    def __init__(self, name: str, cpu: bool = True, trace_alloc: bool = False):
+        """
+        Args:
+            name: Prefisso dei file scritti in Config.LOG_DIR (es. 'quick_upload')
+            cpu: Attiva cProfile
+            trace_alloc: Attiva tracemalloc (rallenta sensibilmente l'esecuzione)
+        """
+        self.name = name
+        self.cpu = cpu
+        self.trace_alloc = trace_alloc
+        self.phases: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._started = 0.0
+        self._wall = 0.0
+        self._peak_memory = 0
+        self._peak_snapshot = None
+        self._peak_phase = None
+    
+    def _add(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            entry = self.phases.get(name)
+            if entry is None:
+                entry = self.phases[name] = {'seconds': 0.0, 'calls': 0, 'max': 0.0}
+            entry['seconds'] += seconds
+            entry['calls'] += calls
+            if calls:
+                entry['max'] = max(entry['max'], seconds)
+    
+    def _sample_memory(self, phase_name: str):
+        """Fotografa le allocazioni se la memoria tracciata supera il massimo visto finora"""
+        current, _ = tracemalloc.get_traced_memory()
+        with self._lock:
+            if current <= self._peak_memory * 1.1:
+                return
+            self._peak_memory = current
+        snapshot = tracemalloc.take_snapshot()
+        with self._lock:
+            self._peak_snapshot = snapshot
+            self._peak_phase = phase_name
+    
+    def _thread_profile(self, frame, event, arg):
+        """Hook dei nuovi thread: avvia un cProfile per ciascuno"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: un solo profiler per processo, quello principale vede già tutti i thread
+            threading.setprofile(None)
+            return
+        with self._lock:
+            self._profiles.append(profile)
+    
+    def start(self) -> "RunProfiler":
+        """Inizia a misurare (fasi, CPU e allocazioni)"""
+        global _active
+        if self.trace_alloc:
+            tracemalloc.start(10)
+        if self.cpu:
+            profile = cProfile.Profile()
+            self._profiles.append(profile)
+            threading.setprofile(self._thread_profile)
+            profile.enable()
+        _active = self
+        self._started = time.perf_counter()
+        return self
+    
+    def stop(self) -> Dict[str, Path]:
+        """
+        Ferma le misure e scrive i file in Config.LOG_DIR
+        
+        Returns:
+            Dizionario tipo -> percorso dei file scritti
+        """
+        global _active
+        self._wall = time.perf_counter() - self._started
+        _active = None
+        if self.cpu:
+            self._profiles[0].disable()
+            threading.setprofile(None)
+        
+        Config.LOG_DIR.mkdir(parents=True, exist_ok=True)
+        prefix = Config.LOG_DIR / f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        artifacts = {}
+        
+        phases_path = prefix.with_name(prefix.name + '_phases.json')
+        phases_path.write_text(json.dumps(self.phase_report(), indent=2), encoding='utf-8')
+        artifacts['phases'] = phases_path
+        
+        if self.cpu:
+            stats = pstats.Stats(*self._profiles)
+            prof_path = prefix.with_suffix('.prof')
+            stats.dump_stats(prof_path)
+            artifacts['cpu'] = prof_path
+            
+            text = io.StringIO()
+            pstats.Stats(*self._profiles, stream=text).sort_stats('cumulative').print_stats(40)
+            text_path = prefix.with_name(prefix.name + '_profile.txt')
+            text_path.write_text(text.getvalue(), encoding='utf-8')
+            artifacts['cpu_text'] = text_path
+        
+        if self.trace_alloc:
+            alloc_path = prefix.with_name(prefix.name + '_alloc.txt')
+            alloc_path.write_text(self._allocation_report(), encoding='utf-8')
+            tracemalloc.stop()
+            artifacts['alloc'] = alloc_path
+        
+        return artifacts
+    
+    def phase_report(self) -> Dict:
+        """Tempo per fase, dalla più costosa"""
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: -item[1]['seconds'])
+        wall = self._wall or (time.perf_counter() - self._started)
+        measured = sum(entry['seconds'] for _, entry in phases)
+        return {
+            'wall_s': round(wall, 3),
+            'measured_s': round(measured, 3),
+            'phases': {
+                name: {
+                    'seconds': round(entry['seconds'], 3),
+                    'calls': entry['calls'],
+                    'mean_ms': round(entry['seconds'] * 1000 / entry['calls'], 2) if entry['calls'] else None,
+                    'max_ms': round(entry['max'] * 1000, 2),
+                    'share': round(entry['seconds'] / measured, 4) if measured else 0.0,
+                }
+                for name, entry in phases
+            },
+        }
+    
+    def _allocation_report(self) -> str:
+        """Punti con più memoria allocata ancora viva, e picco complessivo"""
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        lines = [f"Memoria tracciata: attuale {current / 1024 / 1024:.1f} MB, picco {peak / 1024 / 1024:.1f} MB", ""]
+        
+        lines.append("Top 25 righe per memoria allocata:")
+        for stat in snapshot.statistics('lineno')[:25]:
+            lines.append(f"  {stat}")
+        
+        read_filters = [tracemalloc.Filter(True, f"*{name}") for name in READ_PATH_FILES]
+        lines += ["", "Percorso di lettura immagini (" + ", ".join(READ_PATH_FILES) + "):"]
+        if self._peak_snapshot is None:
+            lines.append("  nessuna lettura misurata")
+            return '\n'.join(lines) + '\n'
+        lines.append(f"  massimo {self._peak_memory / 1024 / 1024:.1f} MB durante la fase '{self._peak_phase}'")
+        read_path = self._peak_snapshot.filter_traces(read_filters)
+        for stat in read_path.statistics('traceback')[:10]:
+            lines.append(f"  {stat.count} blocchi, {stat.size / 1024:.1f} KB")
+            lines.extend(f"    {line}" for line in stat.traceback.format(limit=4, most_recent_first=True))
+        return '\n'.join(lines) + '\n'
+    
+    def print_summary(self, artifacts: Dict[str, Path]):
+        """Riepilogo a video delle fasi e dei file scritti"""
+        report = self.phase_report()
+        print(f"\n🔬 Profilo: {report['wall_s']:.1f}s di esecuzione, {report['measured_s']:.1f}s misurati nelle fasi")
+        for name, entry in report['phases'].items():
+            print(f"   {name:<10} {entry['seconds']:>9.2f}s {entry['share']:>7.1%}  {entry['calls']:>7}×")
+        for kind, path in artifacts.items():
+            print(f"   📄 {kind}: {path}")
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.print_summary(self.stop())
+        return False
+
+def start_profiler(name: str, enabled: bool, trace_alloc: bool = False) -> Optional[RunProfiler]:
+    """Profiler avviato se richiesto da riga di comando, altrimenti None"""
+    if not (enabled or trace_alloc):
+        return None
+    profiler = RunProfiler(name, cpu=enabled, trace_alloc=trace_alloc)
+    return profiler.start()
+
+def stop_profiler(profiler: Optional[RunProfiler]):
+    """Ferma il profiler (se attivo) e mostra il riepilogo"""
+    if profiler is None:
+        return
+    profiler.print_summary(profiler.stop())
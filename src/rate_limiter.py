@@ -0,0 +1,244 @@
+"""
+Controllo adattivo della velocità delle richieste verso PrestaShop
+
+Token bucket con regolazione AIMD (aumento additivo, diminuzione
+moltiplicativa): la velocità cresce finché il server risponde in fretta
+e viene dimezzata con 429/503 o latenze troppo alte, rispettando
+Retry-After. Condiviso tra thread e utilizzabile anche da asyncio.
+"""
+
+import asyncio
+import threading
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from config.config import Config
+from src.profiling import phase
+
+logger = logging.getLogger(__name__)
+
+# Status che indicano un server sovraccarico
+THROTTLE_STATUSES = {429, 503}
+
+class RateLimiter:
+    """Token bucket con velocità adattiva e limite di richieste in volo"""
+    
+    def __init__(self, target_rps: Optional[float] = None,
+                 min_rps: Optional[float] = None,
+                 max_rps: Optional[float] = None,
+                 max_in_flight: Optional[int] = None,
+                 latency_target: Optional[float] = None):
+        """
+        Args:
+            target_rps: Velocità iniziale in richieste/secondo (default Config.RATE_TARGET_RPS)
+            min_rps: Velocità minima dopo i rallentamenti (default Config.RATE_MIN_RPS)
+            max_rps: Velocità massima raggiungibile (default Config.RATE_MAX_RPS)
+            max_in_flight: Richieste contemporanee massime (default Config.MAX_IN_FLIGHT)
+            latency_target: Latenza oltre la quale si rallenta, in secondi (default Config.RATE_LATENCY_TARGET)
+        """
+        self.min_rps = min_rps if min_rps is not None else Config.RATE_MIN_RPS
+        self.max_rps = max_rps if max_rps is not None else Config.RATE_MAX_RPS
+        self.rate = min(max(target_rps or Config.RATE_TARGET_RPS, self.min_rps), self.max_rps)
+        self.max_in_flight = max_in_flight or Config.MAX_IN_FLIGHT
+        self.latency_target = latency_target if latency_target is not None else Config.RATE_LATENCY_TARGET
+        
+        # Fattori AIMD
+        self.increase_step = 1.0       # +1 req/s circa ogni secondo di risposte veloci
+        self.decrease_factor = 0.5     # dimezza con 429/503/errori
+        self.slow_factor = 0.9         # rallenta un po' con latenze alte
+        
+        self._lock = threading.Lock()
+        # Risveglia chi aspetta uno slot appena una richiesta termina (niente polling)
+        self._slot_free = threading.Condition(self._lock)
+        self._async_waiters = []   # (event loop, future) delle attese asyncio
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        
+        # Contatori per report e metriche
+        self.throttle_events = 0
+        self.total_wait = 0.0
+    
+    def _try_acquire(self) -> Optional[float]:
+        """
+        Prova a prendere un token e uno slot (da chiamare con il lock preso)
+        
+        Returns:
+            0 se acquisito, None se tutti gli slot sono occupati (si attende
+            un release), altrimenti i secondi da attendere prima di riprovare
+        """
+        now = time.monotonic()
+        
+        if now < self._paused_until:
+            return self._paused_until - now
+        
+        # Ricarica il bucket (capacità massima: un secondo di richieste)
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(max(self.rate, 1.0), self._tokens + elapsed * self.rate)
+        
+        if self._in_flight >= self.max_in_flight:
+            return None
+        
+        if self._tokens < 1.0:
+            return (1.0 - self._tokens) / self.rate
+        
+        self._tokens -= 1.0
+        self._in_flight += 1
+        return 0
+    
+    def acquire(self):
+        """Attende (bloccando il thread) il permesso di inviare una richiesta"""
+        started = time.monotonic()
+        with phase('throttle'), self._slot_free:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    break
+                # Senza timeout si dorme fino al prossimo release
+                self._slot_free.wait(wait)
+            self.total_wait += time.monotonic() - started
+    
+    async def acquire_async(self):
+        """Come acquire(), ma senza bloccare l'event loop"""
+        started = time.monotonic()
+        with phase('throttle'):
+            while True:
+                waiter = None
+                with self._lock:
+                    wait = self._try_acquire()
+                    if wait is None:
+                        loop = asyncio.get_running_loop()
+                        waiter = (loop, loop.create_future())
+                        self._async_waiters.append(waiter)
+                if wait == 0:
+                    break
+                if waiter is None:
+                    await asyncio.sleep(wait)
+                    continue
+                try:
+                    await waiter[1]
+                finally:
+                    with self._lock:
+                        if waiter in self._async_waiters:
+                            self._async_waiters.remove(waiter)
+        with self._lock:
+            self.total_wait += time.monotonic() - started
+    
+    def release(self, status_code: Optional[int], latency: float,
+                retry_after: Optional[str] = None, latency_sensitive: bool = True):
+        """
+        Libera lo slot e adatta la velocità all'esito della richiesta
+        
+        Args:
+            status_code: Status HTTP ricevuto (None = errore di connessione)
+            latency: Durata della richiesta in secondi
+            retry_after: Valore dell'header Retry-After, se presente
+            latency_sensitive: False per richieste lente per natura (upload immagini)
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._wake_waiters()
+            now = time.monotonic()
+            
+            if status_code is None or status_code in THROTTLE_STATUSES:
+                self._decrease(now, self.decrease_factor)
+                pause = parse_retry_after(retry_after)
+                if pause:
+                    self._paused_until = max(self._paused_until, now + pause)
+                    logger.warning(f"⏸️  Server sovraccarico: pausa di {pause:.1f}s (Retry-After)")
+            elif latency_sensitive and self.latency_target and latency > self.latency_target:
+                self._decrease(now, self.slow_factor)
+            elif status_code < 500:
+                # Aumento additivo: circa +increase_step req/s per secondo di risposte
+                self.rate = min(self.max_rps, self.rate + self.increase_step / max(self.rate, 1.0))
+    
+    def _wake_waiters(self):
+        """Sveglia thread e task in attesa di uno slot (da chiamare con il lock preso)"""
+        self._slot_free.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            # release può arrivare da un altro thread o da un altro event loop
+            loop.call_soon_threadsafe(_wake, future)
+    
+    def check_workers(self, workers: int):
+        """Avvisa se i worker superano le richieste in volo consentite"""
+        if workers > self.max_in_flight:
+            print(f"⚠️  {workers} worker ma al massimo {self.max_in_flight} richieste in volo "
+                  f"(MAX_IN_FLIGHT): i worker in più restano in attesa")
+    
+    def _decrease(self, now: float, factor: float):
+        """Diminuzione moltiplicativa, al massimo una volta per finestra di latenza"""
+        if now - self._last_decrease < max(self.latency_target, 1.0 / self.rate):
+            return
+        self._last_decrease = now
+        old_rate = self.rate
+        self.rate = max(self.min_rps, self.rate * factor)
+        self.throttle_events += 1
+        logger.debug(f"Velocità ridotta: {old_rate:.1f} -> {self.rate:.1f} req/s")
+    
+    def slot(self, latency_sensitive: bool = True) -> "RateSlot":
+        """Context manager sincrono: `with limiter.slot() as slot: ...; slot.record(status)`"""
+        return RateSlot(self, latency_sensitive)
+    
+    def async_slot(self, latency_sensitive: bool = True) -> "RateSlot":
+        """Context manager asincrono: `async with limiter.async_slot() as slot: ...`"""
+        return RateSlot(self, latency_sensitive)
+
+class RateSlot:
+    """Una richiesta in volo: misura la latenza e riporta l'esito al limiter"""
+    
+    def __init__(self, limiter: RateLimiter, latency_sensitive: bool):
+        self.limiter = limiter
+        self.latency_sensitive = latency_sensitive
+        self.status_code = None
+        self.retry_after = None
+        self._started = 0.0
+    
+    def record(self, status_code: int, retry_after: Optional[str] = None):
+        """Registra l'esito della richiesta"""
+        self.status_code = status_code
+        self.retry_after = retry_after
+    
+    def _finish(self):
+        latency = time.monotonic() - self._started
+        self.limiter.release(self.status_code, latency, self.retry_after, self.latency_sensitive)
+    
+    def __enter__(self):
+        self.limiter.acquire()
+        self._started = time.monotonic()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._finish()
+        return False
+    
+    async def __aenter__(self):
+        await self.limiter.acquire_async()
+        self._started = time.monotonic()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._finish()
+        return False
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte Retry-After (secondi o data HTTP) in secondi di attesa"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,292 @@
+"""
+Record tipizzati e compatti per le risorse del webservice
+
+Al posto degli alberi ElementTree, le risposte diventano oggetti con
+__slots__ (niente __dict__ per istanza) che contengono solo i campi
+richiesti. La lista dei campi diventa anche il parametro display=[...],
+così dal negozio arriva solo ciò che serve. Nella direzione opposta
+to_xml() e apply() preparano i corpi di PATCH e PUT con i soli campi
+da modificare.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import Optional, Dict, List, Iterable, Tuple
+
+from config.config import Config
+
+# Le risorse complete rilette per il PUT mantengono il prefisso xlink: invece di ns0:
+ET.register_namespace('xlink', 'http://www.w3.org/1999/xlink')
+
+def _to_bool(value: str) -> bool:
+    return value == '1'
+
+class Record:
+    """
+    Base dei record: un attributo per campo (stesso nome del tag XML),
+    None se non richiesto o assente
+    """
+    
+    __slots__ = ()
+    
+    ENDPOINT = ''                        # endpoint dell'elenco (es. 'products')
+    TAG = ''                             # tag di ogni risorsa nell'elenco (es. 'product')
+    ASSOCIATIONS: Dict[str, str] = {}    # campo -> percorso degli ID nelle associations
+    TYPES: Dict[str, type] = {}          # conversioni (default: stringa)
+    LANGUAGE_FIELDS = frozenset()        # campi multilingua (si legge Config.DEFAULT_LANGUAGE_ID)
+    WRITABLE = frozenset()               # campi modificabili con PrestaShopAPI.update_record
+    PUT_EXCLUDE: Tuple[str, ...] = ()    # campi in sola lettura da togliere dalla risorsa completa prima del PUT
+    
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+    
+    def __repr__(self):
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__
+                           if getattr(self, name) is not None)
+        return f"{type(self).__name__}({values})"
+    
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+    
+    def to_dict(self) -> Dict:
+        """Campi valorizzati come dizionario"""
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+    
+    @classmethod
+    def fields(cls, fields: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+        """Valida una proiezione (default: tutti i campi); 'id' è sempre incluso"""
+        if fields is None:
+            return cls.__slots__
+        fields = tuple(dict.fromkeys(('id',) + tuple(fields)))
+        unknown = [name for name in fields if name not in cls.__slots__]
+        if unknown:
+            raise ValueError(f"Campi non validi per {cls.__name__}: {', '.join(unknown)}")
+        return fields
+    
+    @classmethod
+    def display(cls, fields: Optional[Iterable[str]] = None) -> str:
+        """
+        Valore del parametro display per una proiezione
+        
+        Le associations arrivano solo con display=full: se tra i campi
+        ce n'è una, si chiede la risorsa completa.
+        """
+        fields = cls.fields(fields)
+        if any(name in cls.ASSOCIATIONS for name in fields):
+            return 'full'
+        return '[' + ','.join(fields) + ']'
+    
+    @classmethod
+    def from_element(cls, element: ET.Element, fields: Optional[Iterable[str]] = None) -> "Record":
+        """Costruisce il record da un elemento (es. <product>) leggendo solo i campi indicati"""
+        values = {}
+        for name in cls.fields(fields):
+            if name in cls.ASSOCIATIONS:
+                values[name] = [
+                    node.text for node in element.findall(cls.ASSOCIATIONS[name]) if node.text
+                ]
+                continue
+            
+            node = element.find(name)
+            if node is None:
+                continue
+            if name in cls.LANGUAGE_FIELDS:
+                text = _language_text(node)
+            else:
+                text = node.text
+            if text is None:
+                continue
+            text = text.strip()
+            values[name] = cls.TYPES[name](text) if name in cls.TYPES and text != '' else text
+        return cls(**values)
+    
+    @classmethod
+    def from_json(cls, data: Dict, fields: Optional[Iterable[str]] = None) -> "Record":
+        """Come from_element, per una risorsa letta con output_format=JSON"""
+        values = {}
+        for name in cls.fields(fields):
+            if name in cls.ASSOCIATIONS:
+                # 'associations/images/image/id' -> data['associations']['images'][n]['id']
+                parts = cls.ASSOCIATIONS[name].split('/')
+                items = (data.get(parts[0]) or {}).get(parts[1]) or []
+                values[name] = [str(item[parts[-1]]) for item in items if item.get(parts[-1])]
+                continue
+            
+            value = data.get(name)
+            if isinstance(value, list):
+                value = _language_value(value)
+            if value is None:
+                continue
+            text = str(value).strip()
+            values[name] = cls.TYPES[name](text) if name in cls.TYPES and text != '' else text
+        return cls(**values)
+    
+    @classmethod
+    def from_list(cls, root, fields: Optional[Iterable[str]] = None) -> List["Record"]:
+        """
+        Record di una risposta a elenco, XML (<prestashop><products><product>...)
+        oppure JSON ({"products": [...]}, o [] se l'elenco è vuoto)
+        """
+        if root is None:
+            return []
+        if isinstance(root, ET.Element):
+            return [cls.from_element(element, fields) for element in root.findall(f"{cls.ENDPOINT}/{cls.TAG}")]
+        return [cls.from_json(item, fields) for item in json_list_items(root)]
+    
+    @staticmethod
+    def format_value(value) -> str:
+        """Valore come testo per il webservice (booleani 1/0, decimali con 6 cifre come PrestaShop)"""
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, float):
+            return f"{value:.6f}"
+        return str(value)
+    
+    @classmethod
+    def _set_value(cls, node: ET.Element, name: str, value):
+        """Scrive un valore nel nodo di un campo (nella lingua di default se multilingua)"""
+        text = cls.format_value(value)
+        if name not in cls.LANGUAGE_FIELDS:
+            node.text = text
+            return
+        language_id = str(Config.DEFAULT_LANGUAGE_ID)
+        for language in node.findall('language'):
+            if language.get('id') == language_id:
+                language.text = text
+                return
+        node.text = None
+        ET.SubElement(node, 'language', id=language_id).text = text
+    
+    @classmethod
+    def _check_writable(cls, values: Dict):
+        unknown = [name for name in values if name not in cls.WRITABLE]
+        if unknown:
+            raise ValueError(f"Campi non modificabili per {cls.__name__}: {', '.join(unknown)}")
+    
+    @classmethod
+    def to_xml(cls, resource_id: str, values: Dict) -> str:
+        """
+        Documento con l'ID e i soli campi indicati (corpo di un PATCH)
+        
+        Raises:
+            ValueError: Campo non in WRITABLE
+        """
+        cls._check_writable(values)
+        root = ET.Element('prestashop')
+        element = ET.SubElement(root, cls.TAG)
+        ET.SubElement(element, 'id').text = str(resource_id)
+        for name, value in values.items():
+            cls._set_value(ET.SubElement(element, name), name, value)
+        return ET.tostring(root, encoding='unicode')
+    
+    @classmethod
+    def apply(cls, element: ET.Element, values: Dict) -> ET.Element:
+        """
+        Scrive i valori nella risorsa completa letta dal negozio (es. <product>),
+        togliendo i campi in sola lettura, per rimandarla con un PUT
+        
+        Raises:
+            ValueError: Campo non in WRITABLE
+        """
+        cls._check_writable(values)
+        for name in cls.PUT_EXCLUDE:
+            node = element.find(name)
+            if node is not None:
+                element.remove(node)
+        for name, value in values.items():
+            node = element.find(name)
+            if node is None:
+                node = ET.SubElement(element, name)
+            cls._set_value(node, name, value)
+        return element
+
+def json_list_items(payload) -> List[Dict]:
+    """Risorse di una risposta JSON a elenco (PrestaShop risponde [] se non ci sono risultati)"""
+    if isinstance(payload, dict):
+        for items in payload.values():
+            if isinstance(items, list):
+                return items
+    return []
+
+def _language_value(values: List[Dict]) -> Optional[str]:
+    """Valore nella lingua di default di un campo multilingua JSON ([{'id': '1', 'value': ...}])"""
+    for item in values:
+        if str(item.get('id')) == str(Config.DEFAULT_LANGUAGE_ID):
+            return item.get('value')
+    return values[0].get('value') if values else None
+
+def _language_text(node: ET.Element) -> Optional[str]:
+    """Testo nella lingua di default di un campo multilingua (o il primo disponibile)"""
+    languages = node.findall('language')
+    if not languages:
+        return node.text
+    for language in languages:
+        if language.get('id') == str(Config.DEFAULT_LANGUAGE_ID):
+            return language.text
+    return languages[0].text
+
+class Product(Record):
+    """Prodotto"""
+    
+    __slots__ = ('id', 'reference', 'name', 'price', 'active', 'id_category_default',
+                 'ean13', 'date_upd', 'image_ids', 'category_ids')
+    
+    ENDPOINT = 'products'
+    TAG = 'product'
+    ASSOCIATIONS = {
+        'image_ids': 'associations/images/image/id',
+        'category_ids': 'associations/categories/category/id',
+    }
+    TYPES = {'price': float, 'active': _to_bool}
+    LANGUAGE_FIELDS = frozenset({'name'})
+    WRITABLE = frozenset({'name', 'price', 'active', 'id_category_default', 'ean13'})
+    # Il webservice rifiuta il PUT di un prodotto che li contiene
+    PUT_EXCLUDE = ('manufacturer_name', 'quantity')
+
+class Category(Record):
+    """Categoria"""
+    
+    __slots__ = ('id', 'id_parent', 'name', 'link_rewrite', 'active', 'position', 'date_upd')
+    
+    ENDPOINT = 'categories'
+    TAG = 'category'
+    TYPES = {'active': _to_bool, 'position': int}
+    LANGUAGE_FIELDS = frozenset({'name', 'link_rewrite'})
+
+class StockAvailable(Record):
+    """Disponibilità di magazzino di un prodotto (o di una combinazione)"""
+    
+    __slots__ = ('id', 'id_product', 'id_product_attribute', 'id_shop', 'quantity',
+                 'depends_on_stock', 'out_of_stock')
+    
+    ENDPOINT = 'stock_availables'
+    TAG = 'stock_available'
+    TYPES = {'quantity': int, 'depends_on_stock': _to_bool, 'out_of_stock': int}
+    WRITABLE = frozenset({'quantity', 'out_of_stock'})
+
+class Image(Record):
+    """Immagine di un prodotto (da images/products/{id})"""
+    
+    __slots__ = ('id', 'product_id', 'position')
+    
+    ENDPOINT = 'images/products'
+    TAG = 'declination'
+    
+    @classmethod
+    def from_product_images(cls, root: Optional[ET.Element], product_id: str) -> List["Image"]:
+        """
+        Immagini di un prodotto, nell'ordine restituito dal negozio
+        
+        La risposta è <image id="ID prodotto"> con un <declination id="ID immagine">
+        per ogni immagine.
+        """
+        if root is None:
+            return []
+        return [
+            cls(id=node.get('id'), product_id=str(product_id), position=position)
+            for position, node in enumerate(
+                (node for node in root.iter(cls.TAG) if node.get('id')), 1
+            )
+        ]
@@ -0,0 +1,199 @@
+"""
+Indice locale reference -> ID prodotto (SQLite)
+
+Evita di richiedere al negozio, ad ogni esecuzione, gli ID dei prodotti
+già conosciuti. Per ogni reference salva anche l'ultima date_upd vista,
+con scadenza (TTL) e invalidazione esplicita; le voci scadute si
+eliminano all'apertura. Gli ID delle immagini non si conservano: prima
+di eliminarle si rileggono sempre dal negozio.
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+import requests
+from pathlib import Path
+from typing import Optional, Dict, Iterable
+
+from config.config import Config
+from src.records import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceIndex:
+    """Cache persistente su disco delle ricerche per reference"""
+    
+    def __init__(self, db_path: Optional[Path] = None, ttl_hours: Optional[float] = None):
+        """
+        Apre (o crea) l'indice
+        
+        Args:
+            db_path: File SQLite (default Config.INDEX_FILE)
+            ttl_hours: Validità di una voce in ore (default Config.INDEX_TTL_HOURS, 0 = senza scadenza)
+        """
+        self.db_path = Path(db_path or Config.INDEX_FILE)
+        self.ttl = (ttl_hours if ttl_hours is not None else Config.INDEX_TTL_HOURS) * 3600
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Una sola connessione condivisa tra i thread, protetta da lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                reference TEXT PRIMARY KEY,
+                product_id TEXT NOT NULL,
+                date_upd TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.purge_expired()
+    
+    def close(self):
+        """Chiude il database"""
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def _min_timestamp(self) -> float:
+        """Timestamp minimo perché una voce sia ancora valida"""
+        return time.time() - self.ttl if self.ttl > 0 else 0
+    
+    def get(self, reference: str) -> Optional[str]:
+        """Ritorna l'ID prodotto in cache per un reference, None se assente o scaduto"""
+        return self.get_many([reference]).get(reference)
+    
+    def get_many(self, references: Iterable[str]) -> Dict[str, str]:
+        """
+        Cerca molti reference nell'indice
+        
+        Returns:
+            Dizionario reference -> ID prodotto per le sole voci valide
+        """
+        references = list(references)
+        result = {}
+        with self._lock:
+            # SQLite limita il numero di parametri per query
+            for i in range(0, len(references), 500):
+                chunk = references[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT reference, product_id FROM products "
+                    f"WHERE reference IN ({placeholders}) AND updated_at >= ?",
+                    (*chunk, self._min_timestamp())
+                ).fetchall()
+                result.update(rows)
+        return result
+    
+    def set(self, reference: str, product_id: str, date_upd: Optional[str] = None):
+        """Salva (o aggiorna) una voce"""
+        self.set_many([(reference, product_id, date_upd)])
+    
+    def set_many(self, entries: Iterable[tuple]):
+        """
+        Salva molte voci in una sola transazione
+        
+        Args:
+            entries: Tuple (reference, product_id, date_upd); date_upd a None
+                     mantiene il valore già salvato
+        """
+        now = time.time()
+        rows = [(ref, str(product_id), date_upd, now) for ref, product_id, date_upd in entries]
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO products (reference, product_id, date_upd, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(reference) DO UPDATE SET
+                    product_id = excluded.product_id,
+                    date_upd = COALESCE(excluded.date_upd, products.date_upd),
+                    updated_at = excluded.updated_at
+            """, rows)
+            self._conn.commit()
+    
+    def invalidate(self, references: Iterable[str]) -> int:
+        """Rimuove esplicitamente alcuni reference dall'indice"""
+        references = list(references)
+        with self._lock:
+            cursor = self._conn.executemany(
+                "DELETE FROM products WHERE reference = ?",
+                [(ref,) for ref in references]
+            )
+            self._conn.commit()
+        return cursor.rowcount
+    
+    def purge_expired(self) -> int:
+        """Elimina le voci scadute"""
+        if self.ttl <= 0:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM products WHERE updated_at < ?", (self._min_timestamp(),)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+    
+    def clear(self):
+        """Svuota completamente l'indice"""
+        with self._lock:
+            self._conn.execute("DELETE FROM products")
+            self._conn.commit()
+    
+    def count(self) -> int:
+        """Numero di voci valide"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM products WHERE updated_at >= ?", (self._min_timestamp(),)
+            ).fetchone()[0]
+    
+    def rebuild(self, api, page_size: Optional[int] = None) -> int:
+        """
+        Ricostruisce l'indice dall'elenco completo dei prodotti del negozio
+        
+        Args:
+            api: Istanza di PrestaShopAPI
+            page_size: Prodotti per pagina (default Config.INDEX_PAGE_SIZE)
+        
+        Returns:
+            Numero di prodotti indicizzati
+        """
+        page_size = page_size or Config.INDEX_PAGE_SIZE
+        
+        # Solo id, reference e date_upd; l'elenco è letto in streaming e salvato a blocchi di una pagina
+        seen = set()
+        entries = []
+        complete = False
+        try:
+            fields = ['reference', 'date_upd']
+            for product in api.iter_records(Product, fields, page_size=page_size):
+                if not product.reference or product.reference in seen:
+                    continue
+                seen.add(product.reference)
+                entries.append((product.reference, product.id, product.date_upd))
+                
+                if len(entries) >= page_size:
+                    self.set_many(entries)
+                    entries = []
+                    logger.info(f"Indicizzati {len(seen)} prodotti...")
+            complete = True
+        except requests.RequestException as e:
+            logger.error(f"❌ Ricostruzione indice interrotta dopo {len(seen)} prodotti: {e}")
+        
+        self.set_many(entries)
+        
+        # Le voci non più presenti sul negozio vengono eliminate (solo con l'elenco completo)
+        if complete:
+            with self._lock:
+                known = [row[0] for row in self._conn.execute("SELECT reference FROM products")]
+            self.invalidate(ref for ref in known if ref not in seen)
+        
+        logger.info(f"✅ Indice ricostruito: {len(seen)} prodotti")
+        return len(seen)
@@ -0,0 +1,301 @@
+"""
+Cache delle risposte GET del webservice (LRU in memoria + SQLite opzionale)
+
+Nella stessa esecuzione molte letture si ripetono (elenco categorie,
+ricerche per reference, images/products/{id} nel piano e in verifica):
+con la cache la seconda lettura non parte. Le letture che precedono
+un'eliminazione o il confronto con il manifest passano cache=False.
+
+- Ogni endpoint ha il suo TTL (Config.CACHE_TTL, con eccezioni in
+  Config.CACHE_TTLS): entro il TTL la risposta si riusa senza richieste.
+- Scaduto il TTL, se il negozio aveva inviato ETag o Last-Modified la
+  voce si rivalida con If-None-Match / If-Modified-Since: un 304 costa
+  una richiesta ma nessun corpo; senza validatori la voce si scarta.
+- La memoria è limitata in byte (Config.CACHE_MAX_MB): oltre il limite
+  escono le voci usate meno di recente.
+- POST, PUT, PATCH e DELETE su una risorsa invalidano le letture della
+  stessa risorsa e degli elenchi che la contengono (products/5 invalida
+  products/5 e products?filter...; images/products/5 anche products/5).
+  Una GET partita prima di una scrittura concorrente sulla stessa risorsa
+  non viene salvata: ogni invalidazione fa avanzare la generazione del
+  percorso e store() scarta le risposte lette con una generazione vecchia.
+- Con Config.CACHE_DISK le voci si salvano anche su SQLite e valgono tra
+  un'esecuzione e l'altra (sempre con TTL e rivalidazione).
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Set, Tuple
+from urllib.parse import urlencode
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """
+    TTL per endpoint da "categories=600,stock_availables=0"
+    
+    Raises:
+        ValueError: Voce non nel formato endpoint=secondi
+    """
+    ttls = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        endpoint, separator, seconds = item.partition('=')
+        if not separator:
+            raise ValueError(f"TTL non valido: {item!r} (atteso endpoint=secondi)")
+        ttls[endpoint.strip().strip('/')] = float(seconds)
+    return ttls
+
+def _affected_paths(endpoint: str) -> Set[str]:
+    """Percorsi le cui letture cambiano con una scrittura su endpoint (la risorsa e i suoi elenchi)"""
+    parts = [part for part in endpoint.split('?')[0].split('/') if part]
+    paths = {'/'.join(parts[:length]) for length in range(1, len(parts) + 1)}
+    # Le immagini di un prodotto compaiono anche nelle sue associations
+    if parts[:2] == ['images', 'products'] and len(parts) > 2:
+        paths.update({'products', f'products/{parts[2]}'})
+    return paths
+
+class CacheEntry:
+    """Risposta salvata con i validatori per la rivalidazione"""
+    
+    __slots__ = ('path', 'body', 'etag', 'last_modified', 'stored_at')
+    
+    def __init__(self, path: str, body: bytes, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, stored_at: Optional[float] = None):
+        self.path = path
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at if stored_at is not None else time.time()
+    
+    def conditional_headers(self) -> Dict[str, str]:
+        """Intestazioni per una GET condizionale (vuote se il negozio non ha inviato validatori)"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    """Cache delle risposte GET condivisa dai thread del client"""
+    
+    def __init__(self, max_mb: Optional[float] = None, default_ttl: Optional[float] = None,
+                 ttls: Optional[Dict[str, float]] = None, db_path: Optional[Path] = None,
+                 disk: Optional[bool] = None):
+        """
+        Args:
+            max_mb: Limite della memoria in MB (default Config.CACHE_MAX_MB)
+            default_ttl: Secondi di validità senza rivalidare (default Config.CACHE_TTL)
+            ttls: Eccezioni per endpoint, es. {'categories': 600} (default da Config.CACHE_TTLS)
+            db_path: File SQLite del livello su disco (default Config.CACHE_FILE)
+            disk: Se True salva le risposte anche su disco (default Config.CACHE_DISK)
+        """
+        self.max_bytes = int((max_mb if max_mb is not None else Config.CACHE_MAX_MB) * 1024 * 1024)
+        self.default_ttl = default_ttl if default_ttl is not None else Config.CACHE_TTL
+        self.ttls = ttls if ttls is not None else parse_ttls(Config.CACHE_TTLS)
+        
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._keys_by_path: Dict[str, Set[str]] = {}
+        self._generations: Dict[str, int] = {}   # percorso -> invalidazioni avvenute
+        self._size = 0
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        
+        self._conn = None
+        if disk if disk is not None else Config.CACHE_DISK:
+            self.db_path = Path(db_path or Config.CACHE_FILE)
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_path ON responses(path)")
+            self._conn.commit()
+    
+    def close(self):
+        """Chiude il database (se presente) e riporta l'esito della cache"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        stats = self.stats
+        if stats['hits'] or stats['revalidated'] or stats['misses']:
+            logger.info(f"🗃️  Cache risposte: {stats['hits']} riusate, {stats['revalidated']} rivalidate (304), "
+                        f"{stats['misses']} lette dal negozio, {stats['invalidations']} invalidate")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    @staticmethod
+    def key(endpoint: str, params: Optional[Dict] = None) -> str:
+        """Chiave di una lettura: endpoint e parametri in ordine stabile"""
+        endpoint = endpoint.strip('/')
+        if not params:
+            return endpoint
+        return f"{endpoint}?{urlencode(sorted((str(name), str(value)) for name, value in params.items()))}"
+    
+    def ttl(self, endpoint: str) -> float:
+        """TTL dell'endpoint (vince il prefisso più lungo tra quelli in ttls)"""
+        parts = [part for part in endpoint.strip('/').split('/') if part]
+        for length in range(len(parts), 0, -1):
+            prefix = '/'.join(parts[:length])
+            if prefix in self.ttls:
+                return self.ttls[prefix]
+        return self.default_ttl
+    
+    def generation(self, endpoint: str) -> int:
+        """Generazione attuale di un percorso (da leggere prima di inviare la GET e passare a store)"""
+        with self._lock:
+            return self._generations.get(endpoint.strip('/'), 0)
+    
+    def lookup(self, endpoint: str, params: Optional[Dict] = None) -> Tuple[Optional[CacheEntry], bool]:
+        """
+        Cerca una lettura (prima in memoria, poi su disco)
+        
+        Returns:
+            Tuple (voce o None, True se ancora valida senza rivalidare);
+            una voce scaduta senza validatori viene scartata
+        """
+        key = self.key(endpoint, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            elif self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT path, body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = CacheEntry(*row)
+                    self._add(key, entry)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None, False
+            
+            if time.time() - entry.stored_at < self.ttl(entry.path):
+                self.stats['hits'] += 1
+                return entry, True
+            if entry.etag or entry.last_modified:
+                return entry, False
+            self._discard(key)
+            self.stats['misses'] += 1
+            return None, False
+    
+    def store(self, endpoint: str, params: Optional[Dict], body: bytes, headers,
+              generation: Optional[int] = None) -> None:
+        """
+        Salva una risposta 200 (non salva nulla se il TTL è 0 e mancano i validatori)
+        
+        Args:
+            generation: Valore di generation() prima della GET: se nel frattempo
+                        una scrittura ha invalidato il percorso, la risposta si scarta
+        """
+        path = endpoint.strip('/')
+        entry = CacheEntry(path, body, headers.get('ETag'), headers.get('Last-Modified'))
+        if self.ttl(path) <= 0 and not (entry.etag or entry.last_modified):
+            return
+        key = self.key(endpoint, params)
+        with self._lock:
+            if generation is not None and self._generations.get(path, 0) != generation:
+                return
+            self._add(key, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, path, body, etag, last_modified, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, path, body, entry.etag, entry.last_modified, entry.stored_at)
+                )
+                self._conn.commit()
+    
+    def revalidated(self, endpoint: str, params: Optional[Dict], entry: CacheEntry,
+                    generation: Optional[int] = None) -> None:
+        """Il negozio ha risposto 304: la voce vale per un altro TTL (se nessuna scrittura l'ha invalidata)"""
+        with self._lock:
+            self.stats['revalidated'] += 1
+            if generation is not None and self._generations.get(entry.path, 0) != generation:
+                return
+            entry.stored_at = time.time()
+            if self._conn is not None:
+                self._conn.execute("UPDATE responses SET stored_at = ? WHERE key = ?",
+                                   (entry.stored_at, self.key(endpoint, params)))
+                self._conn.commit()
+    
+    def invalidate(self, endpoint: str) -> int:
+        """
+        Scarta le letture toccate da una scrittura su endpoint
+        
+        Returns:
+            Numero di voci scartate dalla memoria
+        """
+        paths = _affected_paths(endpoint)
+        removed = 0
+        with self._lock:
+            for path in paths:
+                self._generations[path] = self._generations.get(path, 0) + 1
+                for key in list(self._keys_by_path.get(path, ())):
+                    self._discard(key)
+                    removed += 1
+            if self._conn is not None:
+                placeholders = ','.join('?' * len(paths))
+                self._conn.execute(f"DELETE FROM responses WHERE path IN ({placeholders})", list(paths))
+                self._conn.commit()
+            self.stats['invalidations'] += removed
+        return removed
+    
+    def clear(self):
+        """Svuota la cache (memoria e disco)"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self._size = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+    
+    def _add(self, key: str, entry: CacheEntry):
+        """Inserisce in memoria ed elimina le voci meno recenti oltre il limite (con il lock)"""
+        self._discard(key, disk=False)
+        if len(entry.body) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._keys_by_path.setdefault(entry.path, set()).add(key)
+        self._size += len(entry.body)
+        while self._size > self.max_bytes:
+            oldest, _ = next(iter(self._entries.items()))
+            self._discard(oldest, disk=False)
+            self.stats['evictions'] += 1
+    
+    def _discard(self, key: str, disk: bool = True):
+        """Toglie una voce dalla memoria e, se richiesto, dal disco (con il lock)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.body)
+            keys = self._keys_by_path.get(entry.path)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_path[entry.path]
+        if disk and self._conn is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
@@ -0,0 +1,103 @@
+"""
+Politica di retry per le richieste verso PrestaShop
+
+Backoff esponenziale con jitter, rispettando l'idempotenza del metodo
+e un budget massimo di retry per esecuzione (condiviso tra i thread).
+"""
+
+import random
+import threading
+import logging
+from typing import Optional
+
+from config.config import Config
+from src.rate_limiter import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Status per cui ha senso riprovare
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Metodi che possono essere ripetuti senza effetti collaterali
+# (i PATCH del client impostano valori assoluti, mai incrementi)
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+class RetryPolicy:
+    """Decide se e quando ripetere una richiesta fallita"""
+    
+    def __init__(self, max_retries: Optional[int] = None,
+                 base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None,
+                 budget: Optional[int] = None):
+        """
+        Args:
+            max_retries: Tentativi extra per richiesta (default Config.MAX_RETRIES, 0 = nessun retry)
+            base_delay: Attesa del primo retry in secondi (default Config.RETRY_BASE_DELAY)
+            max_delay: Attesa massima tra due tentativi (default Config.RETRY_MAX_DELAY)
+            budget: Retry totali concessi nell'esecuzione (default Config.RETRY_BUDGET, 0 = illimitati)
+        """
+        self.max_retries = max_retries if max_retries is not None else Config.MAX_RETRIES
+        self.base_delay = base_delay if base_delay is not None else Config.RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else Config.RETRY_MAX_DELAY
+        self.budget = budget if budget is not None else Config.RETRY_BUDGET
+        
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.budget_exhausted = 0
+    
+    def is_retryable(self, method: str, status_code: Optional[int] = None,
+                     connect_error: bool = False, transport_error: bool = False) -> bool:
+        """
+        Verifica se l'esito permette un nuovo tentativo
+        
+        Le richieste idempotenti (GET/PUT/PATCH/DELETE) si ripetono per qualsiasi
+        errore di rete o status temporaneo. Le altre (POST di immagini) solo
+        se la connessione non è mai partita, quindi il corpo non è stato
+        inviato, oppure con 429 (richiesta rifiutata prima di essere elaborata).
+        
+        Args:
+            method: Metodo HTTP
+            status_code: Status ricevuto (None se errore di rete)
+            connect_error: La connessione è fallita prima di inviare la richiesta
+            transport_error: Errore di rete durante o dopo l'invio
+        """
+        if method.upper() in IDEMPOTENT_METHODS:
+            return connect_error or transport_error or status_code in RETRY_STATUSES
+        return connect_error or status_code == 429
+    
+    def next_delay(self, method: str, attempt: int, status_code: Optional[int] = None,
+                   connect_error: bool = False, transport_error: bool = False,
+                   retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Calcola l'attesa prima del prossimo tentativo, consumando il budget
+        
+        Args:
+            method: Metodo HTTP
+            attempt: Numero di retry già fatti per questa richiesta (0 al primo errore)
+            retry_after: Header Retry-After della risposta, se presente
+        
+        Returns:
+            Secondi da attendere, oppure None se non si deve riprovare
+        """
+        if attempt >= self.max_retries:
+            return None
+        if not self.is_retryable(method, status_code, connect_error, transport_error):
+            return None
+        
+        with self._lock:
+            if self.budget and self.retries >= self.budget:
+                self.budget_exhausted += 1
+                if self.budget_exhausted == 1:
+                    logger.warning(f"⚠️  Budget di retry esaurito ({self.budget}): niente più tentativi")
+                return None
+            self.retries += 1
+        
+        # Backoff esponenziale con "full jitter"
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        
+        # Se il server indica quando riprovare, almeno quel tempo
+        server_delay = parse_retry_after(retry_after)
+        if server_delay:
+            delay = max(delay, min(server_delay, self.max_delay))
+        
+        return delay
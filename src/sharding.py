@@ -0,0 +1,173 @@
+"""
+Suddivisione di una sincronizzazione tra più processi o macchine (--shard K/N)
+
+Ogni reference appartiene a uno e un solo shard, scelto con un hash
+stabile (BLAKE2b, uguale su ogni macchina e versione di Python, a
+differenza di hash()): N lavoratori indipendenti con lo stesso CSV o la
+stessa cartella assets si dividono il lavoro senza sovrapposizioni e
+senza un servizio di coordinamento.
+
+run_shards() lancia in locale gli N shard come processi separati e
+unisce statistiche e report delle richieste.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from config.config import Config
+from src.metrics import RequestMetrics
+
+logger = logging.getLogger(__name__)
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Legge 'K/N' (shard K di N, con K da 1 a N)
+    
+    Raises:
+        ValueError: Formato non valido
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"shard non valido: {value!r} (atteso K/N, es. 2/4)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"shard non valido: {value!r} (K deve essere tra 1 e N)")
+    return index, count
+
+def shard_of(reference: str, count: int) -> int:
+    """
+    Shard (da 1 a count) a cui appartiene un reference
+    
+    Il confronto dei reference sul negozio non distingue maiuscole e
+    minuscole, quindi nemmeno l'hash: 'ABC' e 'abc' finiscono insieme.
+    """
+    digest = hashlib.blake2b(reference.strip().lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count + 1
+
+class Shard:
+    """Una fetta dei reference: shard `index` di `count`"""
+    
+    __slots__ = ('index', 'count')
+    
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+    
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        return cls(*parse_shard(value))
+    
+    def __contains__(self, reference: str) -> bool:
+        return self.count == 1 or shard_of(reference, self.count) == self.index
+    
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+    
+    @property
+    def suffix(self) -> str:
+        """Suffisso per i file dello shard (journal, report)"""
+        return f"shard{self.index}of{self.count}"
+
+def _child_args(argv: List[str]) -> List[str]:
+    """Argomenti del launcher senza --shards/--shard/--report (li imposta per ogni figlio)"""
+    args = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        name = arg.split('=', 1)[0]
+        if name in ('--shards', '--shard', '--report'):
+            skip = '=' not in arg
+            continue
+        args.append(arg)
+    return args
+
+def run_shards(script: Path, argv: List[str], count: int) -> Tuple[RequestMetrics, Dict, List[Dict]]:
+    """
+    Esegue in locale `count` shard come processi separati e ne unisce i risultati
+    
+    Ogni processo scrive output e report in Config.LOG_DIR; il textfile
+    Prometheus dei figli è disattivato, lo scrive solo il report unito.
+    
+    Args:
+        script: Script da lanciare (quick_upload.py)
+        argv: Argomenti originali (senza il nome dello script)
+        count: Numero di shard
+    
+    Returns:
+        (metriche unite, statistiche sommate, esito di ogni shard)
+    """
+    Config.LOG_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    env = dict(os.environ, METRICS_PROMETHEUS='false', PYTHONUNBUFFERED='1')
+    args = _child_args(argv)
+    
+    metrics = RequestMetrics()
+    children = []
+    for index in range(1, count + 1):
+        shard = Shard(index, count)
+        prefix = f"{script.stem}_{stamp}_{shard.suffix}"
+        report = Config.LOG_DIR / f"{prefix}.report.json"
+        output = Config.LOG_DIR / f"{prefix}.out"
+        with open(output, 'w', encoding='utf-8') as out:
+            process = subprocess.Popen(
+                [sys.executable, str(script), *args, '--shard', str(shard), '--report', str(report)],
+                stdout=out, stderr=subprocess.STDOUT, env=env,
+            )
+        children.append((shard, process, report, output))
+        print(f"🚀 Shard {shard} avviato (PID {process.pid}), output in {output}")
+    
+    results = []
+    for shard, process, report, output in children:
+        try:
+            code = process.wait()
+        except KeyboardInterrupt:
+            # Anche i figli ricevono Ctrl+C: si attende che chiudano journal e report
+            print("\n⚠️  Interruzione: attesa della chiusura degli shard...")
+            code = process.wait()
+        status = "✅" if code == 0 else "❌"
+        print(f"{status} Shard {shard} terminato (codice {code}, "
+              f"{time.time() - metrics.started:.1f}s dall'avvio)")
+        results.append({'shard': str(shard), 'exit_code': code,
+                        'report': str(report), 'output': str(output)})
+    
+    stats = merge_reports(metrics, results)
+    return metrics, stats, results
+
+def merge_reports(metrics: RequestMetrics, results: List[Dict]) -> Dict[str, float]:
+    """
+    Unisce in `metrics` i report JSON degli shard e somma le loro statistiche
+    
+    Gli istogrammi delle latenze si uniscono bucket per bucket, quindi i
+    percentili del report unito sono quelli dell'intero lavoro. Agli esiti
+    in `results` si aggiungono durata e velocità finale di ogni shard; uno
+    shard senza report (processo fallito prima della fine) resta con il
+    solo codice di uscita.
+    
+    Returns:
+        Statistiche numeriche sommate
+    """
+    stats: Dict[str, float] = {}
+    for result in results:
+        try:
+            report = json.loads(Path(result['report']).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            logger.warning(f"Report dello shard {result['shard']} non disponibile")
+            continue
+        metrics.merge(report['endpoints'])
+        for name, value in report['stats'].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                stats[name] = stats.get(name, 0) + value
+        result['duration_s'] = report['run']['duration_s']
+        if 'rate_limiter' in report:
+            result['final_rps'] = report['rate_limiter']['final_rps']
+    return stats
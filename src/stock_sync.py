@@ -0,0 +1,201 @@
+"""
+Sincronizzazione delle quantità di magazzino da un flusso CSV (stock_availables)
+
+Il flusso del magazzino ha le colonne reference e quantity (e, per le
+combinazioni, id_product_attribute). Ogni ciclo:
+
+1. risolve i reference in ID prodotto (indice locale o filter[reference]);
+2. legge le righe di stock_availables dei prodotti del flusso in blocco
+   (filter[id_product]=[1|2|3], display=[id,id_product,id_product_attribute,quantity]),
+   con più letture in parallelo;
+3. confronta le quantità e invia in parallelo solo le righe cambiate.
+
+Le quantità sul negozio cambiano anche con gli ordini, quindi il
+confronto si fa sempre con lo stato attuale e non con un archivio locale:
+la lettura in blocco costa una richiesta ogni Config.STOCK_BATCH_SIZE prodotti.
+"""
+
+import csv
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
+
+from config.config import Config
+from src.profiling import phase
+from src.records import StockAvailable
+
+logger = logging.getLogger(__name__)
+
+# Quantità ammesse nel flusso: interi con segno opzionale
+INTEGER_RE = re.compile(r'[+-]?[0-9]+')
+
+def read_stock_feed(csv_path: str, stats: Dict) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """
+    Legge il flusso del magazzino
+    
+    Args:
+        csv_path: File CSV (separatore ;)
+        stats: Statistiche da aggiornare (rows, rows_invalid)
+    
+    Returns:
+        (reference, id_product_attribute) -> (numero riga, quantità); con
+        più righe per la stessa chiave vince l'ultima
+    """
+    feed = {}
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+        for index, row in enumerate(csv.DictReader(file, delimiter=';'), 1):
+            stats['rows'] = index
+            reference = (row.get('reference') or '').strip()
+            attribute = (row.get('id_product_attribute') or '').strip() or '0'
+            text = (row.get('quantity') or '').strip()
+            if not reference or not text:
+                continue
+            # Solo interi: 12.5 o 1.000 (migliaia?) non si arrotondano in silenzio
+            if not INTEGER_RE.fullmatch(text):
+                print(f"[{index}] ⚠️  {reference}: quantità non valida {text!r}")
+                stats['rows_invalid'] += 1
+                continue
+            feed[(reference, attribute)] = (index, int(text))
+    return feed
+
+class StockSync:
+    """Allinea le quantità di stock_availables al flusso del magazzino"""
+    
+    def __init__(self, api, workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 method: Optional[str] = None, dry_run: bool = False):
+        """
+        Args:
+            api: Istanza di PrestaShopAPI (condivisa tra i worker)
+            workers: Letture e aggiornamenti in parallelo (default Config.STOCK_WORKERS)
+            batch_size: Prodotti per lettura di stock_availables (default Config.STOCK_BATCH_SIZE)
+            method: 'auto', 'patch' o 'put' (default Config.UPDATE_METHOD)
+            dry_run: Se True mostra le modifiche senza inviarle
+        """
+        self.api = api
+        self.workers = max(1, workers or Config.STOCK_WORKERS)
+        self.batch_size = max(1, batch_size or Config.STOCK_BATCH_SIZE)
+        self.method = method or Config.UPDATE_METHOD
+        self.dry_run = dry_run
+        self.stats = {
+            'rows': 0,
+            'rows_invalid': 0,
+            'products_not_found': 0,
+            'stock_missing': 0,
+            'stock_read_failed': 0,
+            'stock_updated': 0,
+            'stock_unchanged': 0,
+            'stock_failed': 0,
+            'units_added': 0,
+            'units_removed': 0,
+        }
+        self._stats_lock = threading.Lock()
+        self._print_lock = threading.Lock()
+    
+    def _count(self, key: str, amount: int = 1):
+        """Incrementa una statistica in modo thread-safe"""
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def _print(self, message: str):
+        """Stampa un messaggio senza mescolarlo con quelli degli altri worker"""
+        with self._print_lock:
+            print(message)
+    
+    def sync(self, csv_path: str) -> Dict:
+        """Sincronizza le quantità del flusso"""
+        print(f"\n📂 Flusso magazzino: {csv_path}")
+        with phase('csv'):
+            feed = read_stock_feed(csv_path, self.stats)
+        if not feed:
+            print("⚠️  Nessuna quantità nel flusso (colonne richieste: reference;quantity)")
+            return self.stats
+        
+        # 1. Reference -> ID prodotto
+        references = list(dict.fromkeys(reference for reference, _ in feed))
+        with phase('lookup'):
+            product_ids, failed_references = self.api.lookup_references(references)
+        failed_references = set(failed_references)
+        for (reference, attribute), (index, _) in feed.items():
+            if reference in failed_references:
+                # Ricerca fallita: la riga non è confrontata, non il prodotto "non trovato"
+                self._print(f"[{index}] ❌ {reference}: ricerca del prodotto fallita")
+                self._count('stock_read_failed')
+            elif reference not in product_ids:
+                self._print(f"[{index}] ❌ {reference}: prodotto non trovato")
+                self._count('products_not_found')
+        
+        print(f"📦 {len(feed)} righe, {len(product_ids)} prodotti "
+              f"(letture da {self.batch_size}, {self.workers} in parallelo, invio con {self.method})")
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stock') as pool:
+            # 2. Quantità attuali, in blocco e in parallelo
+            current, failed_products = self._read_stock(list(dict.fromkeys(product_ids.values())), pool)
+            
+            # 3. Solo le righe cambiate, in parallelo
+            jobs = []
+            for (reference, attribute), (index, quantity) in feed.items():
+                product_id = product_ids.get(reference)
+                if product_id is None:
+                    continue
+                if product_id in failed_products:
+                    self._count('stock_read_failed')
+                    continue
+                rows = current.get((product_id, attribute))
+                if not rows:
+                    self._print(f"[{index}] ⚠️  {reference}: nessuna riga di magazzino "
+                                f"(ID {product_id}, combinazione {attribute})")
+                    self._count('stock_missing')
+                    continue
+                for stock in rows:
+                    if stock.quantity == quantity:
+                        self._count('stock_unchanged')
+                    else:
+                        jobs.append((index, reference, stock, quantity))
+            
+            list(pool.map(lambda job: self._update(*job), jobs))
+        
+        if self.stats['stock_read_failed']:
+            logger.warning(f"{self.stats['stock_read_failed']} righe non confrontate per letture fallite "
+                           f"(verranno riprese al prossimo ciclo)")
+        return self.stats
+    
+    def _read_stock(self, product_ids: List[str], pool: ThreadPoolExecutor):
+        """
+        Righe di stock_availables dei prodotti, a blocchi letti in parallelo
+        
+        Returns:
+            Tuple ((ID prodotto, id_product_attribute) -> lista di StockAvailable,
+            insieme degli ID prodotto dei blocchi falliti)
+        """
+        chunks = [product_ids[start:start + self.batch_size]
+                  for start in range(0, len(product_ids), self.batch_size)]
+        current = {}
+        failed = set()
+        with phase('stock'):
+            for chunk, rows in zip(chunks, pool.map(self.api.get_stock_availables, chunks)):
+                if rows is None:
+                    failed.update(chunk)
+                    continue
+                for stock in rows:
+                    # Con più negozi ci sono più righe per la stessa combinazione
+                    current.setdefault((stock.id_product, stock.id_product_attribute or '0'), []).append(stock)
+        return current, failed
+    
+    def _update(self, index: int, reference: str, stock: StockAvailable, quantity: int):
+        """Invia la nuova quantità di una riga di magazzino"""
+        old = stock.quantity if stock.quantity is not None else 0
+        delta = quantity - old
+        summary = f"{reference} (stock {stock.id}): {old} → {quantity} ({delta:+d})"
+        if not self.dry_run:
+            with phase('update'):
+                ok = self.api.update_record(StockAvailable, stock.id, {'quantity': quantity}, self.method)
+            if not ok:
+                self._print(f"[{index}] ❌ {summary}: aggiornamento fallito")
+                self._count('stock_failed')
+                return
+        
+        self._print(f"[{index}] {'🔎' if self.dry_run else '✅'} {summary}")
+        self._count('stock_updated')
+        self._count('units_added' if delta > 0 else 'units_removed', abs(delta))
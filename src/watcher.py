@@ -0,0 +1,322 @@
+"""
+Modalità --watch: sincronizza le cartelle di data/assets appena cambiano
+
+Due modi per accorgersi delle modifiche:
+- inotify (Linux): il kernel segnala file creati, scritti, spostati o
+  eliminati nelle cartelle prodotto, senza scansioni;
+- polling: ogni WATCH_POLL_INTERVAL secondi l'AssetIndex controlla la data
+  di modifica delle cartelle (una stat per cartella, l'elenco dei file solo
+  per quelle cambiate). Serve sulle condivisioni di rete, dove inotify non
+  vede le modifiche fatte da altri computer.
+
+Le modifiche di una cartella si raccolgono finché non passano
+WATCH_DEBOUNCE secondi senza novità (copia delle foto terminata), poi solo
+quei prodotti passano dall'upload. Una riconciliazione periodica (con
+schedule) rilegge tutte le cartelle per recuperare eventi persi e file
+sovrascritti sul posto.
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import struct
+import threading
+import ctypes
+import ctypes.util
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+import schedule
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Costanti di <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')
+
+# Cartella assets: nuove cartelle prodotto (o rinominate/eliminate)
+_ROOT_MASK = IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_ONLYDIR
+# Cartella prodotto: file scritti, aggiunti, rinominati o eliminati
+_FOLDER_MASK = IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_ONLYDIR
+
+class InotifyWatcher:
+    """Eventi del kernel sulla cartella assets e su ogni cartella prodotto"""
+    
+    name = 'inotify'
+    
+    def __init__(self, root: str):
+        """
+        Raises:
+            OSError: inotify non disponibile o limite di fs.inotify.max_user_watches raggiunto
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify disponibile solo su Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.root = root
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fallita")
+        # watch descriptor -> reference (None = cartella assets)
+        self._watches: Dict[int, Optional[str]] = {}
+        try:
+            self._add_watch(root, None)
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self._add_watch(entry.path, entry.name)
+        except OSError:
+            self.close()
+            raise
+    
+    def _add_watch(self, path: str, reference: Optional[str]):
+        mask = _ROOT_MASK if reference is None else _FOLDER_MASK
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOSPC:
+                raise OSError(code, "limite fs.inotify.max_user_watches raggiunto")
+            raise OSError(code, f"inotify_add_watch fallita per {path}")
+        self._watches[wd] = reference
+    
+    def poll(self, timeout: float) -> Tuple[Set[str], bool]:
+        """
+        Attende eventi per al massimo `timeout` secondi
+        
+        Returns:
+            Tupla (reference toccati, da verificare = True: gli eventi non dicono
+            se le immagini sono davvero cambiate)
+        """
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed, True
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed, True
+        
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+            offset += _EVENT.size + length
+            
+            if mask & IN_Q_OVERFLOW:
+                # Eventi persi: ci pensa la riconciliazione
+                raise OverflowError("coda inotify piena")
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            
+            if wd not in self._watches:
+                continue
+            reference = self._watches[wd]
+            if reference is None:
+                if not (mask & IN_ISDIR):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_watch(os.path.join(self.root, name), name)
+                    except OSError as e:
+                        logger.warning(f"⚠️  Cartella {name} non osservata: {e}")
+                changed.add(name)
+            else:
+                changed.add(reference)
+        return changed, True
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """Confronto periodico delle date di modifica delle cartelle (tramite AssetIndex)"""
+    
+    name = 'polling'
+    
+    def __init__(self, asset_index, interval: float):
+        self.asset_index = asset_index
+        self.interval = interval
+        self._next_scan = time.monotonic() + interval
+    
+    def poll(self, timeout: float) -> Tuple[Set[str], bool]:
+        """
+        Attende al massimo `timeout` secondi, riscansionando se è il momento
+        
+        Returns:
+            Tupla (reference con immagini cambiate, da verificare = False)
+        """
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set(), False
+        time.sleep(max(0.0, wait))
+        self._next_scan = time.monotonic() + self.interval
+        self.asset_index.refresh()
+        return set(self.asset_index.pop_changed()), False
+    
+    def close(self):
+        pass
+
+def create_watcher(asset_index, backend: Optional[str] = None):
+    """
+    Sceglie il modo di osservare la cartella assets
+    
+    Args:
+        backend: 'inotify', 'poll' o 'auto' (default Config.WATCH_BACKEND);
+                 con 'auto' si usa inotify se disponibile, altrimenti il polling
+    """
+    backend = (backend or Config.WATCH_BACKEND).lower()
+    if backend in ('auto', 'inotify'):
+        try:
+            return InotifyWatcher(asset_index.root)
+        except OSError as e:
+            if backend == 'inotify':
+                raise
+            logger.warning(f"⚠️  inotify non utilizzabile ({e}): controllo periodico delle cartelle")
+    return PollingWatcher(asset_index, Config.WATCH_POLL_INTERVAL)
+
+class WatchDaemon:
+    """Ciclo della modalità --watch: eventi, attesa di stabilità, upload dei prodotti cambiati"""
+    
+    def __init__(self, uploader, asset_index, watcher=None,
+                 debounce: Optional[float] = None, reconcile_minutes: Optional[float] = None):
+        """
+        Args:
+            uploader: ImageUploader usato per gli upload (stesso percorso di --all)
+            asset_index: AssetIndex della cartella assets
+            watcher: InotifyWatcher o PollingWatcher (default create_watcher)
+            debounce: Secondi senza modifiche prima di sincronizzare una cartella (default Config.WATCH_DEBOUNCE)
+            reconcile_minutes: Intervallo della riconciliazione completa (default Config.WATCH_RECONCILE_MINUTES, 0 = mai)
+        """
+        self.uploader = uploader
+        self.asset_index = asset_index
+        self.watcher = watcher or create_watcher(asset_index)
+        self.debounce = Config.WATCH_DEBOUNCE if debounce is None else debounce
+        reconcile_minutes = Config.WATCH_RECONCILE_MINUTES if reconcile_minutes is None else reconcile_minutes
+        
+        # reference -> [ultima modifica vista, cambiamento già verificato]
+        self._pending: Dict[str, List] = {}
+        self._running = False
+        self.stats = {'events': 0, 'batches': 0, 'products_synced': 0, 'reconciliations': 0}
+        
+        self.scheduler = schedule.Scheduler()
+        if reconcile_minutes > 0:
+            self.scheduler.every(reconcile_minutes).minutes.do(self.reconcile)
+    
+    def _mark(self, references, verified: bool):
+        now = time.monotonic()
+        for reference in references:
+            entry = self._pending.setdefault(reference, [now, verified])
+            entry[0] = now
+            entry[1] = entry[1] or verified
+        self.stats['events'] += len(references)
+    
+    def catch_up(self):
+        """Cartelle cambiate mentre il demone era fermo (confronto con l'indice salvato)"""
+        first_scan = len(self.asset_index) == 0
+        self.asset_index.refresh()
+        changed = self.asset_index.pop_changed()
+        if first_scan:
+            # Indice vuoto: non c'è uno stato precedente con cui confrontare
+            self._print(f"📇 Indice assets creato ({len(changed)} cartelle): per il primo allineamento usa --all")
+        elif changed:
+            self._print(f"🔁 {len(changed)} cartelle cambiate dall'ultima esecuzione")
+            self._mark(changed, True)
+    
+    def reconcile(self):
+        """Riconciliazione: rilegge tutte le cartelle e accoda quelle cambiate"""
+        started = time.monotonic()
+        self.asset_index.refresh(full=True)
+        changed = self.asset_index.pop_changed()
+        self.stats['reconciliations'] += 1
+        logger.info(f"Riconciliazione: {len(changed)} cartelle cambiate in {time.monotonic() - started:.1f}s")
+        if changed:
+            self._print(f"🔁 Riconciliazione: {len(changed)} cartelle cambiate")
+            self._mark(changed, True)
+    
+    def _ready(self) -> List[str]:
+        """Reference fermi da almeno `debounce` secondi, da sincronizzare ora"""
+        now = time.monotonic()
+        ready = []
+        for reference, (last_seen, verified) in list(self._pending.items()):
+            if now - last_seen < self.debounce:
+                continue
+            del self._pending[reference]
+            # Gli eventi inotify non dicono se le immagini sono cambiate: si rilegge la cartella
+            if verified or self.asset_index.rescan(reference):
+                ready.append(reference)
+        return ready
+    
+    def sync(self, references: List[str]):
+        """Carica le immagini dei prodotti indicati con il percorso normale di upload"""
+        # Con --shard ogni daemon carica solo i propri reference
+        references = [ref for ref in references if self.uploader.owns(ref) and self.asset_index.entries(ref)]
+        if not references:
+            return
+        self.stats['batches'] += 1
+        self._print(f"\n📸 {len(references)} prodotti cambiati: {', '.join(references[:10])}"
+                    f"{'...' if len(references) > 10 else ''}")
+        # Un prodotto non trovato prima potrebbe essere stato creato nel frattempo
+        for reference in references:
+            if self.uploader.product_ids.get(reference) is None:
+                self.uploader.product_ids.pop(reference, None)
+        self.uploader.resolve_references(references, quiet=True)
+        self.uploader.process_references(list(enumerate(references, 1)), Config.UPLOAD_DELAY)
+        self.asset_index.save()
+        self.stats['products_synced'] += len(references)
+    
+    def _print(self, message: str):
+        print(message, flush=True)
+    
+    def stop(self, *_):
+        """Ferma il ciclo dopo il lotto in corso (anche da SIGTERM)"""
+        self._running = False
+    
+    def run(self):
+        """Ciclo principale, fino a Ctrl+C o SIGTERM"""
+        self._running = True
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+        
+        self.catch_up()
+        self._print(f"👀 In ascolto su {self.asset_index.assets_dir} ({self.watcher.name}, "
+                    f"attesa {self.debounce:g}s dopo l'ultima modifica)")
+        try:
+            while self._running:
+                self.scheduler.run_pending()
+                timeout = min(1.0, self.debounce) if self._pending else 1.0
+                try:
+                    changed, needs_check = self.watcher.poll(timeout)
+                except OverflowError as e:
+                    logger.warning(f"⚠️  {e}: riconciliazione completa")
+                    self.reconcile()
+                    continue
+                if changed:
+                    self._mark(changed, not needs_check)
+                ready = self._ready()
+                if ready:
+                    self.sync(ready)
+        except KeyboardInterrupt:
+            self._print("\n⚠️  Modalità watch interrotta")
+        finally:
+            self.watcher.close()
+        return self.stats
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Sincronizzazione magazzino da flusso CSV - invia solo le quantità cambiate
+Uso: python sync_stock.py magazzino.csv [opzioni]
+
+Il CSV (separatore ;) ha le colonne reference e quantity (numero intero), più
+id_product_attribute per le combinazioni:
+    reference;quantity
+    PROD001;12
+Le eventuali colonne di prodotto (es. price) si aggiornano nello stesso
+ciclo come con update_products.py.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from config.config import Config
+from src.api_client import PrestaShopAPI
+from src.rate_limiter import RateLimiter
+from src.retry import RetryPolicy
+from src.metrics import RequestMetrics, report_path, print_summary
+from src.product_state import ProductState
+from src.response_cache import ResponseCache
+from src.product_updates import ProductUpdater, read_csv_header
+from src.records import Product
+from src.stock_sync import StockSync
+from src.profiling import start_profiler, stop_profiler
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+
+def parse_args():
+    """Legge gli argomenti da riga di comando"""
+    parser = argparse.ArgumentParser(
+        description="Allinea le quantità di magazzino (e i prezzi) al flusso CSV",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Esempi:\n"
+            "  python sync_stock.py magazzino.csv              # Invia le quantità cambiate\n"
+            "  python sync_stock.py magazzino.csv --dry-run    # Mostra le differenze senza inviarle\n"
+            "  python sync_stock.py magazzino.csv --workers 16 # 16 richieste in parallelo\n"
+            "  python sync_stock.py magazzino.csv --method put # Forza il PUT della risorsa completa"
+        )
+    )
+    parser.add_argument('csv', help="File CSV (percorso o nome in data/input)")
+    parser.add_argument('--workers', type=int, default=Config.STOCK_WORKERS,
+                        help=f"Letture e aggiornamenti in parallelo (default {Config.STOCK_WORKERS})")
+    parser.add_argument('--batch-size', type=int, default=Config.STOCK_BATCH_SIZE,
+                        help=f"Prodotti per lettura di stock_availables (default {Config.STOCK_BATCH_SIZE})")
+    parser.add_argument('--method', choices=['auto', 'patch', 'put'], default=Config.UPDATE_METHOD,
+                        help="auto = PATCH e, se non supportato, PUT; patch o put forzati "
+                             f"(default {Config.UPDATE_METHOD})")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Calcola e mostra le differenze senza inviarle")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profilo CPU e tempi per fase in Config.LOG_DIR")
+    return parser.parse_args()
+
+def resolve_csv(target):
+    """Trova il CSV indicato (percorso diretto o in data/input)"""
+    csv_path = Path(target)
+    if not csv_path.exists():
+        csv_path = Config.INPUT_DIR / target
+    
+    if not csv_path.exists():
+        print(f"❌ File non trovato: {target}")
+        sys.exit(1)
+    return csv_path
+
+def main():
+    args = parse_args()
+    profiler = start_profiler('sync_stock', args.profile)
+    try:
+        run(args)
+    finally:
+        stop_profiler(profiler)
+
+def run(args):
+    """Sincronizza il flusso del magazzino"""
+    if not Config.validate():
+        print("❌ Configurazione non valida!")
+        sys.exit(1)
+    
+    csv_path = resolve_csv(args.csv)
+    product_fields = [name for name in read_csv_header(str(csv_path)) if name in Product.WRITABLE]
+    rate_limiter = RateLimiter() if Config.RATE_LIMIT_ENABLED else None
+    if rate_limiter is not None:
+        rate_limiter.check_workers(args.workers)
+    retry_policy = RetryPolicy()
+    metrics = RequestMetrics()
+    cache = ResponseCache() if Config.CACHE_ENABLED else None
+    started = time.perf_counter()
+    
+    with PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY,
+                       rate_limiter=rate_limiter, retry_policy=retry_policy,
+                       metrics=metrics, cache=cache) as api:
+        if not api.test_connection():
+            print("❌ Connessione fallita!")
+            sys.exit(1)
+        
+        syncer = StockSync(api, workers=args.workers, batch_size=args.batch_size,
+                           method=args.method, dry_run=args.dry_run)
+        stats = syncer.sync(str(csv_path))
+        
+        if product_fields:
+            with ProductState() as state:
+                updater = ProductUpdater(api, state=state, workers=args.workers,
+                                         method=args.method, dry_run=args.dry_run)
+                product_stats = updater.process_csv(str(csv_path), product_fields)
+            # products_not_found è già contato dal magazzino (stessi reference)
+            stats.update({key: value for key, value in product_stats.items()
+                          if key in ('products_updated', 'products_unchanged', 'products_failed', 'fields_updated')})
+    
+    stats['duration_s'] = round(time.perf_counter() - started, 1)
+    print_report(stats, args.dry_run)
+    if Config.METRICS_REPORT:
+        report = metrics.write_report(
+            report_path('sync_stock'), stats, rate_limiter, retry_policy,
+            script='sync_stock', mode='dry-run' if args.dry_run else 'sync',
+            target=str(csv_path), method=args.method, workers=args.workers,
+            batch_size=args.batch_size,
+        )
+        print_summary(report)
+
+def print_report(stats, dry_run: bool = False):
+    """Stampa il riepilogo finale"""
+    print(f"\n{'='*50}")
+    print(f"📄 Righe lette: {stats['rows']} in {stats['duration_s']}s")
+    print(f"{'🔎 Da aggiornare' if dry_run else '✅ Aggiornate'}: {stats['stock_updated']} righe di magazzino "
+          f"(+{stats['units_added']} / -{stats['units_removed']} pezzi)")
+    print(f"♻️  Invariate: {stats['stock_unchanged']}")
+    print(f"❌ Prodotti non trovati: {stats['products_not_found']}, senza magazzino: {stats['stock_missing']}, "
+          f"falliti: {stats['stock_failed']}, letture fallite: {stats['stock_read_failed']}, "
+          f"righe non valide: {stats['rows_invalid']}")
+    if 'fields_updated' in stats:
+        print(f"🧾 Prodotti {'da aggiornare' if dry_run else 'aggiornati'}: {stats['products_updated']} "
+              f"({stats['fields_updated']} campi)")
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  Sincronizzazione interrotta dall'utente (rilancia: si confronta di nuovo col negozio)")
+        sys.exit(130)
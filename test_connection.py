@@ -10,6 +10,7 @@ sys.path.append(str(Path(__file__).parent))
 
 from config.config import Config
 from src.api_client import PrestaShopAPI
+from src.records import Product, Category
 import logging
 
 # Configura il logging
@@ -32,33 +33,33 @@ def main():
     
     # Step 2: Test connessione API
     print("\n2️⃣ Test connessione API...")
-    api = PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY)
-    
+    with PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY) as api:
+        return run_checks(api)
+
+def run_checks(api):
+    """Esegue i test sulle API usando la sessione aperta"""
     if not api.test_connection():
         print("❌ Connessione API fallita")
         return False
     
     # Step 3: Test lettura prodotti
     print("\n3️⃣ Test lettura prodotti...")
-    products = api.get('products', {'limit': 5})
+    product_list = api.find_records(Product, ['reference', 'name'], limit=5)
     
-    if products is not None:
-        product_list = products.findall('.//product')
+    if product_list is not None:
         print(f"✅ Trovati {len(product_list)} prodotti")
         
         # Mostra i primi prodotti
         for product in product_list[:3]:
-            product_id = product.get('id')
-            print(f"   - Prodotto ID: {product_id}")
+            print(f"   - Prodotto ID: {product.id} ({product.reference or 'senza reference'})")
     else:
         print("⚠️  Impossibile leggere i prodotti")
     
     # Step 4: Test lettura categorie
     print("\n4️⃣ Test lettura categorie...")
-    categories = api.get('categories', {'limit': 5})
+    category_list = api.find_records(Category, ['name'], limit=5)
     
-    if categories is not None:
-        category_list = categories.findall('.//category')
+    if category_list is not None:
         print(f"✅ Trovate {len(category_list)} categorie")
     else:
         print("⚠️  Impossibile leggere le categorie")
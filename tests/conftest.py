@@ -0,0 +1,61 @@
+"""
+Configurazione comune dei test (python -m pytest)
+
+I file di lavoro (assets, journal, manifest, indici, log) finiscono in
+una cartella temporanea; il negozio è il FakeWebservice dei benchmark.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_webservice import FakeWebservice
+from config.config import Config
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Cartelle e database di Config in una cartella temporanea"""
+    data = tmp_path / 'data'
+    paths = {
+        'INPUT_DIR': data / 'input',
+        'PROCESSED_DIR': data / 'processed',
+        'FAILED_DIR': data / 'failed',
+        'ASSETS_DIR': data / 'assets',
+        'IMAGE_CACHE_DIR': data / 'image_cache',
+        'LOG_DIR': tmp_path / 'logs',
+        'MANIFEST_FILE': data / 'image_manifest.db',
+        'PRODUCT_STATE_FILE': data / 'product_state.db',
+        'INDEX_FILE': data / 'reference_index.db',
+        'CACHE_FILE': data / 'response_cache.db',
+        'ASSET_INDEX_FILE': data / 'asset_index.db',
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(Config, name, path)
+    paths['ASSETS_DIR'].mkdir(parents=True)
+    
+    # Niente pause fisse né report: i test misurano il comportamento, non i tempi
+    monkeypatch.setattr(Config, 'UPLOAD_DELAY', 0)
+    monkeypatch.setattr(Config, 'IMAGE_DELAY', 0)
+    monkeypatch.setattr(Config, 'RATE_LIMIT_ENABLED', False)
+    monkeypatch.setattr(Config, 'METRICS_REPORT', False)
+    return tmp_path
+
+@pytest.fixture
+def webservice(workdir, monkeypatch):
+    """Negozio finto con 20 prodotti (BENCH-000001...) e 2 immagini ciascuno"""
+    with FakeWebservice(products=20, images_per_product=2) as service:
+        monkeypatch.setattr(Config, 'PRESTASHOP_API_URL', service.url)
+        monkeypatch.setattr(Config, 'PRESTASHOP_API_KEY', service.api_key)
+        yield service
+
+def make_assets(references, images: int = 2):
+    """Cartelle prodotto in Config.ASSETS_DIR con `images` JPEG (contenuto casuale) ciascuna"""
+    for reference in references:
+        folder = Config.ASSETS_DIR / reference
+        folder.mkdir(parents=True, exist_ok=True)
+        for position in range(1, images + 1):
+            (folder / f"{position:02d}.jpg").write_bytes(b'\xff\xd8\xff\xe0' + os.urandom(2048))
@@ -0,0 +1,53 @@
+"""Test del confronto tra immagini locali e manifest (plan_image_diff)"""
+
+from src.image_manifest import plan_image_diff
+
+def local(*hashes):
+    return [{'name': f"{n:02d}.jpg", 'sha256': h} for n, h in enumerate(hashes, 1)]
+
+def remote(*hashes):
+    return [{'name': f"{n:02d}.jpg", 'sha256': h, 'image_id': str(100 + n)} for n, h in enumerate(hashes, 1)]
+
+def test_unchanged():
+    keep, delete_ids, start = plan_image_diff(local('a', 'b', 'c'), remote('a', 'b', 'c'))
+    assert [entry['image_id'] for entry in keep] == ['101', '102', '103']
+    assert delete_ids == []
+    assert start == 3
+
+def test_append_uploads_only_new_images():
+    keep, delete_ids, start = plan_image_diff(local('a', 'b', 'c'), remote('a', 'b'))
+    assert delete_ids == []
+    assert start == 2
+
+def test_removed_image_is_deleted():
+    keep, delete_ids, start = plan_image_diff(local('a', 'c'), remote('a', 'b', 'c'))
+    assert [entry['image_id'] for entry in keep] == ['101', '103']
+    assert delete_ids == ['102']
+    assert start == 2
+
+def test_changed_image_reuploads_from_there():
+    # Le nuove immagini finiscono in coda: dopo quella cambiata si ricarica tutto
+    keep, delete_ids, start = plan_image_diff(local('a', 'x', 'c'), remote('a', 'b', 'c'))
+    assert [entry['image_id'] for entry in keep] == ['101']
+    assert delete_ids == ['102', '103']
+    assert start == 1
+
+def test_reorder_reuploads_from_first_moved_image():
+    keep, delete_ids, start = plan_image_diff(local('a', 'c', 'b'), remote('a', 'b', 'c'))
+    assert [entry['image_id'] for entry in keep] == ['101', '103']
+    assert delete_ids == ['102']
+    assert start == 2
+
+def test_changed_cover_replaces_everything():
+    keep, delete_ids, start = plan_image_diff(local('x', 'b'), remote('a', 'b'))
+    assert keep == []
+    assert delete_ids == ['101', '102']
+    assert start == 0
+
+def test_empty_remote():
+    assert plan_image_diff(local('a'), []) == ([], [], 0)
+
+def test_no_local_images_deletes_all():
+    keep, delete_ids, start = plan_image_diff([], remote('a', 'b'))
+    assert delete_ids == ['101', '102']
+    assert start == 0
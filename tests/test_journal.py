@@ -0,0 +1,57 @@
+"""Test del journal delle esecuzioni (ripresa e rotazione)"""
+
+import json
+import os
+import time
+
+from config.config import Config
+from src.journal import RunJournal
+
+def write_lines(path, lines):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join(lines), encoding='utf-8')
+
+def record_line(reference, status):
+    return json.dumps({'reference': reference, 'status': status, 'ts': 0}) + '\n'
+
+def test_resume_ignores_truncated_last_line(workdir):
+    path = Config.PROCESSED_DIR / 'job.journal.jsonl'
+    # Scrittura interrotta a metà: l'ultima riga è troncata e senza a capo
+    write_lines(path, [record_line('A', 'done'), record_line('B', 'failed'), '{"reference": "C", "sta'])
+    
+    with RunJournal('job', resume=True) as journal:
+        assert journal.outcomes == {'A': 'done', 'B': 'failed'}
+        assert journal.completed() == {'A'}
+        journal.record('C', 'done')
+    
+    with RunJournal('job', resume=True) as journal:
+        assert journal.completed() == {'A', 'C'}
+
+def test_resume_skips_corrupted_lines_in_the_middle(workdir):
+    path = Config.PROCESSED_DIR / 'job.journal.jsonl'
+    write_lines(path, [record_line('A', 'done'), '{"refer\n', '\n', record_line('B', 'unchanged')])
+    
+    with RunJournal('job', resume=True) as journal:
+        assert journal.completed() == {'A', 'B'}
+
+def test_later_outcome_wins(workdir):
+    path = Config.PROCESSED_DIR / 'job.journal.jsonl'
+    write_lines(path, [record_line('A', 'failed'), record_line('A', 'done')])
+    
+    with RunJournal('job', resume=True) as journal:
+        assert journal.outcomes == {'A': 'done'}
+
+def test_new_run_keeps_previous_journal(workdir):
+    with RunJournal('job') as journal:
+        journal.record('A', 'done')
+    path = Config.PROCESSED_DIR / 'job.journal.jsonl'
+    os.utime(path, (time.time() - 60, time.time() - 60))
+    
+    with RunJournal('job') as journal:
+        assert journal.outcomes == {}
+        journal.record('B', 'done')
+    
+    rotated = [p for p in Config.PROCESSED_DIR.glob('job.journal.*.jsonl') if p != path]
+    assert len(rotated) == 1
+    assert 'A' in rotated[0].read_text(encoding='utf-8')
+    assert 'A' not in path.read_text(encoding='utf-8')
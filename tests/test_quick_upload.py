@@ -0,0 +1,52 @@
+"""Test end-to-end di quick_upload.py contro il FakeWebservice"""
+
+import json
+import sys
+
+from benchmarks.fake_webservice import FakeWebservice
+from config.config import Config
+import quick_upload
+
+from conftest import make_assets
+
+def run_quick_upload(monkeypatch, *argv):
+    """Esegue quick_upload con gli argomenti indicati (come da riga di comando)"""
+    monkeypatch.setattr(sys, 'argv', ['quick_upload.py', *argv])
+    quick_upload.main()
+
+def journal_outcomes(job_name: str):
+    """Esiti registrati nel journal di un lavoro: reference -> status"""
+    path = Config.PROCESSED_DIR / f"{job_name}.journal.jsonl"
+    outcomes = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            outcomes[record['reference']] = record['status']
+    return outcomes
+
+def test_diff_mode_second_run_is_unchanged(webservice, monkeypatch):
+    references = [FakeWebservice.reference(product_id) for product_id in range(1, 5)]
+    make_assets(references, images=3)
+    
+    run_quick_upload(monkeypatch, '--all', '--sync-mode', 'diff', '--workers', '2')
+    assert set(journal_outcomes('assets').values()) == {'done'}
+    image_ids = {product_id: list(webservice.images[product_id]) for product_id in ('1', '2', '3', '4')}
+    assert all(len(ids) == 3 for ids in image_ids.values())
+    
+    # Stessi file: nessuna richiesta di scrittura, nessun ID immagine cambiato
+    run_quick_upload(monkeypatch, '--all', '--sync-mode', 'diff', '--workers', '2')
+    assert journal_outcomes('assets') == {reference: 'unchanged' for reference in references}
+    assert {product_id: webservice.images[product_id] for product_id in image_ids} == image_ids
+
+def test_shards_do_not_overlap(webservice, monkeypatch):
+    references = [FakeWebservice.reference(product_id) for product_id in range(1, 21)]
+    make_assets(references, images=1)
+    
+    for index in (1, 2, 3):
+        run_quick_upload(monkeypatch, '--all', '--shard', f"{index}/3")
+    slices = [set(journal_outcomes(f"assets_shard{index}of3")) for index in (1, 2, 3)]
+    
+    assert sum(len(slice_) for slice_ in slices) == len(references)
+    assert set().union(*slices) == set(references)
+    # Ogni prodotto caricato una volta sola: la sua immagine sostituisce le 2 iniziali
+    assert all(len(webservice.images[str(product_id)]) == 1 for product_id in range(1, 21))
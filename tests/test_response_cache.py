@@ -0,0 +1,61 @@
+"""Test della cache delle risposte GET (invalidazione e generazioni)"""
+
+import pytest
+
+from src.response_cache import ResponseCache, _affected_paths, parse_ttls
+
+def test_affected_paths_resource_and_lists():
+    assert _affected_paths('products/5') == {'products', 'products/5'}
+    assert _affected_paths('/products/') == {'products'}
+
+def test_affected_paths_ignores_query_string():
+    assert _affected_paths('stock_availables/7?schema=blank') == {'stock_availables', 'stock_availables/7'}
+
+def test_affected_paths_product_images_invalidate_product():
+    # Le immagini compaiono anche nelle associations del prodotto
+    assert _affected_paths('images/products/5') == {
+        'images', 'images/products', 'images/products/5', 'products', 'products/5',
+    }
+    assert {'images/products/5/12', 'products/5'} <= _affected_paths('images/products/5/12')
+
+def test_affected_paths_other_images_do_not_touch_products():
+    assert _affected_paths('images/categories/3') == {'images', 'images/categories', 'images/categories/3'}
+
+@pytest.fixture
+def cache():
+    with ResponseCache(max_mb=1, default_ttl=60, ttls={}, disk=False) as cache:
+        yield cache
+
+def test_write_invalidates_resource_and_lists(cache):
+    cache.store('products/5', None, b'<p5/>', {})
+    cache.store('products', {'filter[reference]': '[A|B]'}, b'<list/>', {})
+    cache.store('categories/2', None, b'<c2/>', {})
+    
+    assert cache.invalidate('products/5') == 2
+    assert cache.lookup('products/5')[0] is None
+    assert cache.lookup('products', {'filter[reference]': '[A|B]'})[0] is None
+    assert cache.lookup('categories/2')[1]
+
+def test_image_upload_invalidates_product(cache):
+    cache.store('products/5', None, b'<p5/>', {})
+    cache.invalidate('images/products/5')
+    assert cache.lookup('products/5')[0] is None
+
+def test_read_started_before_a_write_is_not_stored(cache):
+    generation = cache.generation('images/products/5')
+    cache.invalidate('images/products/5')
+    cache.store('images/products/5', None, b'<old/>', {}, generation=generation)
+    assert cache.lookup('images/products/5')[0] is None
+    
+    cache.store('images/products/5', None, b'<new/>', {}, generation=cache.generation('images/products/5'))
+    assert cache.lookup('images/products/5')[0].body == b'<new/>'
+
+def test_ttl_longest_prefix_wins():
+    cache = ResponseCache(default_ttl=30, ttls=parse_ttls('images=0, images/products=5'), disk=False)
+    assert cache.ttl('images/products/5') == 5
+    assert cache.ttl('images/categories/2') == 0
+    assert cache.ttl('products') == 30
+
+def test_parse_ttls_rejects_missing_seconds():
+    with pytest.raises(ValueError):
+        parse_ttls('categories')
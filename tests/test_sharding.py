@@ -0,0 +1,44 @@
+"""Test della suddivisione dei reference tra shard (--shard K/N, --shards N)"""
+
+import pytest
+
+from src.sharding import Shard, _child_args, parse_shard, shard_of
+
+REFERENCES = [f"REF-{n:05d}" for n in range(2000)]
+
+def test_shard_of_is_stable_and_in_range():
+    # Hash fisso (BLAKE2b): lo stesso valore su ogni macchina e versione di Python
+    assert [shard_of(f"BENCH-00000{n}", 4) for n in range(1, 9)] == [2, 3, 3, 4, 4, 2, 3, 4]
+    assert {shard_of(reference, 4) for reference in REFERENCES} == {1, 2, 3, 4}
+
+def test_shard_of_ignores_case_and_spaces():
+    assert shard_of('abc-1', 8) == shard_of(' ABC-1 ', 8)
+
+def test_shards_partition_references():
+    shards = [Shard(index, 3) for index in range(1, 4)]
+    owners = [[shard for shard in shards if reference in shard] for reference in REFERENCES]
+    assert all(len(owner) == 1 for owner in owners)
+    # Divisione equilibrata (entro il 10% della quota)
+    for shard in shards:
+        count = sum(1 for owner in owners if owner[0] is shard)
+        assert abs(count - len(REFERENCES) / 3) < len(REFERENCES) / 30
+
+def test_single_shard_owns_everything():
+    assert all(reference in Shard(1, 1) for reference in REFERENCES)
+
+@pytest.mark.parametrize('value', ['0/4', '5/4', '1/0', '2', 'a/b', '1/2/3'])
+def test_parse_shard_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+def test_child_args_drops_launcher_options():
+    argv = ['file.csv', '--shards', '4', '--workers', '8', '--report', 'out.json', '--sync-mode', 'diff']
+    assert _child_args(argv) == ['file.csv', '--workers', '8', '--sync-mode', 'diff']
+
+def test_child_args_with_equals_form():
+    argv = ['--all', '--shards=4', '--report=out.json', '--shard=1/2', '--resume']
+    assert _child_args(argv) == ['--all', '--resume']
+
+def test_child_args_keeps_similar_options():
+    argv = ['--all', '--shards', '2', '--rescan-assets', '--image-workers', '4']
+    assert _child_args(argv) == ['--all', '--rescan-assets', '--image-workers', '4']
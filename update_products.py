@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Aggiornamento prodotti da CSV (prezzi, nomi, stato...) - invia solo i campi cambiati
+Uso: python update_products.py listino.csv [opzioni]
+
+Il CSV (separatore ;) ha la colonna reference e una colonna per campo:
+    reference;price;active
+    PROD001;19,90;1
+"""
+
+import sys
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from config.config import Config
+from src.api_client import PrestaShopAPI
+from src.rate_limiter import RateLimiter
+from src.retry import RetryPolicy
+from src.metrics import RequestMetrics, report_path, print_summary
+from src.product_state import ProductState
+from src.response_cache import ResponseCache
+from src.product_updates import ProductUpdater
+from src.profiling import start_profiler, stop_profiler
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+
+def parse_args():
+    """Legge gli argomenti da riga di comando"""
+    parser = argparse.ArgumentParser(
+        description="Aggiorna i campi dei prodotti da CSV inviando solo le differenze",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Esempi:\n"
+            "  python update_products.py listino.csv              # Aggiorna i campi cambiati\n"
+            "  python update_products.py listino.csv --dry-run    # Mostra le modifiche senza inviarle\n"
+            "  python update_products.py listino.csv --workers 8  # 8 aggiornamenti in parallelo\n"
+            "  python update_products.py listino.csv --refresh    # Confronta tutto con il negozio\n"
+            "  python update_products.py listino.csv --method put # Forza il PUT della risorsa completa"
+        )
+    )
+    parser.add_argument('csv', help="File CSV (percorso o nome in data/input)")
+    parser.add_argument('--workers', type=int, default=Config.UPLOAD_WORKERS,
+                        help=f"Aggiornamenti inviati in parallelo (default {Config.UPLOAD_WORKERS})")
+    parser.add_argument('--method', choices=['auto', 'patch', 'put'], default=Config.UPDATE_METHOD,
+                        help="auto = PATCH e, se non supportato, PUT; patch o put forzati "
+                             f"(default {Config.UPDATE_METHOD})")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ignora lo stato salvato e confronta ogni riga con il negozio")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Calcola e mostra le modifiche senza inviarle")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profilo CPU e tempi per fase in Config.LOG_DIR")
+    return parser.parse_args()
+
+def resolve_csv(target):
+    """Trova il CSV indicato (percorso diretto o in data/input)"""
+    csv_path = Path(target)
+    if not csv_path.exists():
+        csv_path = Config.INPUT_DIR / target
+    
+    if not csv_path.exists():
+        print(f"❌ File non trovato: {target}")
+        sys.exit(1)
+    return csv_path
+
+def main():
+    args = parse_args()
+    profiler = start_profiler('update_products', args.profile)
+    try:
+        run(args)
+    finally:
+        stop_profiler(profiler)
+
+def run(args):
+    """Aggiorna i prodotti del CSV"""
+    if not Config.validate():
+        print("❌ Configurazione non valida!")
+        sys.exit(1)
+    
+    csv_path = resolve_csv(args.csv)
+    rate_limiter = RateLimiter() if Config.RATE_LIMIT_ENABLED else None
+    if rate_limiter is not None:
+        rate_limiter.check_workers(args.workers)
+    retry_policy = RetryPolicy()
+    metrics = RequestMetrics()
+    
+    state = ProductState()
+    cache = ResponseCache() if Config.CACHE_ENABLED else None
+    
+    try:
+        with PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY,
+                           rate_limiter=rate_limiter, retry_policy=retry_policy,
+                           metrics=metrics, cache=cache) as api:
+            if not api.test_connection():
+                print("❌ Connessione fallita!")
+                sys.exit(1)
+            
+            updater = ProductUpdater(api, state=state, workers=args.workers,
+                                     method=args.method, dry_run=args.dry_run, refresh=args.refresh)
+            stats = updater.process_csv(str(csv_path))
+    finally:
+        state.close()
+    
+    print_report(stats, args.dry_run)
+    if Config.METRICS_REPORT:
+        report = metrics.write_report(
+            report_path('update_products'), stats, rate_limiter, retry_policy,
+            script='update_products', mode='dry-run' if args.dry_run else 'update',
+            target=str(csv_path), method=args.method, workers=args.workers,
+        )
+        print_summary(report)
+
+def print_report(stats, dry_run: bool = False):
+    """Stampa il riepilogo finale"""
+    print(f"\n{'='*50}")
+    print(f"📄 Righe lette: {stats['rows']}")
+    print(f"{'🔎 Da aggiornare' if dry_run else '✅ Aggiornati'}: {stats['products_updated']} prodotti "
+          f"({stats['fields_updated']} campi)")
+    print(f"♻️  Invariati: {stats['products_unchanged'] + stats['products_unchanged_cached']} "
+          f"({stats['products_unchanged_cached']} dallo stato salvato, senza richieste)")
+    print(f"❌ Non trovati: {stats['products_not_found']}, falliti: {stats['products_failed']}, "
+          f"righe non valide: {stats['rows_invalid']}")
+    print(f"{'='*50}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  Aggiornamento interrotto dall'utente (rilancia: le righe già aggiornate non verranno reinviate)")
+        sys.exit(130)
@@ -6,7 +6,12 @@ Cerca i prodotti per reference e carica le immagini da data/assets/
 
 import sys
 import logging
-import csv
+import argparse
+import threading
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 import time
@@ -16,6 +21,18 @@ sys.path.append(str(Path(__file__).parent))
 
 from config.config import Config
 from src.api_client import PrestaShopAPI
+from src.reference_index import ReferenceIndex
+from src.response_cache import ResponseCache
+from src.rate_limiter import RateLimiter
+from src.asset_index import AssetIndex, IMAGE_EXTENSIONS
+from src.image_manifest import ImageManifest, describe_local_image, plan_image_diff
+from src.pipeline import background, batched, iter_csv_references
+from src.image_processing import ImagePreprocessor
+from src.metrics import print_summary
+from src.profiling import phase, timed_iter, start_profiler, stop_profiler
+
+# Output del prodotto in corso quando si lavora in parallelo (per thread o per task asyncio)
+_output_buffer = contextvars.ContextVar('output_buffer', default=None)
 
 # Configurazione logging
 def setup_logging():
@@ -37,135 +54,574 @@ def setup_logging():
 class ImageUploader:
     """Gestore upload SOLO immagini"""
     
-    def __init__(self, api_client):
+    def __init__(self, api_client, workers: int = None, image_workers: int = None,
+                 manifest=None, journal=None, preprocessor=None, asset_index=None, shard=None):
+        """
+        Args:
+            api_client: Istanza di PrestaShopAPI (condivisa tra i worker)
+            workers: Prodotti elaborati in parallelo (1 = sequenziale, default Config.UPLOAD_WORKERS)
+            image_workers: Immagini preparate in parallelo per prodotto (default Config.IMAGE_WORKERS)
+            manifest: ImageManifest per la sync differenziale (None = sostituzione completa)
+            journal: RunJournal dove registrare gli esiti (e da cui riprendere)
+            preprocessor: ImagePreprocessor per ridimensionare/ricomprimere prima dell'upload
+            asset_index: AssetIndex condiviso (None = elenco delle cartelle ad ogni prodotto)
+            shard: Shard dei reference da elaborare (None = tutti)
+        """
         self.api = api_client
         self.assets_dir = Config.ASSETS_DIR
+        self.workers = max(1, workers or Config.UPLOAD_WORKERS)
+        self.image_workers = max(1, image_workers or Config.IMAGE_WORKERS)
+        
+        # Con il rate limiter le pause fisse non servono: la velocità si adatta al server
+        self.throttled = getattr(api_client, 'rate_limiter', None) is not None
         self.stats = {
             'products_processed': 0,
             'products_skipped': 0,
             'images_uploaded': 0,
             'images_failed': 0,
-            'products_not_found': 0
+            'products_not_found': 0,
+            'lookup_failed': 0,
+            'products_unchanged': 0,
+            'images_unchanged': 0,
+            'images_deleted': 0
         }
         
+        self.manifest = manifest
+        self.journal = journal
+        self.preprocessor = preprocessor
+        self.asset_index = asset_index
+        self.shard = shard
+        
+        # reference -> ID prodotto (None = cercato ma non trovato)
+        self.product_ids = {}
+        
+        # reference -> immagini locali già trovate dalla pipeline CSV
+        self.local_images = {}
+        
+        # Statistiche e output condivisi tra i worker
+        self._stats_lock = threading.Lock()
+        self._print_lock = threading.Lock()
+        
         # Estensioni immagini valide
-        self.image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+        self.image_extensions = IMAGE_EXTENSIONS
         
         logging.info(f"📁 Cartella immagini: {self.assets_dir.absolute()}")
     
     def find_product_images(self, reference: str):
         """Trova tutte le immagini per un prodotto"""
-        product_folder = self.assets_dir / reference
+        if self.asset_index is not None:
+            with phase('assets'):
+                return self.asset_index.images(reference)
         
-        if not product_folder.exists():
-            return []
+        product_folder = self.assets_dir / reference
         
-        # Trova tutte le immagini nella cartella
-        images = []
-        for file in product_folder.iterdir():
-            if file.is_file() and file.suffix.lower() in self.image_extensions:
-                images.append(file)
+        with phase('assets'):
+            if not product_folder.exists():
+                return []
+            
+            # Trova tutte le immagini nella cartella
+            images = []
+            for file in product_folder.iterdir():
+                if file.is_file() and file.suffix.lower() in self.image_extensions:
+                    images.append(file)
         
         # Ordina per nome (controllo ordine)
         images.sort(key=lambda x: x.name.lower())
         
         return images
     
+    def find_asset_folders(self):
+        """Reference delle cartelle prodotto in assets"""
+        with phase('assets'):
+            if self.asset_index is not None:
+                return self.asset_index.references()
+            return [f.name for f in self.assets_dir.iterdir() if f.is_dir()]
+    
+    def owns(self, reference: str) -> bool:
+        """True se il reference appartiene allo shard di questa esecuzione"""
+        return self.shard is None or reference in self.shard
+    
+    def _own_folders(self, folders):
+        """Cartelle dello shard di questa esecuzione (con avviso se filtrate)"""
+        if self.shard is None:
+            return folders
+        owned = [ref for ref in folders if self.owns(ref)]
+        print(f"🧩 Shard {self.shard}: {len(owned)}/{len(folders)} cartelle")
+        return owned
+    
+    def _image_size(self, path: Path) -> int:
+        """Dimensione di un'immagine (dall'indice se disponibile)"""
+        size = self.asset_index.size(path) if self.asset_index is not None else None
+        return size if size is not None else path.stat().st_size
+    
+    def resolve_references(self, references, quiet: bool = False):
+        """Risolve in anticipo tutti i reference con poche richieste in blocco"""
+        pending = [ref for ref in dict.fromkeys(references) if ref and ref not in self.product_ids]
+        if not pending:
+            return self.product_ids
+        
+        if not quiet:
+            print(f"🔎 Ricerca di {len(pending)} reference su PrestaShop...")
+        with phase('lookup'):
+            found, failed = self.api.lookup_references(pending)
+        # I reference delle richieste fallite restano da cercare (uno per uno, per prodotto)
+        failed = set(failed)
+        for ref in pending:
+            if ref not in failed:
+                self.product_ids[ref] = found.get(ref)
+        
+        if quiet:
+            logging.debug(f"Risolti {len(found)}/{len(pending)} reference")
+        else:
+            print(f"   ✅ Trovati {len(found)}/{len(pending)} prodotti")
+        if failed:
+            print(f"   ⚠️  {len(failed)} reference non verificati (richieste fallite), riprovo per prodotto")
+        return self.product_ids
+    
+    def _print_throttle(self, delay: float):
+        """Mostra come viene regolata la velocità"""
+        if self.throttled:
+            limiter = self.api.rate_limiter
+            print(f"⏱️  Velocità adattiva: {limiter.rate:.1f} req/s iniziali, max {limiter.max_in_flight} in volo")
+            limiter.check_workers(self.workers)
+        else:
+            print(f"⏱️  Pausa tra prodotti: {delay} secondi")
+    
+    def _outcome(self, reference: str, status: str, result: bool, **details) -> bool:
+        """Registra l'esito del prodotto nel journal (se presente) e lo restituisce"""
+        if self.journal is not None:
+            self.journal.record(reference, status, **details)
+        return result
+    
+    def _pending_references(self, references):
+        """Con --resume esclude i reference già completati nel journal"""
+        if self.journal is None:
+            return references
+        return list(self._skip_completed(references))
+    
+    def _skip_completed(self, references):
+        """Versione in streaming di _pending_references (avviso alla fine)"""
+        completed = self.journal.completed() if self.journal is not None else set()
+        skipped = 0
+        for index, ref in references:
+            if ref in completed:
+                skipped += 1
+                continue
+            yield index, ref
+        if skipped:
+            self._print(f"⏭️  Saltati {skipped} prodotti già completati (ripresa)")
+    
+    def _csv_references(self, csv_path: str, counters: dict):
+        """
+        Righe valide del CSV, lette una alla volta (conta righe, reference mancanti e ripetuti)
+        
+        Un reference ripetuto si elabora solo alla prima riga: con più worker
+        le due sostituzioni dello stesso prodotto girerebbero insieme,
+        eliminando e caricando le immagini l'una sopra l'altra.
+        """
+        first_rows = {}
+        for index, reference in timed_iter('csv', iter_csv_references(csv_path)):
+            counters['rows'] = index
+            if not reference:
+                self._print(f"\n[{index}] ⚠️  Reference mancante, skip")
+                continue
+            if not self.owns(reference):
+                counters['other_shards'] = counters.get('other_shards', 0) + 1
+                continue
+            if reference in first_rows:
+                self._print(f"\n[{index}] ⚠️  {reference} già alla riga {first_rows[reference]}, skip")
+                counters['duplicates'] = counters.get('duplicates', 0) + 1
+                continue
+            first_rows[reference] = index
+            yield index, reference
+    
+    def _resolve_ahead(self, references):
+        """Stadio di ricerca: risolve i reference a blocchi prima che arrivino all'upload"""
+        for batch in batched(references, Config.PIPELINE_BATCH_SIZE):
+            self.resolve_references((ref for _, ref in batch), quiet=True)
+            yield from batch
+    
+    def _discover_ahead(self, references):
+        """Stadio disco: cerca le immagini locali dei prodotti trovati mentre la rete lavora"""
+        for index, reference in references:
+            if self.product_ids.get(reference):
+                self.local_images[reference] = self.find_product_images(reference)
+            yield index, reference
+    
+    def _count(self, key: str, amount: int = 1):
+        """Incrementa una statistica in modo thread-safe"""
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def _out(self, message: str = ""):
+        """Stampa subito, oppure accoda all'output del prodotto se in parallelo"""
+        buffer = _output_buffer.get()
+        if buffer is not None:
+            buffer.append(message)
+        else:
+            print(message)
+    
+    def _print(self, message: str):
+        """Stampa un messaggio senza mescolarlo con l'output dei prodotti"""
+        with self._print_lock:
+            print(message)
+    
+    def _flush_output(self):
+        """Stampa in un unico blocco l'output accodato per il prodotto corrente"""
+        buffer = _output_buffer.get()
+        _output_buffer.set(None)
+        if buffer:
+            with self._print_lock:
+                print("\n".join(buffer))
+    
+    def _prefetch(self, func, items, workers: int):
+        """
+        Applica func agli elementi con al massimo `workers` lavori in anticipo,
+        restituendo i risultati nell'ordine originale
+        """
+        if workers <= 1:
+            for item in items:
+                yield func(item)
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def _prepare_images(self, images):
+        """
+        Prepara le immagini per l'upload, nell'ordine
+        
+        Con il preprocessor tutte le immagini del prodotto partono subito nel
+        pool di processi; altrimenti si leggono con il prefetch dei thread.
+        """
+        if self.preprocessor is None:
+            return self._prefetch(self._read_image, images, self.image_workers)
+        
+        futures = [self.preprocessor.submit(path) for path in images]
+        return (self._prepare_processed(path, self._transformed(path, future))
+                for path, future in zip(images, futures))
+    
+    def _prepare_one(self, image_path):
+        """Prepara una sola immagine (trasformandola se c'è il preprocessor)"""
+        if self.preprocessor is None:
+            return self._read_image(image_path)
+        with phase('transform'):
+            processed = self.preprocessor.process(image_path)
+        return self._prepare_processed(image_path, processed)
+    
+    def _read_image(self, image_path):
+        """Verifica e legge un'immagine per l'upload"""
+        with phase('read'):
+            return self.api.prepare_image(image_path)
+    
+    def _transformed(self, image_path, future):
+        """Attende il risultato del preprocessor"""
+        with phase('transform'):
+            return self.preprocessor.result(image_path, future)
+    
+    def _prepare_processed(self, original, processed):
+        """Prepara il file trasformato mantenendo il nome dell'originale"""
+        prepared = self._read_image(processed)
+        if prepared is None or processed == original:
+            return prepared
+        
+        _, image_data, content_type = prepared
+        size_kb = Path(processed).stat().st_size / 1024
+        self._out(f"      🪄 {original.name} -> {size_kb:.0f} KB")
+        return original.stem + Path(processed).suffix, image_data, content_type
+    
     def upload_images_for_product(self, reference: str, replace_existing: bool = True):
         """Upload immagini per un singolo prodotto"""
         
-        print(f"\n{'='*60}")
-        print(f"📦 Prodotto: {reference}")
+        self._out(f"\n{'='*60}")
+        self._out(f"📦 Prodotto: {reference}")
         
-        # Step 1: Cerca se il prodotto esiste su PrestaShop
-        product_id = self.api.search_by_reference(reference)
+        # Step 1: Cerca se il prodotto esiste su PrestaShop (se non già risolto in blocco)
+        if reference in self.product_ids:
+            product_id = self.product_ids[reference]
+        else:
+            with phase('lookup'):
+                found, failed = self.api.lookup_references([reference])
+            if failed:
+                self._out(f"   ❌ Ricerca su PrestaShop fallita (errore di rete o del server)")
+                self._count('lookup_failed')
+                return self._outcome(reference, 'failed', False, error='lookup')
+            product_id = found.get(reference)
         
         if not product_id:
-            print(f"   ❌ Prodotto non trovato su PrestaShop")
-            self.stats['products_not_found'] += 1
-            return False
+            self._out(f"   ❌ Prodotto non trovato su PrestaShop")
+            self._count('products_not_found')
+            return self._outcome(reference, 'not_found', False)
         
-        print(f"   ✅ Trovato su PrestaShop (ID: {product_id})")
+        self._out(f"   ✅ Trovato su PrestaShop (ID: {product_id})")
         
-        # Step 2: Trova le immagini nella cartella assets
-        images = self.find_product_images(reference)
+        # Step 2: Trova le immagini nella cartella assets (se non già fatto dalla pipeline)
+        images = self.local_images.pop(reference, None)
+        if images is None:
+            images = self.find_product_images(reference)
         
         if not images:
-            print(f"   ⚠️  Nessuna immagine trovata in: data/assets/{reference}/")
-            self.stats['products_skipped'] += 1
-            return False
+            self._out(f"   ⚠️  Nessuna immagine trovata in: data/assets/{reference}/")
+            self._count('products_skipped')
+            return self._outcome(reference, 'no_images', False)
         
-        print(f"   📸 Trovate {len(images)} immagini da caricare:")
+        self._out(f"   📸 Trovate {len(images)} immagini da caricare:")
         for img in images:
-            size_kb = img.stat().st_size / 1024
-            print(f"      - {img.name} ({size_kb:.0f} KB)")
+            size_kb = self._image_size(img) / 1024
+            self._out(f"      - {img.name} ({size_kb:.0f} KB)")
+        
+        # Sync differenziale: tocca solo le immagini cambiate
+        if replace_existing and self.manifest is not None:
+            return self._sync_images_diff(reference, product_id, images)
         
         # Step 3: Elimina immagini esistenti se richiesto
         if replace_existing:
-            deleted = self.api.delete_product_images(product_id)
+            with phase('delete'):
+                deleted = self.api.delete_product_images(product_id)
             if deleted > 0:
-                print(f"   🗑️  Eliminate {deleted} immagini esistenti")
+                self._out(f"   🗑️  Eliminate {deleted} immagini esistenti")
+                self._count('images_deleted', deleted)
         
         # Step 4: Carica le nuove immagini
+        # PrestaShop assegna la posizione al momento dell'inserimento, quindi gli
+        # upload partono in ordine (copertina per prima); in parallelo avviene
+        # solo la lettura da disco delle immagini successive.
         uploaded = 0
-        for position, image_path in enumerate(images, 1):
-            print(f"   📤 Caricamento {position}/{len(images)}: {image_path.name}...")
+        prepared_images = self._prepare_images(images)
+        for position, (image_path, prepared) in enumerate(zip(images, prepared_images), 1):
+            self._out(f"   📤 Caricamento {position}/{len(images)}: {image_path.name}...")
+            
+            if prepared is None:
+                ok = False
+            else:
+                filename, image_data, content_type = prepared
+                with phase('upload'):
+                    ok = self.api.upload_image_data(product_id, filename, image_data, position, content_type)
             
-            if self.api.upload_image_from_path(product_id, str(image_path), position):
+            if ok:
                 uploaded += 1
-                self.stats['images_uploaded'] += 1
-                print(f"      ✅ OK")
+                self._count('images_uploaded')
+                self._out(f"      ✅ OK")
             else:
-                self.stats['images_failed'] += 1
-                print(f"      ❌ Fallito")
+                self._count('images_failed')
+                self._out(f"      ❌ Fallito")
             
-            # Piccola pausa tra un'immagine e l'altra
-            if position < len(images):
-                time.sleep(0.2)
+            # Piccola pausa tra un'immagine e l'altra (se non c'è il rate limiter)
+            if position < len(images) and not self.throttled:
+                with phase('sleep'):
+                    time.sleep(Config.IMAGE_DELAY)
         
         if uploaded > 0:
-            print(f"   ✅ COMPLETATO: {uploaded}/{len(images)} immagini caricate")
-            self.stats['products_processed'] += 1
-            return True
+            self._out(f"   ✅ COMPLETATO: {uploaded}/{len(images)} immagini caricate")
+            self._count('products_processed')
+            status = 'done' if uploaded == len(images) else 'partial'
+            return self._outcome(reference, status, True, product_id=product_id, images=uploaded)
         else:
-            print(f"   ❌ ERRORE: Nessuna immagine caricata")
-            return False
+            self._out(f"   ❌ ERRORE: Nessuna immagine caricata")
+            # L'ID in indice potrebbe essere obsoleto: al prossimo giro si ricerca
+            if self.api.index is not None:
+                self.api.index.invalidate([reference])
+            self.product_ids.pop(reference, None)
+            return self._outcome(reference, 'failed', False, product_id=product_id)
+    
+    def _sync_images_diff(self, reference: str, product_id: str, images):
+        """
+        Allinea le immagini del prodotto confrontando gli hash con il manifest
+        
+        Se il manifest non corrisponde più alle immagini presenti sul negozio
+        (o non esiste) si esegue una sostituzione completa e lo si ricrea.
+        """
+        previous = self.manifest.get(reference)
+        previous_by_name = {entry['name']: entry for entry in previous['images']} if previous else {}
+        
+        # Hash dei file locali (riusati se dimensione e data non sono cambiate)
+        def describe(path):
+            with phase('hash'):
+                return describe_local_image(path, previous_by_name.get(path.name))
+        local = list(self._prefetch(describe, images, self.image_workers))
+        
+        # Il manifest vale solo se le immagini sul negozio sono ancora quelle
+        # (lettura senza cache: deve vedere anche le modifiche fatte fuori da questo script)
+        remote = []
+        if previous and previous['product_id'] == str(product_id):
+            with phase('check'):
+                server_ids = self.api.get_product_image_ids(product_id, cache=False)
+            if server_ids is not None and server_ids == [entry['image_id'] for entry in previous['images']]:
+                remote = previous['images']
+            else:
+                self._out(f"   ⚠️  Immagini sul negozio diverse dal manifest: sostituzione completa")
+        
+        with phase('delete'):
+            if remote:
+                keep, delete_ids, start = plan_image_diff(local, remote)
+                deleted = sum(1 for image_id in delete_ids if self.api.delete_image(product_id, image_id))
+            else:
+                keep, start = [], 0
+                deleted = self.api.delete_product_images(product_id)
+        
+        if deleted:
+            self._out(f"   🗑️  Eliminate {deleted} immagini")
+            self._count('images_deleted', deleted)
+        
+        if start:
+            self._out(f"   ♻️  {start} immagini invariate")
+            self._count('images_unchanged', start)
+        
+        if start == len(local) and not deleted:
+            self._out(f"   ✅ Nessuna modifica")
+            self._count('products_unchanged')
+            return self._outcome(reference, 'unchanged', True, product_id=product_id)
+        
+        # Carica in ordine le immagini da `start` in poi (finiscono in coda)
+        uploaded_entries = []
+        to_upload = images[start:]
+        prepared_images = self._prepare_images(to_upload)
+        for offset, (image_path, prepared) in enumerate(zip(to_upload, prepared_images)):
+            position = start + offset + 1
+            self._out(f"   📤 Caricamento {position}/{len(images)}: {image_path.name}...")
+            
+            image_id = None
+            if prepared is not None:
+                filename, image_data, content_type = prepared
+                with phase('upload'):
+                    image_id = self.api.upload_image(product_id, filename, image_data, position, content_type)
+            
+            if image_id is not None:
+                uploaded_entries.append(dict(local[start + offset], image_id=image_id))
+                self._count('images_uploaded')
+                self._out(f"      ✅ OK")
+            else:
+                self._count('images_failed')
+                self._out(f"      ❌ Fallito")
+            
+            if offset < len(to_upload) - 1 and not self.throttled:
+                with phase('sleep'):
+                    time.sleep(Config.IMAGE_DELAY)
+        
+        # Il manifest riflette l'ordine reale sul negozio: le immagini fallite
+        # mancano, quindi al prossimo giro verranno ricaricate insieme alle successive
+        entries = keep + uploaded_entries
+        if any(not entry['image_id'] for entry in uploaded_entries):
+            # Risposta senza ID: si rileggono dal negozio (le nuove sono in coda, in ordine)
+            with phase('check'):
+                server_ids = self.api.get_product_image_ids(product_id, cache=False)
+            if server_ids is not None and len(server_ids) == len(entries) \
+                    and server_ids[:len(keep)] == [entry['image_id'] for entry in keep]:
+                entries = [dict(entry, image_id=image_id) for entry, image_id in zip(entries, server_ids)]
+            else:
+                entries = None
+        if entries is not None:
+            self.manifest.set(reference, product_id, entries)
+        else:
+            # Meglio nessun manifest che ID vuoti: al prossimo giro sostituzione completa
+            self._out(f"   ⚠️  ID delle immagini caricate non disponibili: manifest non aggiornato")
+            logging.warning(f"{reference}: ID immagini non disponibili, manifest invalidato")
+            self.manifest.invalidate([reference])
+        
+        self._out(f"   ✅ COMPLETATO: {len(uploaded_entries)}/{len(to_upload)} immagini caricate")
+        if len(uploaded_entries) == len(to_upload):
+            status = 'done'
+        else:
+            status = 'partial' if uploaded_entries or keep else 'failed'
+        
+        if uploaded_entries or keep:
+            self._count('products_processed')
+        return self._outcome(reference, status, status != 'failed',
+                             product_id=product_id, images=len(uploaded_entries))
+    
+    def _process_reference(self, index: int, total, reference: str, delay: float):
+        """Elabora un prodotto all'interno di un worker (output raggruppato per prodotto)"""
+        if self.workers > 1:
+            _output_buffer.set([])
+        try:
+            self._out(f"\n[{index}/{total}]" if total else f"\n[{index}]")
+            self.upload_images_for_product(reference)
+        except Exception as e:
+            logging.error(f"Errore elaborazione {reference}: {e}")
+        finally:
+            self._flush_output()
+            # Il prodotto è chiuso: niente cache che cresce con la dimensione del CSV
+            self.product_ids.pop(reference, None)
+        
+        # Pausa tra un prodotto e l'altro (per ogni worker, se non c'è il rate limiter)
+        if (not total or index < total) and not self.throttled:
+            with phase('sleep'):
+                time.sleep(delay)
+    
+    def process_references(self, references, delay: float = 0.5, total: int = None):
+        """
+        Elabora (posizione, reference) con il numero di worker configurato
+        
+        Args:
+            references: Lista o iteratore di tuple (indice, reference), consumato man mano
+            delay: Pausa tra un prodotto e l'altro
+            total: Totale mostrato nei progressi (default: lunghezza della lista, se nota)
+        """
+        if total is None and isinstance(references, list):
+            total = len(references)
+        
+        if self.workers <= 1:
+            for index, reference in references:
+                self._process_reference(index, total, reference, delay)
+            return self.stats
+        
+        print(f"⚡ Elaborazione parallela: {self.workers} prodotti alla volta")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Al massimo due prodotti in coda per worker: il resto aspetta nell'iteratore
+            pending = deque()
+            try:
+                for index, reference in references:
+                    pending.append(pool.submit(self._process_reference, index, total, reference, delay))
+                    if len(pending) >= self.workers * 2:
+                        pending.popleft().result()
+                while pending:
+                    pending.popleft().result()
+            except KeyboardInterrupt:
+                # Niente nuovi prodotti: si attendono solo quelli già in corso
+                print("\n⚠️  Interruzione: completamento dei prodotti in corso...")
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+        
+        return self.stats
     
     def process_csv(self, csv_path: str, delay: float = 0.5):
-        """Processa un CSV caricando SOLO le immagini"""
+        """
+        Processa un CSV caricando SOLO le immagini
+        
+        Il file è letto in streaming: la ricerca dei reference (a blocchi) e
+        la scansione delle cartelle procedono in anticipo su thread propri,
+        separati dall'upload da code limitate.
+        """
         
         if not Path(csv_path).exists():
             logging.error(f"File non trovato: {csv_path}")
             return self.stats
         
         print(f"\n📂 File CSV: {csv_path}")
-        print(f"⏱️  Pausa tra prodotti: {delay} secondi")
+        self._print_throttle(delay)
+        print(f"🚰 Lettura in streaming (ricerca a blocchi di {Config.PIPELINE_BATCH_SIZE})")
+        
+        counters = {'rows': 0}
+        references = self._skip_completed(self._csv_references(csv_path, counters))
+        references = background(self._resolve_ahead(references), Config.PIPELINE_QUEUE_SIZE, 'lookup')
+        references = background(self._discover_ahead(references), Config.PIPELINE_QUEUE_SIZE, 'assets')
         
         try:
-            with open(csv_path, 'r', encoding='utf-8-sig') as file:
-                reader = csv.DictReader(file, delimiter=';')
-                rows = list(reader)
-                total = len(rows)
-                
-                print(f"📊 Trovati {total} prodotti nel CSV")
-                
-                for index, row in enumerate(rows, 1):
-                    reference = row.get('reference', '').strip()
-                    
-                    if not reference:
-                        print(f"\n[{index}/{total}] ⚠️  Reference mancante, skip")
-                        continue
-                    
-                    print(f"\n[{index}/{total}]")
-                    self.upload_images_for_product(reference)
-                    
-                    # Pausa tra un prodotto e l'altro
-                    if index < total:
-                        time.sleep(delay)
-                
+            self.process_references(references, delay)
         except Exception as e:
             logging.error(f"Errore lettura CSV: {e}")
         
+        print(f"\n📊 Lette {counters['rows']} righe dal CSV")
+        if counters.get('duplicates'):
+            print(f"🔁 {counters['duplicates']} righe con reference ripetuto ignorate")
+        if self.shard is not None:
+            print(f"🧩 Shard {self.shard}: {counters.get('other_shards', 0)} reference lasciati agli altri shard")
         return self.stats
     
     def process_single_product(self, reference: str):
@@ -180,24 +636,262 @@ class ImageUploader:
         print(f"\n📁 Elaborazione di TUTTE le cartelle in: {self.assets_dir}")
         
         # Trova tutte le cartelle in assets
-        folders = [f for f in self.assets_dir.iterdir() if f.is_dir()]
+        folders = self.find_asset_folders()
         
         if not folders:
             print("⚠️  Nessuna cartella trovata in assets/")
             return self.stats
         
         print(f"📊 Trovate {len(folders)} cartelle prodotto")
+        folders = self._own_folders(folders)
         
-        for index, folder in enumerate(folders, 1):
-            reference = folder.name
-            print(f"\n[{index}/{len(folders)}]")
-            self.upload_images_for_product(reference)
+        references = list(enumerate(folders, 1))
+        references = self._pending_references(references)
+        self.resolve_references(reference for _, reference in references)
+        
+        self.process_references(references, delay, len(folders))
+        
+        return self.stats
+
+class AsyncImageUploader(ImageUploader):
+    """
+    Driver asincrono delle stesse modalità di ImageUploader
+    
+    Usa AsyncPrestaShopAPI: i prodotti avanzano come task asyncio
+    (al massimo `workers` alla volta) invece che come thread.
+    """
+    
+    async def resolve_references(self, references, quiet: bool = False):
+        """Risolve in anticipo tutti i reference con poche richieste in blocco"""
+        pending = [ref for ref in dict.fromkeys(references) if ref and ref not in self.product_ids]
+        if not pending:
+            return self.product_ids
+        
+        if not quiet:
+            print(f"🔎 Ricerca di {len(pending)} reference su PrestaShop...")
+        with phase('lookup'):
+            found, failed = await self.api.lookup_references(pending)
+        # I reference delle richieste fallite restano da cercare (uno per uno, per prodotto)
+        failed = set(failed)
+        for ref in pending:
+            if ref not in failed:
+                self.product_ids[ref] = found.get(ref)
+        
+        if quiet:
+            logging.debug(f"Risolti {len(found)}/{len(pending)} reference")
+        else:
+            print(f"   ✅ Trovati {len(found)}/{len(pending)} prodotti")
+        if failed:
+            print(f"   ⚠️  {len(failed)} reference non verificati (richieste fallite), riprovo per prodotto")
+        return self.product_ids
+    
+    async def upload_images_for_product(self, reference: str, replace_existing: bool = True):
+        """Upload immagini per un singolo prodotto"""
+        
+        self._out(f"\n{'='*60}")
+        self._out(f"📦 Prodotto: {reference}")
+        
+        # Step 1: Cerca se il prodotto esiste su PrestaShop (se non già risolto in blocco)
+        if reference in self.product_ids:
+            product_id = self.product_ids[reference]
+        else:
+            with phase('lookup'):
+                found, failed = await self.api.lookup_references([reference])
+            if failed:
+                self._out(f"   ❌ Ricerca su PrestaShop fallita (errore di rete o del server)")
+                self._count('lookup_failed')
+                return self._outcome(reference, 'failed', False, error='lookup')
+            product_id = found.get(reference)
+        
+        if not product_id:
+            self._out(f"   ❌ Prodotto non trovato su PrestaShop")
+            self._count('products_not_found')
+            return self._outcome(reference, 'not_found', False)
+        
+        self._out(f"   ✅ Trovato su PrestaShop (ID: {product_id})")
+        
+        # Step 2: Trova le immagini nella cartella assets (se non già fatto dalla pipeline)
+        images = self.local_images.pop(reference, None)
+        if images is None:
+            images = await asyncio.to_thread(self.find_product_images, reference)
+        
+        if not images:
+            self._out(f"   ⚠️  Nessuna immagine trovata in: data/assets/{reference}/")
+            self._count('products_skipped')
+            return self._outcome(reference, 'no_images', False)
+        
+        self._out(f"   📸 Trovate {len(images)} immagini da caricare")
+        
+        # Step 3: Elimina immagini esistenti se richiesto
+        if replace_existing:
+            with phase('delete'):
+                deleted = await self.api.delete_product_images(product_id)
+            if deleted > 0:
+                self._out(f"   🗑️  Eliminate {deleted} immagini esistenti")
+                self._count('images_deleted', deleted)
+        
+        # Step 4: Carica le nuove immagini, in ordine di posizione (copertina per prima);
+        # la lettura del file successivo avviene mentre è in corso l'upload corrente
+        uploaded = 0
+        next_read = asyncio.create_task(asyncio.to_thread(self._prepare_one, images[0]))
+        for position, image_path in enumerate(images, 1):
+            prepared = await next_read
+            if position < len(images):
+                next_read = asyncio.create_task(asyncio.to_thread(self._prepare_one, images[position]))
             
-            # Pausa tra un prodotto e l'altro
-            if index < len(folders):
-                time.sleep(delay)
+            self._out(f"   📤 Caricamento {position}/{len(images)}: {image_path.name}...")
+            
+            if prepared is None:
+                ok = False
+            else:
+                filename, image_data, content_type = prepared
+                with phase('upload'):
+                    ok = await self.api.upload_image_data(product_id, filename, image_data, position, content_type)
+            
+            if ok:
+                uploaded += 1
+                self._count('images_uploaded')
+                self._out(f"      ✅ OK")
+            else:
+                self._count('images_failed')
+                self._out(f"      ❌ Fallito")
+            
+            # Piccola pausa tra un'immagine e l'altra (se non c'è il rate limiter)
+            if position < len(images) and not self.throttled:
+                with phase('sleep'):
+                    await asyncio.sleep(Config.IMAGE_DELAY)
+        
+        if uploaded > 0:
+            self._out(f"   ✅ COMPLETATO: {uploaded}/{len(images)} immagini caricate")
+            self._count('products_processed')
+            status = 'done' if uploaded == len(images) else 'partial'
+            return self._outcome(reference, status, True, product_id=product_id, images=uploaded)
+        else:
+            self._out(f"   ❌ ERRORE: Nessuna immagine caricata")
+            # L'ID in indice potrebbe essere obsoleto: al prossimo giro si ricerca
+            if self.api.index is not None:
+                await asyncio.to_thread(self.api.index.invalidate, [reference])
+            self.product_ids.pop(reference, None)
+            return self._outcome(reference, 'failed', False, product_id=product_id)
+    
+    async def _process_reference(self, index: int, total, reference: str, delay: float):
+        """Elabora un prodotto come task (output raggruppato per prodotto)"""
+        _output_buffer.set([])
+        try:
+            self._out(f"\n[{index}/{total}]" if total else f"\n[{index}]")
+            await self.upload_images_for_product(reference)
+        except Exception as e:
+            logging.error(f"Errore elaborazione {reference}: {e}")
+        finally:
+            self._flush_output()
+            self.product_ids.pop(reference, None)
+        
+        # Pausa tra un prodotto e l'altro (per ogni worker, se non c'è il rate limiter)
+        if (not total or index < total) and not self.throttled:
+            with phase('sleep'):
+                await asyncio.sleep(delay)
+    
+    async def process_references(self, references, delay: float = 0.5, total: int = None):
+        """
+        Elabora (posizione, reference) con al massimo `workers` prodotti in corso
+        
+        Args:
+            references: Lista o iteratore asincrono di tuple (indice, reference)
+            delay: Pausa tra un prodotto e l'altro
+            total: Totale mostrato nei progressi (default: lunghezza della lista, se nota)
+        """
+        if isinstance(references, list):
+            total = total or len(references)
+            references = _aiter(references)
+        limiter = asyncio.Semaphore(self.workers)
+        tasks = set()
+        
+        def finished(task):
+            tasks.discard(task)
+            limiter.release()
+        
+        print(f"⚡ Elaborazione asincrona: {self.workers} prodotti alla volta")
+        # Un nuovo task parte solo quando se ne libera uno: l'iteratore avanza al ritmo degli upload
+        async for index, reference in references:
+            await limiter.acquire()
+            task = asyncio.create_task(self._process_reference(index, total, reference, delay))
+            tasks.add(task)
+            task.add_done_callback(finished)
+        
+        await asyncio.gather(*tasks)
+        return self.stats
+    
+    async def _stream_references(self, batches):
+        """Ricerca a blocchi: il blocco successivo si risolve mentre si elabora il corrente"""
+        batch = await asyncio.to_thread(next, batches, None)
+        lookup = asyncio.create_task(self.resolve_references((ref for _, ref in batch or []), quiet=True))
+        while batch:
+            await lookup
+            next_batch = await asyncio.to_thread(next, batches, None)
+            lookup = asyncio.create_task(self.resolve_references((ref for _, ref in next_batch or []), quiet=True))
+            for item in batch:
+                yield item
+            batch = next_batch
+        await lookup
+    
+    async def process_csv(self, csv_path: str, delay: float = 0.5):
+        """Processa un CSV caricando SOLO le immagini (in streaming, come ImageUploader)"""
+        
+        if not Path(csv_path).exists():
+            logging.error(f"File non trovato: {csv_path}")
+            return self.stats
+        
+        print(f"\n📂 File CSV: {csv_path}")
+        self._print_throttle(delay)
+        print(f"🚰 Lettura in streaming (ricerca a blocchi di {Config.PIPELINE_BATCH_SIZE})")
+        
+        counters = {'rows': 0}
+        references = self._skip_completed(self._csv_references(csv_path, counters))
+        batches = background(batched(references, Config.PIPELINE_BATCH_SIZE),
+                             max(1, Config.PIPELINE_QUEUE_SIZE // Config.PIPELINE_BATCH_SIZE), 'csv')
         
+        try:
+            await self.process_references(self._stream_references(batches), delay)
+        except Exception as e:
+            logging.error(f"Errore lettura CSV: {e}")
+        
+        print(f"\n📊 Lette {counters['rows']} righe dal CSV")
+        if counters.get('duplicates'):
+            print(f"🔁 {counters['duplicates']} righe con reference ripetuto ignorate")
+        if self.shard is not None:
+            print(f"🧩 Shard {self.shard}: {counters.get('other_shards', 0)} reference lasciati agli altri shard")
         return self.stats
+    
+    async def process_single_product(self, reference: str):
+        """Processa un singolo prodotto per reference"""
+        print(f"\n🎯 Upload immagini per prodotto singolo: {reference}")
+        await self.upload_images_for_product(reference)
+        return self.stats
+    
+    async def process_all_assets_folders(self, delay: float = 0.5):
+        """Processa TUTTE le cartelle in assets (senza CSV)"""
+        
+        print(f"\n📁 Elaborazione di TUTTE le cartelle in: {self.assets_dir}")
+        
+        folders = await asyncio.to_thread(self.find_asset_folders)
+        
+        if not folders:
+            print("⚠️  Nessuna cartella trovata in assets/")
+            return self.stats
+        
+        print(f"📊 Trovate {len(folders)} cartelle prodotto")
+        folders = self._own_folders(folders)
+        
+        references = list(enumerate(folders, 1))
+        references = self._pending_references(references)
+        await self.resolve_references(reference for _, reference in references)
+        
+        return await self.process_references(references, delay, len(folders))
+
+async def _aiter(items):
+    """Iteratore asincrono su una lista"""
+    for item in items:
+        yield item
 
 def main():
     """Funzione principale"""
@@ -219,8 +913,20 @@ def main():
     
     # Connessione API
     print("\n🔌 Connessione alle API...")
-    api = PrestaShopAPI(Config.API_URL, Config.API_KEY)
-    
+    index = ReferenceIndex() if Config.INDEX_ENABLED else None
+    rate_limiter = RateLimiter() if Config.RATE_LIMIT_ENABLED else None
+    asset_index = AssetIndex() if Config.ASSET_INDEX_ENABLED else None
+    cache = ResponseCache() if Config.CACHE_ENABLED else None
+    try:
+        with PrestaShopAPI(Config.PRESTASHOP_API_URL, Config.PRESTASHOP_API_KEY,
+                           index=index, rate_limiter=rate_limiter, cache=cache) as api:
+            return run_menu(api, log_file, asset_index)
+    finally:
+        if asset_index is not None:
+            asset_index.close()
+
+def run_menu(api, log_file, asset_index=None):
+    """Menu interattivo, eseguito con la sessione API aperta"""
     if not api.test_connection():
         print("❌ Impossibile connettersi alle API!")
         return False
@@ -238,85 +944,119 @@ def main():
     
     choice = input("\n▶️  Scelta (1/2/3): ").strip()
     
-    uploader = ImageUploader(api)
-    stats = None
-    
-    if choice == '1':
-        # Modalità CSV
-        csv_files = list(Config.INPUT_DIR.glob('*.csv'))
+    manifest = ImageManifest() if Config.SYNC_MODE == 'diff' else None
+    preprocessor = None
+    try:
+        preprocessor = ImagePreprocessor.from_config()
+        uploader = ImageUploader(api, manifest=manifest, preprocessor=preprocessor, asset_index=asset_index)
+        stats = None
         
-        if not csv_files:
-            print(f"❌ Nessun CSV trovato in {Config.INPUT_DIR}")
-            return False
+        if choice == '1':
+            # Modalità CSV
+            csv_files = list(Config.INPUT_DIR.glob('*.csv'))
+            
+            if not csv_files:
+                print(f"❌ Nessun CSV trovato in {Config.INPUT_DIR}")
+                return False
+            
+            print(f"\n📁 File CSV disponibili:")
+            for i, csv_file in enumerate(csv_files, 1):
+                print(f"{i}. {csv_file.name}")
+            
+            if len(csv_files) == 1:
+                csv_choice = 0
+            else:
+                csv_choice = int(input(f"\n▶️  Quale file? (1-{len(csv_files)}): ")) - 1
+            
+            csv_file = csv_files[csv_choice]
+            
+            # Chiedi conferma
+            response = input(f"\n▶️  Caricare immagini per i prodotti in {csv_file.name}? (s/n): ")
+            if response.lower() == 's':
+                stats = uploader.process_csv(str(csv_file), Config.UPLOAD_DELAY)
+        
+        elif choice == '2':
+            # Modalità tutte le cartelle
+            folder_count = len(uploader.find_asset_folders())
+            
+            print(f"\n📁 Trovate {folder_count} cartelle in assets/")
+            response = input(f"▶️  Caricare immagini per TUTTI i prodotti? (s/n): ")
+            
+            if response.lower() == 's':
+                stats = uploader.process_all_assets_folders(Config.UPLOAD_DELAY)
         
-        print(f"\n📁 File CSV disponibili:")
-        for i, csv_file in enumerate(csv_files, 1):
-            print(f"{i}. {csv_file.name}")
+        elif choice == '3':
+            # Modalità singolo prodotto
+            reference = input("\n▶️  Inserisci il reference del prodotto: ").strip()
+            
+            if reference:
+                # Verifica che esista la cartella
+                folder = Config.ASSETS_DIR / reference
+                if not folder.exists():
+                    print(f"❌ Cartella non trovata: {folder}")
+                    create = input("▶️  Vuoi crearla? (s/n): ")
+                    if create.lower() == 's':
+                        folder.mkdir(exist_ok=True)
+                        print(f"✅ Cartella creata. Aggiungi le immagini e riprova.")
+                    return False
+                
+                stats = uploader.process_single_product(reference)
         
-        if len(csv_files) == 1:
-            csv_choice = 0
         else:
-            csv_choice = int(input(f"\n▶️  Quale file? (1-{len(csv_files)}): ")) - 1
-        
-        csv_file = csv_files[csv_choice]
-        
-        # Chiedi conferma
-        response = input(f"\n▶️  Caricare immagini per i prodotti in {csv_file.name}? (s/n): ")
-        if response.lower() == 's':
-            stats = uploader.process_csv(str(csv_file), Config.UPLOAD_DELAY)
-    
-    elif choice == '2':
-        # Modalità tutte le cartelle
-        folders = list(Config.ASSETS_DIR.iterdir())
-        folder_count = len([f for f in folders if f.is_dir()])
-        
-        print(f"\n📁 Trovate {folder_count} cartelle in assets/")
-        response = input(f"▶️  Caricare immagini per TUTTI i prodotti? (s/n): ")
-        
-        if response.lower() == 's':
-            stats = uploader.process_all_assets_folders(Config.UPLOAD_DELAY)
-    
-    elif choice == '3':
-        # Modalità singolo prodotto
-        reference = input("\n▶️  Inserisci il reference del prodotto: ").strip()
-        
-        if reference:
-            # Verifica che esista la cartella
-            folder = Config.ASSETS_DIR / reference
-            if not folder.exists():
-                print(f"❌ Cartella non trovata: {folder}")
-                create = input("▶️  Vuoi crearla? (s/n): ")
-                if create.lower() == 's':
-                    folder.mkdir(exist_ok=True)
-                    print(f"✅ Cartella creata. Aggiungi le immagini e riprova.")
-                return False
-            
-            stats = uploader.process_single_product(reference)
-    
-    else:
-        print("❌ Scelta non valida")
-        return False
-    
-    # Report finale
-    if stats:
-        print("\n" + "="*60)
-        print("📊 REPORT FINALE")
-        print("="*60)
-        print(f"✅ Prodotti processati: {stats['products_processed']}")
-        print(f"📸 Immagini caricate: {stats['images_uploaded']}")
-        print(f"⚠️  Prodotti saltati: {stats['products_skipped']}")
-        print(f"❌ Prodotti non trovati: {stats['products_not_found']}")
-        print(f"❌ Immagini fallite: {stats['images_failed']}")
-        print(f"📝 Log salvato in: {log_file}")
-        print("="*60)
-    
-    return True
+            print("❌ Scelta non valida")
+            return False
+        
+        # Report finale
+        if stats:
+            print("\n" + "="*60)
+            print("📊 REPORT FINALE")
+            print("="*60)
+            print(f"✅ Prodotti processati: {stats['products_processed']}")
+            print(f"📸 Immagini caricate: {stats['images_uploaded']}")
+            print(f"⚠️  Prodotti saltati: {stats['products_skipped']}")
+            print(f"❌ Prodotti non trovati: {stats['products_not_found']}")
+            if stats['lookup_failed']:
+                print(f"❌ Ricerche fallite: {stats['lookup_failed']}")
+            print(f"❌ Immagini fallite: {stats['images_failed']}")
+            if manifest is not None:
+                print(f"♻️  Immagini invariate: {stats['images_unchanged']}")
+            if Config.METRICS_REPORT:
+                report = api.metrics.write_report(
+                    log_file.with_suffix('.report.json'), stats, api.rate_limiter, api.retry_policy,
+                    script='upload_images', mode={'1': 'csv', '2': 'all', '3': 'single'}[choice],
+                    workers=uploader.workers,
+                )
+                print_summary(report)
+                print(f"📈 Report richieste: {log_file.with_suffix('.report.json')}")
+            print(f"📝 Log salvato in: {log_file}")
+            print("="*60)
+        
+        return True
+    finally:
+        # Anche sulle uscite anticipate: niente pool di processi orfano né manifest aperto
+        if manifest is not None:
+            manifest.close()
+        if preprocessor is not None:
+            preprocessor.close()
+
+def parse_args():
+    """Opzioni da riga di comando (il resto si sceglie dal menu)"""
+    parser = argparse.ArgumentParser(description="Upload solo immagini su PrestaShop (menu interattivo)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profilo CPU e tempi per fase, scritti in Config.LOG_DIR")
+    parser.add_argument('--trace-alloc', action='store_true',
+                        help="Traccia le allocazioni di memoria (tracemalloc, più lento)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    profiler = start_profiler('upload_images', args.profile, args.trace_alloc)
     try:
         success = main()
+        stop_profiler(profiler)
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
+        stop_profiler(profiler)
         print("\n\n⚠️  Upload interrotto dall'utente")
         sys.exit(130)
     except Exception as e: